@@ -1,6 +1,7 @@
 import requests
 import logging
 from django.conf import settings
+from apps.core.metrics import observe_chatbot_call
 from apps.core.models import AppSettings
 import google.generativeai as genai
 
@@ -83,14 +84,15 @@ def get_chatbot_instructions(detected_objects):
         try:
             genai.configure(api_key=settings.CHATBOT_API_KEY)
             model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    "max_output_tokens": 200,
-                    "temperature": 0.7,
-                }
-            )
-            api_response = response.text
+            with observe_chatbot_call('instructions', model_used):
+                response = model.generate_content(
+                    prompt,
+                    generation_config={
+                        "max_output_tokens": 200,
+                        "temperature": 0.7,
+                    }
+                )
+                api_response = response.text
             final_response = f"{response_text}**Instructions supplémentaires** : {api_response}"
             logger.info(f"Chatbot response received: {final_response}")
             return final_response, model_used
@@ -135,14 +137,15 @@ def get_chatbot_response(user_input, detected_objects):
         try:
             genai.configure(api_key=settings.CHATBOT_API_KEY)
             model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    "max_output_tokens": 150,
-                    "temperature": 0.7,
-                }
-            )
-            chatbot_response = response.text
+            with observe_chatbot_call('response', model_used):
+                response = model.generate_content(
+                    prompt,
+                    generation_config={
+                        "max_output_tokens": 150,
+                        "temperature": 0.7,
+                    }
+                )
+                chatbot_response = response.text
             logger.info(f"Chatbot response for user input: {chatbot_response}")
             return chatbot_response, model_used
         except Exception as e:
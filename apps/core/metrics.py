@@ -0,0 +1,150 @@
+"""
+Métriques Prometheus de l'application.
+
+Les compteurs et histogrammes sont mis à jour dans le processus qui fait le
+travail (serveur web ou `detection_worker`). Quand PROMETHEUS_MULTIPROC_DIR
+est défini avant le démarrage des processus, chacun écrit ses valeurs dans un
+fichier mmap de ce répertoire partagé et `/metrics` les agrège au moment de la
+collecte. L'état de la file de détection est lu en base à chaque collecte.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+FPS_BUCKETS = (1, 2, 5, 10, 15, 25, 30, 50, 100, 250, 500)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+DETECTION_INFERENCE_SECONDS = Histogram(
+    'detection_inference_seconds',
+    "Durée d'inférence par image ou par frame vidéo analysée.",
+    ['media_type', 'model'],
+    buckets=LATENCY_BUCKETS,
+)
+DETECTION_DURATION_SECONDS = Histogram(
+    'detection_duration_seconds',
+    "Durée totale de traitement d'une détection.",
+    ['media_type', 'model'],
+    buckets=DURATION_BUCKETS,
+)
+DETECTION_DB_WRITE_SECONDS = Histogram(
+    'detection_db_write_seconds',
+    "Durée d'écriture en base d'une détection (DetectionLog et objets indexés).",
+    ['media_type', 'model'],
+    buckets=LATENCY_BUCKETS,
+)
+DETECTION_VIDEO_FPS = Histogram(
+    'detection_video_fps',
+    "Frames de la vidéo source traitées par seconde.",
+    ['model'],
+    buckets=FPS_BUCKETS,
+)
+DETECTION_JOBS_COMPLETED = Counter(
+    'detection_jobs_completed_total',
+    "Tâches de détection terminées, par issue.",
+    ['media_type', 'outcome'],
+)
+MODEL_LOAD_SECONDS = Histogram(
+    'detection_model_load_seconds',
+    "Durée de chargement du modèle de détection.",
+    buckets=DURATION_BUCKETS,
+)
+CHATBOT_REQUEST_SECONDS = Histogram(
+    'chatbot_request_seconds',
+    "Durée des appels au modèle de chatbot.",
+    ['call', 'model'],
+    buckets=LATENCY_BUCKETS,
+)
+CHATBOT_ERRORS = Counter(
+    'chatbot_errors_total',
+    "Appels au modèle de chatbot en échec.",
+    ['call', 'model'],
+)
+VIEW_DB_QUERIES = Histogram(
+    'http_view_db_queries',
+    "Requêtes SQL exécutées par requête HTTP, par vue.",
+    ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+VIEW_DURATION_SECONDS = Histogram(
+    'http_view_duration_seconds',
+    "Durée de traitement des requêtes HTTP, par vue.",
+    ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def observe_detection(media_type, model, timings, processing_duration, frames_analyzed=0, frame_count=0):
+    """Enregistre les métriques d'une détection terminée à partir de ses durées par étape"""
+    model = model or 'inconnu'
+    inference = (timings or {}).get('inference')
+    if inference is not None:
+        DETECTION_INFERENCE_SECONDS.labels(media_type, model).observe(inference / max(1, frames_analyzed))
+    db_write = (timings or {}).get('db_write')
+    if db_write is not None:
+        DETECTION_DB_WRITE_SECONDS.labels(media_type, model).observe(db_write)
+    DETECTION_DURATION_SECONDS.labels(media_type, model).observe(processing_duration)
+    if media_type == 'VIDEO' and frame_count and processing_duration > 0:
+        DETECTION_VIDEO_FPS.labels(model).observe(frame_count / processing_duration)
+
+
+@contextmanager
+def observe_chatbot_call(call, model):
+    """Mesure un appel au chatbot ; une exception est comptée comme erreur puis propagée"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        CHATBOT_ERRORS.labels(call, model).inc()
+        raise
+    finally:
+        CHATBOT_REQUEST_SECONDS.labels(call, model).observe(time.perf_counter() - start)
+
+
+class DetectionQueueCollector:
+    """État de la file et des workers, lu en base à chaque collecte"""
+
+    def collect(self):
+        from django.db import DatabaseError
+        from django.db.models import Count, Sum
+        from apps.detection.jobs import live_workers
+        from apps.detection.models import DetectionJob
+
+        try:
+            counts = dict(
+                DetectionJob.objects.filter(status__in=('PENDING', 'RUNNING'))
+                .order_by().values_list('status').annotate(total=Count('pk'))
+            )
+            workers = live_workers().aggregate(total=Count('pk'), capacity=Sum('capacity'), in_flight=Sum('in_flight'))
+        except DatabaseError as e:
+            # Base indisponible : les métriques des processus restent exposées
+            logger.error(f"Metrics: cannot read detection queue state: {str(e)}")
+            return
+
+        jobs = GaugeMetricFamily('detection_jobs', "Tâches de détection par statut.", labels=['status'])
+        for status in ('PENDING', 'RUNNING'):
+            jobs.add_metric([status], counts.get(status, 0))
+        yield jobs
+        yield GaugeMetricFamily('detection_workers_live', "Workers dont le heartbeat est récent.", value=workers['total'])
+        yield GaugeMetricFamily('detection_worker_capacity', "Capacité totale des workers actifs.", value=workers['capacity'] or 0)
+        yield GaugeMetricFamily('detection_jobs_in_flight', "Tâches en cours annoncées par les workers actifs.", value=workers['in_flight'] or 0)
+
+
+def render_metrics():
+    """Exposition texte de toutes les métriques : (contenu, content-type)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    queue_registry = CollectorRegistry()
+    queue_registry.register(DetectionQueueCollector())
+    return generate_latest(registry) + generate_latest(queue_registry), CONTENT_TYPE_LATEST
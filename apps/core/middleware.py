@@ -0,0 +1,32 @@
+import time
+
+from django.db import connection
+
+from .metrics import VIEW_DB_QUERIES, VIEW_DURATION_SECONDS
+
+
+class QueryCountMiddleware:
+    """Compte les requêtes SQL et mesure la durée de chaque requête HTTP, par vue"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        # Nom de route plutôt que chemin : le nombre de séries reste borné
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        VIEW_DB_QUERIES.labels(view).observe(queries)
+        VIEW_DURATION_SECONDS.labels(view).observe(duration)
+        return response
@@ -2,6 +2,10 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django import forms
+from django.conf import settings as django_settings
+from django.http import HttpResponse, HttpResponseForbidden
+import hmac
+from .metrics import render_metrics
 from .models import AppSettings
 
 def is_admin(user):
@@ -66,4 +70,23 @@ def update_app_settings(request):
         else:
             messages.error(request, "Une erreur s'est produite lors de la mise à jour des paramètres.")
     
-    return redirect('core:settings')
\ No newline at end of file
+    return redirect('core:settings')
+
+
+def metrics_view(request):
+    """
+    Exposition des métriques au format texte Prometheus. Réservée au collecteur
+    (jeton Bearer METRICS_TOKEN) et aux administrateurs connectés ; ouverte
+    sans jeton configuré seulement en DEBUG.
+    """
+    token = django_settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    allowed = (
+        (token and hmac.compare_digest(authorization, f"Bearer {token}"))
+        or (request.user.is_authenticated and (request.user.is_staff or is_admin(request.user)))
+        or (not token and django_settings.DEBUG)
+    )
+    if not allowed:
+        return HttpResponseForbidden("Jeton de collecte invalide." if authorization else "Accès aux métriques refusé.")
+    content, content_type = render_metrics()
+    return HttpResponse(content, content_type=content_type)
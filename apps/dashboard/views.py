@@ -1,13 +1,17 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count, Avg, Sum, Case, When, IntegerField, F
-from django.db.models.functions import TruncDay, TruncMonth
+from django.db.models import Avg, Sum, F, Q
+from django.db.models.functions import Coalesce, TruncMonth
 from django.utils import timezone
 from datetime import timedelta
 from apps.core.models import AppSettings
-from apps.detection.models import DetectionLog, ModelValidation, DangerousCategory
+from apps.detection.models import DetectionDailyRollup, DetectionLog, ModelValidation, DangerousCategory
+from apps.detection.timing import stage_breakdown, with_db_write
 from apps.users.models import User
 
+# Détections récentes retenues pour les percentiles par étape
+STAGE_TIMINGS_SAMPLE_SIZE = 5000
+
 def is_admin(user):
     return user.is_administrator
 
@@ -18,32 +22,38 @@ def stats_view(request):
     days = int(request.GET.get('days', 30))
     start_date = timezone.now() - timedelta(days=days)
     
-    total_detections = DetectionLog.objects.count()
-    total_dangerous = DetectionLog.objects.filter(contains_dangerous_category=True).count()
-    total_validations = ModelValidation.objects.count()
-    total_correct = ModelValidation.objects.filter(is_correct=True).count()
+    # Compteurs lus dans les agrégats quotidiens (lignes sans catégorie : une par groupe de détections)
+    detection_rows = DetectionDailyRollup.objects.filter(category='')
+    totals = detection_rows.aggregate(
+        detections=Sum('detection_count'),
+        dangerous=Sum('detection_count', filter=~Q(danger_level='')),
+        valid=Sum('valid_count'),
+        invalid=Sum('invalid_count'),
+    )
+    total_detections = totals['detections'] or 0
+    total_dangerous = totals['dangerous'] or 0
+    total_correct = totals['valid'] or 0
+    total_validations = total_correct + (totals['invalid'] or 0)
     
     accuracy_percentage = (total_correct / total_validations * 100) if total_validations > 0 else 0
     
     detections_by_day = (
-        DetectionLog.objects
-        .filter(detection_timestamp__gte=start_date)
-        .annotate(day=TruncDay('detection_timestamp'))
+        detection_rows
+        .filter(day__gte=timezone.localdate(start_date))
         .values('day')
         .annotate(
-            total=Count('id'),
-            dangerous=Count(Case(When(contains_dangerous_category=True, then=1), output_field=IntegerField()))
+            total=Sum('detection_count'),
+            dangerous=Coalesce(Sum('detection_count', filter=~Q(danger_level='')), 0)
         )
+        .filter(total__gt=0)
         .order_by('day')
     )
     
     category_stats = []
+    category_count = DangerousCategory.objects.count()
     for category in DangerousCategory.objects.all():
-        validations_for_category = 0
-        correct_validations_for_category = 0
-        
-        validations_for_category = ModelValidation.objects.count() // DangerousCategory.objects.count()
-        correct_validations_for_category = ModelValidation.objects.filter(is_correct=True).count() // DangerousCategory.objects.count()
+        validations_for_category = total_validations // category_count
+        correct_validations_for_category = total_correct // category_count
         
         category_accuracy = (correct_validations_for_category / validations_for_category * 100) if validations_for_category > 0 else 0
         
@@ -55,15 +65,28 @@ def stats_view(request):
         })
     
     user_stats = (
-        DetectionLog.objects
+        detection_rows
         .values('user__email', 'user__first_name', 'user__last_name', 'user__role')
         .annotate(
-            total_detections=Count('id'),
-            dangerous_detections=Count(Case(When(contains_dangerous_category=True, then=1), output_field=IntegerField()))
+            total_detections=Sum('detection_count'),
+            dangerous_detections=Coalesce(Sum('detection_count', filter=~Q(danger_level='')), 0)
         )
+        .filter(total_detections__gt=0)
         .order_by('-total_detections')
     )
     
+    # p50 / p95 par étape, calculés sur les détections récentes de la période
+    timed_detections = (
+        DetectionLog.objects
+        .filter(detection_timestamp__gte=start_date, stage_timings__isnull=False)
+        .order_by('-detection_timestamp')
+        .values_list('media_type', 'model_used', 'stage_timings', 'job__stage_timings')[:STAGE_TIMINGS_SAMPLE_SIZE]
+    )
+    stage_stats = stage_breakdown(
+        (media_type, model_used, with_db_write(timings, job_timings))
+        for media_type, model_used, timings, job_timings in timed_detections
+    )
+    
     context = {
         'app_settings': AppSettings.load(),
         'total_detections': total_detections,
@@ -71,9 +94,11 @@ def stats_view(request):
         'total_validations': total_validations,
         'total_correct': total_correct,
         'accuracy_percentage': accuracy_percentage,
-        'detections_by_day': list(detections_by_day),
+        # Dates en ISO : la liste est injectée telle quelle dans le script du graphique
+        'detections_by_day': [dict(row, day=row['day'].isoformat()) for row in detections_by_day],
         'category_stats': category_stats,
         'user_stats': user_stats,
+        'stage_stats': stage_stats,
         'days': days,
     }
     
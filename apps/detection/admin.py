@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DangerousCategory, DetectionLog, ModelValidation
+from .models import DangerousCategory, DetectionJob, DetectionLog, DetectionWorker, MediaBlob, ModelValidation, UploadSession
 
 @admin.register(DangerousCategory)
 class DangerousCategoryAdmin(admin.ModelAdmin):
@@ -35,6 +35,8 @@ class DetectionLogAdmin(admin.ModelAdmin):
         "danger_level",
         "model_used",
         "is_simulated",
+        "processing_duration",
+        "stage_timings",
     )
 
     def has_add_permission(self, request):
@@ -60,3 +62,94 @@ class ModelValidationAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return False
 
+@admin.register(DetectionJob)
+class DetectionJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "user",
+        "kind",
+        "media_type",
+        "status",
+        "priority",
+        "attempts",
+        "lease_owner",
+        "created_at",
+    )
+    list_filter = ("status", "kind", "media_type", "created_at")
+    search_fields = ("user__email", "original_file", "lease_owner")
+    readonly_fields = (
+        "user",
+        "kind",
+        "report",
+        "original_file",
+        "annotated_file",
+        "media_type",
+        "lease_owner",
+        "lease_expires_at",
+        "last_error",
+        "detection_log",
+        "stage_timings",
+        "categories",
+        "progress",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    # Le statut, la priorité et la disponibilité restent modifiables pour relancer une tâche à la main
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(DetectionWorker)
+class DetectionWorkerAdmin(admin.ModelAdmin):
+    list_display = (
+        "worker_id",
+        "hostname",
+        "capacity",
+        "in_flight",
+        "last_heartbeat",
+        "is_alive",
+    )
+    list_filter = ("hostname",)
+    search_fields = ("worker_id", "hostname")
+    readonly_fields = ("worker_id", "hostname", "pid", "capacity", "in_flight", "started_at", "last_heartbeat")
+
+    @admin.display(boolean=True, description="Actif")
+    def is_alive(self, obj):
+        return obj.is_alive
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("filename", "user", "status", "offset", "total_size", "updated_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("user__email", "filename", "relative_path")
+    readonly_fields = (
+        "user",
+        "filename",
+        "relative_path",
+        "total_size",
+        "offset",
+        "crc32",
+        "expected_crc32",
+        "job",
+        "created_at",
+        "updated_at",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ("path", "size", "ref_count", "created_at", "last_referenced_at")
+    search_fields = ("sha256", "path")
+    readonly_fields = ("sha256", "path", "size", "ref_count", "created_at", "last_referenced_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
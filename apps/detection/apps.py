@@ -5,3 +5,6 @@ class DetectionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.detection' # Correction
 
+    def ready(self):
+        # Connecte les receivers (libération des médias, agrégats quotidiens, compteurs de filtres)
+        from . import signals
@@ -0,0 +1,33 @@
+"""
+Filtres de dates compatibles avec les index.
+
+Un lookup `__date` enveloppe la colonne dans une fonction SQL et empêche
+l'usage des index sur l'horodatage. Les filtres par jour s'écrivent donc
+comme des intervalles semi-ouverts [début, fin[ sur la colonne brute, bornés
+aux minuits du fuseau courant.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def parse_day(value):
+    """Date d'un paramètre 'AAAA-MM-JJ', ou None si absent ou invalide"""
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def day_start(day):
+    """Minuit (fuseau courant) du jour donné, en datetime aware"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_days(queryset, field, first_day=None, last_day=None):
+    """Restreint `field` aux jours [first_day, last_day] inclus ; une borne absente n'est pas appliquée"""
+    if first_day is not None:
+        queryset = queryset.filter(**{f"{field}__gte": day_start(first_day)})
+    if last_day is not None:
+        queryset = queryset.filter(**{f"{field}__lt": day_start(last_day + timedelta(days=1))})
+    return queryset
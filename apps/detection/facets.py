@@ -0,0 +1,285 @@
+"""
+Compteurs des listes déroulantes de filtres (FacetCount).
+
+Les pages d'historique affichent, pour chaque valeur de filtre (classe, niveau
+de danger, localisation, utilisateur), le nombre d'éléments correspondants.
+Ces nombres sont matérialisés par portée : 'global' (administrateurs et
+superviseurs) et 'user:<id>' (un opérateur ne voit que ses données). Ils sont
+mis à jour à l'écriture (voir signals.py) et lus en une requête par portée,
+mise en cache : le coût ne dépend plus du volume de l'historique.
+
+Un rapport est compté une fois par niveau de danger présent parmi ses
+détections. Sa suppression retire d'un coup ses compteurs (pre_delete) : ses
+détections, supprimées en cascade, ne touchent alors plus aux compteurs de
+rapport. Les écritures en masse appellent `record_batch` (créations) ou
+`record_detection_changes` (modifications), et
+`manage.py rebuild_rollups` recalcule aussi ces compteurs.
+"""
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce
+
+from .models import DetectionLog, DetectionObject, FacetCount, Report, object_category
+from .rollups import bump_cache_version, cache_version, increment, increment_many
+
+GLOBAL_SCOPE = 'global'
+FACETS_VERSION_CACHE_KEY = 'detection:facets_version'
+
+_local = threading.local()
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+def scopes(user_id):
+    return (GLOBAL_SCOPE, user_scope(user_id))
+
+
+def category_counters(log, facet):
+    counters = Counter()
+    for obj in log.detected_objects or []:
+        category = object_category(obj) if isinstance(obj, dict) else None
+        if category is not None:
+            counters[(facet, category[:255])] += 1
+    return counters
+
+
+def detection_changes(log):
+    """{portée: Counter((filtre, valeur) -> n)} d'une détection, hors compteurs de rapport"""
+    location = (log.user_location or '')[:255]
+    counters = category_counters(log, 'class')
+    counters[('danger_level', log.danger_level or '')] += 1
+    counters[('location', location)] += 1
+    changes = {scope: Counter(counters) for scope in scopes(log.user_id)}
+    if log.danger_level == 'HYPERDANGEROUS':
+        # Page des détections signalées : superviseurs et administrateurs uniquement
+        changes[GLOBAL_SCOPE].update({('flagged_user', str(log.user_id)): 1, ('flagged_location', location): 1})
+    return changes
+
+
+def report_level_is_shared(log):
+    """Une autre détection du rapport a-t-elle le même niveau de danger ?"""
+    others = DetectionLog.objects.filter(report_id=log.report_id).exclude(pk=log.pk)
+    if log.danger_level:
+        return others.filter(danger_level=log.danger_level).exists()
+    return others.filter(danger_level__isnull=True).exists()
+
+
+def report_changes(log):
+    """Compteurs de rapport modifiés par l'ajout (ou le retrait) d'une détection du rapport"""
+    counters = category_counters(log, 'report_class')
+    if not report_level_is_shared(log):
+        counters[('report_danger_level', log.danger_level or '')] += 1
+    report_user_id = Report.objects.filter(pk=log.report_id).values_list('user_id', flat=True).first()
+    if report_user_id is None:
+        return {}
+    return {scope: Counter(counters) for scope in scopes(report_user_id)}
+
+
+def apply(changes, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) des compteurs ; un retrait ne crée jamais de ligne"""
+    changed = False
+    for scope, counters in changes.items():
+        for (facet, value), count in counters.items():
+            if count:
+                changed = True
+                increment(FacetCount, {'scope': scope, 'facet': facet, 'value': value}, {'count': count * sign}, create=sign > 0)
+    if changed:
+        transaction.on_commit(lambda: bump_cache_version(FACETS_VERSION_CACHE_KEY))
+
+
+def merge(*changes):
+    merged = defaultdict(Counter)
+    for change in changes:
+        for scope, counters in change.items():
+            merged[scope].update(counters)
+    return merged
+
+
+def record_detection(log):
+    if log.report_id:
+        apply(merge(detection_changes(log), report_changes(log)))
+    else:
+        apply(detection_changes(log))
+
+
+def forget_detection(log):
+    if log.report_id and log.report_id not in reports_being_deleted():
+        apply(merge(detection_changes(log), report_changes(log)), sign=-1)
+    else:
+        apply(detection_changes(log), sign=-1)
+
+
+def record_report(report):
+    apply({scope: Counter({('report_location', (report.location or '')[:255]): 1}) for scope in scopes(report.user_id)})
+
+
+def reports_being_deleted():
+    if not hasattr(_local, 'deleting_reports'):
+        _local.deleting_reports = set()
+    return _local.deleting_reports
+
+
+def forget_report(report):
+    """Retire tous les compteurs d'un rapport avant sa suppression (et celle de ses détections)"""
+    counters = Counter({('report_location', (report.location or '')[:255]): 1})
+    levels = DetectionLog.objects.filter(report=report).order_by().values_list('danger_level', flat=True).distinct()
+    for level in levels:
+        counters[('report_danger_level', level or '')] += 1
+    for category, count in DetectionObject.objects.filter(detection_log__report=report).category_counts().items():
+        counters[('report_class', category[:255])] += count
+    apply({scope: Counter(counters) for scope in scopes(report.user_id)}, sign=-1)
+    reports_being_deleted().add(report.pk)
+
+
+def report_deleted(report):
+    reports_being_deleted().discard(report.pk)
+
+
+def record_batch(reports, logs):
+    """Ajoute des rapports et détections créés en masse (les détections des rapports sont toutes dans le lot)"""
+    changes = [{scope: Counter({('report_location', (report.location or '')[:255]): 1}) for scope in scopes(report.user_id)}
+               for report in reports]
+    report_users = {report.pk: report.user_id for report in reports}
+    report_levels = set()
+    for log in logs:
+        changes.append(detection_changes(log))
+        if log.report_id:
+            counters = category_counters(log, 'report_class')
+            if (log.report_id, log.danger_level) not in report_levels:
+                report_levels.add((log.report_id, log.danger_level))
+                counters[('report_danger_level', log.danger_level or '')] += 1
+            changes.append({scope: counters for scope in scopes(report_users[log.report_id])})
+    apply(merge(*changes))
+
+
+def record_detection_changes(pairs):
+    """
+    Remplace en lot l'état précédent de détections modifiées en masse (paires
+    (avant, après), rapport inchangé), une fois les nouvelles valeurs enregistrées
+    """
+    changes = defaultdict(Counter)
+    for previous, current in pairs:
+        for scope, counters in detection_changes(previous).items():
+            changes[scope].subtract(counters)
+        for scope, counters in detection_changes(current).items():
+            changes[scope].update(counters)
+
+    report_ids = {current.report_id for _, current in pairs if current.report_id}
+    if report_ids:
+        report_users = dict(Report.objects.filter(pk__in=report_ids).values_list('id', 'user_id'))
+        # Niveaux présents dans chaque rapport après la modification, puis avant (en mémoire)
+        levels = DetectionLog.objects.filter(report_id__in=report_ids).order_by().values_list('report_id', 'danger_level')
+        after = Counter()
+        for report_id, level, count in levels.annotate(n=Count('id')):
+            after[(report_id, level or '')] += count
+        before = Counter(after)
+        report_counters = defaultdict(Counter)
+        for previous, current in pairs:
+            if not current.report_id:
+                continue
+            before[(current.report_id, current.danger_level or '')] -= 1
+            before[(previous.report_id, previous.danger_level or '')] += 1
+            report_counters[current.report_id].subtract(category_counters(previous, 'report_class'))
+            report_counters[current.report_id].update(category_counters(current, 'report_class'))
+        for (report_id, level) in set(before) | set(after):
+            shift = (after[(report_id, level)] > 0) - (before[(report_id, level)] > 0)
+            report_counters[report_id][('report_danger_level', level)] += shift
+        for report_id, counters in report_counters.items():
+            if report_id in report_users:
+                for scope in scopes(report_users[report_id]):
+                    changes[scope].update(counters)
+
+    increment_many(FacetCount, ('scope', 'facet', 'value'), {
+        (scope, facet, value): {'count': count}
+        for scope, counters in changes.items() for (facet, value), count in counters.items()
+    })
+    transaction.on_commit(lambda: bump_cache_version(FACETS_VERSION_CACHE_KEY))
+
+
+def facet_counts(scope):
+    """{filtre: {valeur: nombre}} d'une portée (valeurs à zéro exclues), mis en cache"""
+    key = f"facets:{cache_version(FACETS_VERSION_CACHE_KEY)}:{scope}"
+    counts = cache.get(key)
+    if counts is None:
+        counts = defaultdict(dict)
+        rows = FacetCount.objects.filter(scope=scope, count__gt=0).values_list('facet', 'value', 'count')
+        for facet, value, count in rows:
+            counts[facet][value] = count
+        counts = dict(counts)
+        cache.set(key, counts, settings.STATS_CACHE_SECONDS)
+    return counts
+
+
+def rebuild():
+    """Recalcule tous les compteurs en SQL ; renvoie le nombre de lignes"""
+    totals = defaultdict(Counter)
+
+    def add(rows, facet, per_user=True):
+        """rows : (utilisateur, valeur, nombre), ou (valeur, nombre) pour la seule portée globale"""
+        for row in rows:
+            if per_user:
+                user_id, value, count = row
+                totals[user_scope(user_id)][(facet, str(value or '')[:255])] += count
+            else:
+                value, count = row
+            totals[GLOBAL_SCOPE][(facet, str(value or '')[:255])] += count
+
+    logs = DetectionLog.objects.order_by()
+    objects = DetectionObject.objects.order_by()
+    level = Coalesce('danger_level', Value(''))
+    location = Coalesce('user_location', Value(''))
+
+    add(objects.values_list('detection_log__user_id', 'category').annotate(n=Count('id')), 'class')
+    add(logs.values_list('user_id', level).annotate(n=Count('id')), 'danger_level')
+    add(logs.values_list('user_id', location).annotate(n=Count('id')), 'location')
+    flagged = logs.filter(danger_level='HYPERDANGEROUS')
+    add(flagged.values_list('user_id').annotate(n=Count('id')), 'flagged_user', per_user=False)
+    add(flagged.values_list(location).annotate(n=Count('id')), 'flagged_location', per_user=False)
+
+    add(
+        objects.filter(detection_log__report__isnull=False)
+        .values_list('detection_log__report__user_id', 'category').annotate(n=Count('id')),
+        'report_class',
+    )
+    add(
+        logs.filter(report__isnull=False)
+        .values_list(F('report__user_id'), level).annotate(n=Count('report_id', distinct=True)),
+        'report_danger_level',
+    )
+    add(
+        Report.objects.order_by().values_list('user_id', Coalesce('location', Value(''))).annotate(n=Count('id')),
+        'report_location',
+    )
+
+    rows = [
+        FacetCount(scope=scope, facet=facet, value=value, count=count)
+        for scope, counters in totals.items()
+        for (facet, value), count in counters.items()
+    ]
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows, batch_size=2000)
+    bump_cache_version(FACETS_VERSION_CACHE_KEY)
+    return len(rows)
+
+
+def approximate_total(counts, total_facet, filters):
+    """
+    Nombre d'éléments d'après les compteurs d'une portée. `filters` associe un
+    filtre à la valeur demandée (None : filtre inactif) ; None si plusieurs
+    filtres sont actifs, leur combinaison n'étant pas matérialisée.
+    """
+    active = [(facet, value) for facet, value in filters.items() if value is not None]
+    if not active:
+        return sum(counts.get(total_facet, {}).values())
+    if len(active) == 1:
+        facet, value = active[0]
+        return counts.get(facet, {}).get(value, 0)
+    return None
@@ -3,7 +3,8 @@ import os
 from django import forms
 from django.core.exceptions import ValidationError
 from .models import DangerousCategory, DetectionLog, ModelValidation, Report
-import zipfile
+from .upload_handlers import MAX_UPLOAD_SIZES, SIZE_LABELS, media_kind_for_filename
+from .utils import VIDEO_OUTPUT_MODES
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +45,15 @@ class UploadDetectionForm(forms.Form):
         help_text="Pour les vidéos : analyser 1 frame toutes les X frames (30 = 1/sec pour 30 FPS)"
     )
 
+    video_output_mode = forms.ChoiceField(
+        label="Format de sortie vidéo",
+        choices=VIDEO_OUTPUT_MODES,
+        initial='standard',
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text="HLS : lecture dès le premier segment, y compris pendant l'analyse"
+    )
+
     def clean(self):
         cleaned_data = super().clean()
         files = self.files.getlist('files') if hasattr(self.files, 'getlist') else [cleaned_data.get('files')]
@@ -72,27 +82,9 @@ class UploadDetectionForm(forms.Form):
                 logger.info(f"Validating ZIP file: {file.name}, size: {file.size}")
                 if file.size > 100 * 1024 * 1024:  # 100 MB
                     raise ValidationError(f"Le fichier ZIP '{file.name}' dépasse la limite de 100 Mo.")
-                try:
-                    with zipfile.ZipFile(file, 'r') as zip_ref:
-                        file_list = zip_ref.namelist()
-                        logger.info(f"ZIP {file.name} contains {len(file_list)} files: {file_list}")
-                        has_media_in_zip = False
-                        for file_info in zip_ref.infolist():
-                            if file_info.filename.endswith('/') or not os.path.splitext(file_info.filename)[1]:
-                                logger.info(f"Skipping directory in ZIP: {file_info.filename}")
-                                continue
-                            zip_file_ext = os.path.splitext(file_info.filename.lower())[1]
-                            if zip_file_ext not in valid_image_extensions and zip_file_ext not in valid_video_extensions:
-                                logger.error(f"Invalid file found in ZIP {file.name}: {file_info.filename}")
-                                raise ValidationError(f"Le fichier ZIP '{file.name}' contient des fichiers non-médias.")
-                            has_media_in_zip = True
-                        if not has_media_in_zip:
-                            raise ValidationError(f"Le fichier ZIP '{file.name}' ne contient aucun média valide.")
-                        has_valid_file = True
-                except zipfile.BadZipFile:
-                    logger.error(f"Invalid ZIP file: {file.name}")
-                    raise ValidationError(f"Le fichier ZIP '{file.name}' est invalide ou corrompu.")
-                    
+                # Le contenu de l'archive est vérifié membre par membre pendant l'ingestion (ingest_zip)
+                has_valid_file = True
+
             elif file_extension in valid_image_extensions:
                 # Valider taille image
                 if file.size > 10 * 1024 * 1024:  # 10 MB
@@ -150,6 +142,15 @@ class SingleImageDetectionForm(forms.Form):
         help_text="Pour les vidéos : analyser 1 frame toutes les X frames (30 = 1/sec pour 30 FPS)"
     )
 
+    video_output_mode = forms.ChoiceField(
+        label="Format de sortie vidéo",
+        choices=VIDEO_OUTPUT_MODES,
+        initial='standard',
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text="HLS : lecture dès le premier segment, y compris pendant l'analyse"
+    )
+
     def clean(self):
         cleaned_data = super().clean()
         image = cleaned_data.get('image')
@@ -275,4 +276,49 @@ class UnifiedMediaDetectionForm(forms.Form):
             'id': 'video_frame_interval'
         }),
         help_text="1 frame analysée toutes les X frames. 30 ≈ 1 frame/sec pour 30 FPS"
-    )
\ No newline at end of file
+    )
+
+    video_output_mode = forms.ChoiceField(
+        label="Format de sortie vidéo",
+        choices=VIDEO_OUTPUT_MODES,
+        initial='standard',
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control', 'id': 'video_output_mode'}),
+        help_text="HLS : lecture dès le premier segment, y compris pendant l'analyse"
+    )
+
+
+class ChunkedUploadInitForm(forms.Form):
+    """Initialisation d'un upload par morceaux (les fichiers passent ensuite par PUT)"""
+    filename = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=1)
+    location = forms.CharField(max_length=255, required=False)
+    video_frame_interval = forms.IntegerField(min_value=1, max_value=300, required=False)
+    video_output_mode = forms.ChoiceField(choices=VIDEO_OUTPUT_MODES, required=False)
+    crc32 = forms.RegexField(
+        regex=r'^[0-9a-fA-F]{1,8}$',
+        required=False,
+        help_text="CRC32 du fichier complet en hexadécimal, vérifié à la finalisation"
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        filename = cleaned_data.get('filename')
+        size = cleaned_data.get('size')
+        if not filename or not size:
+            return cleaned_data
+
+        # Mêmes extensions et limites que les uploads en une requête (upload_handlers.py)
+        kind = media_kind_for_filename(filename)
+        if kind == 'VIDEO':
+            if size > MAX_UPLOAD_SIZES['VIDEO']:
+                raise ValidationError(f"La vidéo '{filename}' dépasse la limite de {SIZE_LABELS['VIDEO']}.")
+        elif kind == 'IMAGE':
+            if size > MAX_UPLOAD_SIZES['IMAGE']:
+                raise ValidationError(f"L'image '{filename}' dépasse la limite de {SIZE_LABELS['IMAGE']}.")
+        else:
+            raise ValidationError(
+                f"Le fichier '{filename}' doit être une image (JPG, JPEG, PNG, WEBP, JFIF) "
+                f"ou une vidéo (MP4, AVI, MOV)."
+            )
+        return cleaned_data
@@ -0,0 +1,75 @@
+"""
+Niveau de danger et seuil de confiance d'une détection.
+
+L'inférence conserve toutes les boîtes au-dessus d'un plancher de confiance
+(settings.DETECTION_RAW_CONFIDENCE_FLOOR) dans `DetectionLog.raw_detections`,
+sous forme compacte (`pack_detections`). Les objets détectés affichés et
+comptés (`detected_objects`) en sont extraits au seuil des paramètres
+(`unpack_detections`) : changer ce seuil ne demande pas de relancer le modèle
+(voir regrade.py).
+
+Les catégories dangereuses actives sont lues en une requête (`category_levels`),
+puis appliquées en mémoire à une ou plusieurs détections (`danger_level`).
+"""
+from django.conf import settings
+
+from .models import DangerousCategory, object_category
+
+LEVEL_RANK = {None: 0, 'DANGEROUS': 1, 'HYPERDANGEROUS': 2}
+
+
+def category_levels():
+    """{nom en minuscules: 'DANGEROUS' ou 'HYPERDANGEROUS'} des catégories dangereuses actives"""
+    return {
+        name.lower(): category_type
+        for name, category_type in DangerousCategory.objects.filter(is_active=True).values_list('name', 'category_type')
+    }
+
+
+def danger_level(detected_objects, levels, rejected=()):
+    """Niveau le plus élevé parmi les catégories non rejetées ; None pour une détection normale"""
+    highest = None
+    for obj in detected_objects or []:
+        category = object_category(obj) if isinstance(obj, dict) else None
+        if category is None or category in rejected:
+            continue
+        level = levels.get(category)
+        if LEVEL_RANK.get(level, 0) > LEVEL_RANK[highest]:
+            highest = level
+    return highest
+
+
+def pack_detections(detected_objects, floor=None):
+    """
+    Forme compacte d'objets normalisés (voir jobs.normalize_detected_objects) :
+    {'floor': plancher, 'classes': [catégorie, ...], 'boxes': [[indice de classe,
+    confiance, x, y, w, h] (+ [frame, position] pour les vidéos), ...]}
+    """
+    floor = settings.DETECTION_RAW_CONFIDENCE_FLOOR if floor is None else floor
+    classes = {}
+    boxes = []
+    for obj in detected_objects:
+        confidence = float(obj.get('confidence') or 0.0)
+        if confidence < floor:
+            continue
+        bbox = obj.get('bbox') or [0, 0, 0, 0]
+        box = [classes.setdefault(obj['category'], len(classes)), round(confidence, 4), *(round(float(v), 1) for v in bbox)]
+        if 'frame' in obj:
+            box += [obj['frame'], obj.get('timestamp', 0.0)]
+        boxes.append(box)
+    return {'floor': floor, 'classes': list(classes), 'boxes': boxes}
+
+
+def unpack_detections(raw, threshold):
+    """Objets détectés (format detected_objects) dont la confiance atteint `threshold`"""
+    classes = raw['classes']
+    detected_objects = []
+    for box in raw['boxes']:
+        if box[1] < threshold:
+            continue
+        obj = {'category': classes[box[0]], 'confidence': box[1]}
+        if len(box) > 6:
+            obj['frame'], obj['timestamp'] = box[6], box[7]
+        obj['bbox'] = box[2:6]
+        detected_objects.append(obj)
+    return detected_objects
@@ -0,0 +1,114 @@
+"""
+Ingestion en flux des archives ZIP.
+
+Chaque membre est lu directement depuis l'archive et écrit dans le stockage
+adressé par contenu (MEDIA_ROOT) : pas d'extraction préalable de l'archive ni
+de déplacement entre systèmes de fichiers. Les limites de taille sont
+appliquées sur les octets réellement décompressés, et chaque membre est remis
+à `on_member` dès qu'il est écrit, pour que la détection démarre pendant que
+l'extraction continue.
+"""
+import logging
+import os
+import zipfile
+
+from django.conf import settings
+
+from .upload_handlers import MAX_UPLOAD_SIZES, media_kind_for_filename, sniff_media_kind
+from .storage import media_store
+from .timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class IngestError(Exception):
+    """Archive refusée dans son ensemble (corrompue, trop volumineuse, sans média)"""
+
+
+class MemberRejected(Exception):
+    pass
+
+
+class MemberTooLarge(MemberRejected):
+    pass
+
+
+def _member_blocks(zip_ref, info, media_type, limit):
+    """Blocs décompressés d'un membre ; vérifie les octets magiques et compte les octets réels"""
+    read = 0
+    with zip_ref.open(info) as source:
+        while True:
+            block = source.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            if read == 0 and sniff_media_kind(block[:16]) != media_type:
+                raise MemberRejected("content does not match extension")
+            read += len(block)
+            if read > limit:
+                raise MemberTooLarge()
+            yield block
+
+
+def ingest_zip(archive, on_member):
+    """
+    Extrait les images et vidéos de `archive` (fichier ouvert ou UploadedFile).
+
+    `on_member(blob, media_type, filename, timer)` est appelé pour chaque
+    membre stocké, `timer` portant la durée de son stockage. Retourne (nombre de membres ingérés, liste des membres ignorés).
+    """
+    max_total = settings.ZIP_MAX_TOTAL_UNCOMPRESSED_SIZE
+    max_members = settings.ZIP_MAX_MEMBERS
+
+    try:
+        zip_ref = zipfile.ZipFile(archive, 'r')
+    except zipfile.BadZipFile:
+        raise IngestError("Le fichier ZIP est invalide ou corrompu.")
+
+    ingested = 0
+    skipped = []
+    total = 0
+    with zip_ref:
+        members = [info for info in zip_ref.infolist() if not info.is_dir()]
+        if len(members) > max_members:
+            raise IngestError(f"Le fichier ZIP contient trop de fichiers (maximum {max_members}).")
+
+        for info in members:
+            filename = os.path.basename(info.filename)
+            media_type = media_kind_for_filename(filename)
+            if media_type not in ('IMAGE', 'VIDEO'):
+                logger.warning(f"Skipping unsupported file in ZIP: {info.filename}")
+                skipped.append(info.filename)
+                continue
+
+            # Tailles déclarées : refus immédiat, sans rien décompresser
+            limit = MAX_UPLOAD_SIZES[media_type]
+            if info.file_size > limit:
+                logger.warning(f"Skipping oversized ZIP member: {info.filename} ({info.file_size} bytes)")
+                skipped.append(info.filename)
+                continue
+            if total + info.file_size > max_total:
+                raise IngestError("Le contenu décompressé du fichier ZIP dépasse la limite autorisée.")
+
+            timer = StageTimer()
+            try:
+                # Les tailles déclarées peuvent mentir : la limite s'applique aussi aux octets lus
+                blocks = _member_blocks(zip_ref, info, media_type, min(limit, max_total - total))
+                with timer.stage('store'):
+                    blob = media_store.save_chunks(blocks, filename)
+            except (MemberRejected, zipfile.BadZipFile, EOFError) as e:
+                if isinstance(e, MemberTooLarge) and total + limit > max_total:
+                    raise IngestError("Le contenu décompressé du fichier ZIP dépasse la limite autorisée.")
+                logger.warning(f"Skipping invalid ZIP member: {info.filename} ({type(e).__name__}: {e})")
+                skipped.append(info.filename)
+                continue
+
+            total += blob.size
+            ingested += 1
+            logger.info(f"Ingested ZIP member {info.filename} -> {blob.path} ({blob.size} bytes)")
+            on_member(blob, media_type, filename, timer)
+
+    if not ingested:
+        raise IngestError("Le fichier ZIP ne contient aucun média valide.")
+    return ingested, skipped
@@ -0,0 +1,446 @@
+"""
+File de tâches de détection persistée en base (sans broker externe).
+
+Les vues d'upload enregistrent les fichiers puis appellent `enqueue_detection`.
+Les workers (`manage.py detection_worker`) réclament les tâches avec
+`claim_next_job` : la réclamation est un UPDATE conditionnel sur le statut et
+le bail, un seul worker peut donc l'emporter, y compris sous SQLite.
+
+Les workers peuvent tourner sur plusieurs hôtes partageant la base et
+MEDIA_ROOT. Chacun s'enregistre dans `DetectionWorker` et un `WorkerHeartbeat`
+renouvelle ses baux : si le processus meurt, ses tâches redeviennent
+réclamables à l'expiration du bail.
+
+La même file porte les re-notations (kind='RESCORE', `enqueue_rescore`) : après
+une modification de catégories dangereuses (vues ou administration), le niveau de danger des détections
+concernées est recalculé par lots, sans relancer le modèle (voir regrade.py).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.core.metrics import DETECTION_JOBS_COMPLETED, observe_detection
+from apps.core.models import AppSettings
+
+from . import grading
+from .models import DetectionJob, DetectionLog, DetectionObject, DetectionWorker
+from .regrade import rescore_categories
+from .storage import attempt_output_path, media_store
+from .timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Priorités : un opérateur qui attend le résultat d'un upload unitaire passe avant les lots
+PRIORITY_BATCH = 0
+PRIORITY_INTERACTIVE = 10
+# Re-notations après un changement de catégories : après toutes les détections en attente
+PRIORITY_MAINTENANCE = -10
+
+# Une tâche exécutée dans la requête n'a pas de heartbeat : bail long pour qu'aucun worker ne la reprenne
+EAGER_LEASE_SECONDS = 6 * 60 * 60
+
+
+class DetectionFailed(Exception):
+    """La détection n'a produit aucun résultat exploitable"""
+
+
+class LeaseLost(Exception):
+    """Le bail de la tâche a expiré et une autre tentative l'a reprise : le résultat est abandonné"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_detection(user, original_file, annotated_file, media_type, location='', report=None,
+                      frame_interval=30, output_mode='standard', priority=PRIORITY_BATCH, timer=None):
+    """
+    Crée une tâche de détection (exécutée immédiatement si DETECTION_JOBS_EAGER).
+
+    `timer` porte les étapes déjà mesurées côté upload ; elles sont reprises dans le DetectionLog.
+    """
+    job = DetectionJob.objects.create(
+        user=user,
+        report=report,
+        original_file=original_file,
+        annotated_file=annotated_file,
+        media_type=media_type,
+        user_location=location,
+        frame_interval=frame_interval or 30,
+        output_mode=output_mode,
+        priority=priority,
+        stage_timings=timer.as_dict() if timer else None,
+    )
+    logger.info(f"Enqueued detection job {job.id} ({media_type}): {original_file}")
+
+    if settings.DETECTION_JOBS_EAGER:
+        claimed = claim_job(job.id, 'eager', EAGER_LEASE_SECONDS)
+        if claimed:
+            process_job(claimed, 'eager')
+        job.refresh_from_db()
+    return job
+
+
+def claimable_jobs(now=None):
+    """Tâches en attente disponibles, ou en cours dont le bail a expiré"""
+    now = now or timezone.now()
+    return DetectionJob.objects.filter(
+        Q(status='PENDING', available_at__lte=now) |
+        Q(status='RUNNING', lease_expires_at__lt=now)
+    ).filter(attempts__lt=F('max_attempts'))
+
+
+def claim_job(job_id, worker_id, lease_seconds=None):
+    """
+    Réclame atomiquement une tâche précise.
+
+    L'UPDATE ne touche la ligne que si elle est toujours réclamable : si deux
+    workers visent la même tâche, un seul obtient rowcount == 1.
+    """
+    now = timezone.now()
+    lease_seconds = lease_seconds or settings.DETECTION_JOB_LEASE_SECONDS
+    claimed = claimable_jobs(now).filter(pk=job_id).update(
+        status='RUNNING',
+        lease_owner=worker_id,
+        lease_expires_at=now + timedelta(seconds=lease_seconds),
+        attempts=F('attempts') + 1,
+        started_at=now,
+    )
+    if not claimed:
+        return None
+    return DetectionJob.objects.get(pk=job_id)
+
+
+def claim_next_job(worker_id, lease_seconds=None, batch_size=10):
+    """Réclame la prochaine tâche par priorité décroissante puis ancienneté"""
+    candidate_ids = list(
+        claimable_jobs()
+        .order_by('-priority', 'available_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    for job_id in candidate_ids:
+        job = claim_job(job_id, worker_id, lease_seconds)
+        if job:
+            return job
+    return None
+
+
+def fail_expired_jobs():
+    """Marque en échec les tâches dont le bail a expiré après la dernière tentative"""
+    now = timezone.now()
+    expired = DetectionJob.objects.filter(
+        status='RUNNING',
+        lease_expires_at__lt=now,
+        attempts__gte=F('max_attempts'),
+    )
+    failed = 0
+    for job_id, original_file in expired.values_list('id', 'original_file'):
+        # Ligne par ligne : seule la mise à jour effective libère le fichier de la tâche
+        if expired.filter(pk=job_id).update(
+            status='FAILED',
+            lease_owner='',
+            lease_expires_at=None,
+            last_error="Bail expiré : le worker ne répond plus.",
+            finished_at=now,
+        ):
+            media_store.release(original_file)
+            failed += 1
+    return failed
+
+
+def renew_leases(worker_id, lease_seconds=None):
+    """Prolonge le bail des tâches en cours du worker ; retourne leur nombre"""
+    lease_seconds = lease_seconds or settings.DETECTION_JOB_LEASE_SECONDS
+    now = timezone.now()
+    return DetectionJob.objects.filter(status='RUNNING', lease_owner=worker_id).update(
+        lease_expires_at=now + timedelta(seconds=lease_seconds)
+    )
+
+
+def register_worker(worker_id, capacity):
+    """Enregistre (ou réactive) un worker et annonce sa capacité"""
+    worker, _ = DetectionWorker.objects.update_or_create(
+        worker_id=worker_id,
+        defaults={
+            'hostname': socket.gethostname(),
+            'pid': os.getpid(),
+            'capacity': capacity,
+            'in_flight': 0,
+            'last_heartbeat': timezone.now(),
+        }
+    )
+    return worker
+
+
+def unregister_worker(worker_id):
+    DetectionWorker.objects.filter(worker_id=worker_id).delete()
+
+
+def live_workers():
+    """Workers dont le heartbeat est récent"""
+    timeout = settings.DETECTION_WORKER_HEARTBEAT_SECONDS * 3
+    return DetectionWorker.objects.filter(last_heartbeat__gte=timezone.now() - timedelta(seconds=timeout))
+
+
+class WorkerHeartbeat(threading.Thread):
+    """
+    Thread de fond d'un worker : renouvelle ses baux et met à jour son
+    enregistrement à chaque intervalle, même pendant une longue inférence.
+    """
+
+    def __init__(self, worker_id, lease_seconds=None, interval=None):
+        super().__init__(name=f"heartbeat-{worker_id}", daemon=True)
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds or settings.DETECTION_JOB_LEASE_SECONDS
+        self.interval = interval or settings.DETECTION_WORKER_HEARTBEAT_SECONDS
+        self._stop_event = threading.Event()
+
+    def beat(self):
+        in_flight = renew_leases(self.worker_id, self.lease_seconds)
+        DetectionWorker.objects.filter(worker_id=self.worker_id).update(
+            last_heartbeat=timezone.now(),
+            in_flight=in_flight,
+        )
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                try:
+                    self.beat()
+                except Exception as e:
+                    # Un heartbeat manqué n'est pas fatal : le bail couvre plusieurs intervalles
+                    logger.error(f"Heartbeat failed for worker {self.worker_id}: {str(e)}")
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def normalize_detected_objects(detected_objects, media_type):
+    """Normalise les objets bruts du modèle (catégorie en minuscules, frame/timestamp pour les vidéos)"""
+    normalized_objects = []
+    for obj in detected_objects:
+        category = obj.get('category') or obj.get('label') or obj.get('class_name')
+        if category and isinstance(category, str) and category.strip() and category.strip() != 'error':
+            obj_data = {
+                'category': category.strip().lower(),
+                'confidence': float(obj.get('confidence', 0.0))
+            }
+            # Ajouter frame et timestamp pour les vidéos
+            if media_type == 'VIDEO':
+                obj_data['frame'] = obj.get('frame', 0)
+                obj_data['timestamp'] = obj.get('timestamp', 0.0)
+            if obj.get('bbox') is not None:
+                obj_data['bbox'] = obj['bbox']
+            normalized_objects.append(obj_data)
+        else:
+            logger.warning(f"Invalid object in detection: {obj}")
+    return normalized_objects
+
+
+def execute_job(job, worker_id):
+    """
+    Lance la détection d'une tâche, crée le DetectionLog correspondant et marque
+    la tâche terminée dans la même transaction, à condition que `worker_id`
+    détienne toujours son bail (sinon LeaseLost, rien n'est écrit).
+    """
+    from .utils import run_detection, run_video_detection
+
+    full_path = os.path.join(settings.MEDIA_ROOT, job.original_file)
+    annotated_file = attempt_output_path(job.annotated_file, job.attempts)
+    annotated_full_path = os.path.join(settings.MEDIA_ROOT, annotated_file)
+    os.makedirs(os.path.dirname(annotated_full_path), exist_ok=True)
+
+    # Chaque tentative repart des étapes mesurées à l'upload
+    timer = StageTimer(job.stage_timings)
+    if job.started_at:
+        timer.add('queue_wait', (job.started_at - job.created_at).total_seconds())
+
+    # Seuil lu une fois : celui de l'annotation, du niveau de danger et des objets retenus
+    threshold = AppSettings.load().dangerous_threshold
+    start_time = time.time()
+    if job.media_type == 'VIDEO':
+        logger.info(f"[VIDEO] Processing job {job.id}: {job.original_file}")
+        detected_objects, danger_level, model_used, video_metadata, frames_analyzed = run_video_detection(
+            full_path,
+            annotated_full_path,
+            frame_interval=job.frame_interval,
+            output_mode=job.output_mode,
+            timer=timer,
+            threshold=threshold
+        )
+    else:
+        logger.info(f"[IMAGE] Processing job {job.id}: {job.original_file}")
+        detected_objects, danger_level, model_used = run_detection(full_path, annotated_full_path, timer=timer, threshold=threshold)
+        video_metadata = None
+        frames_analyzed = 0  # 0 pour les images au lieu de None
+    processing_duration = time.time() - start_time
+
+    if detected_objects and detected_objects[0].get("category") == "error":
+        raise DetectionFailed("Erreur lors de la détection : modèle non chargé.")
+
+    # Toutes les boîtes au-dessus du plancher sont conservées ; seules celles au seuil sont retenues
+    raw_detections = grading.pack_detections(normalize_detected_objects(detected_objects, job.media_type))
+    detected_objects = grading.unpack_detections(raw_detections, threshold)
+    with transaction.atomic():
+        with timer.stage('db_write'):
+            detection_log = DetectionLog.objects.create(
+                user=job.user,
+                report=job.report,
+                media_type=job.media_type,
+                uploaded_file=annotated_file,
+                original_file=job.original_file,
+                user_location=job.user_location,
+                detected_objects=detected_objects,
+                raw_detections=raw_detections,
+                graded_threshold=threshold,
+                danger_level=danger_level,
+                model_used=model_used,
+                is_simulated=(model_used == "simulation"),
+                video_metadata=video_metadata,
+                frames_analyzed=frames_analyzed or 0,
+                processing_duration=processing_duration,
+                # Durées connues avant l'insertion ; l'écriture est enregistrée sur la tâche
+                stage_timings=timer.as_dict()
+            )
+            DetectionObject.objects.bulk_create(DetectionObject.from_log(detection_log))
+        job.stage_timings = timer.as_dict()
+        # Bail vérifié dans la transaction : une tâche reprise ailleurs ne produit jamais deux détections
+        completed = DetectionJob.objects.filter(pk=job.pk, lease_owner=worker_id).update(
+            status='SUCCEEDED',
+            detection_log=detection_log,
+            stage_timings=job.stage_timings,
+            lease_owner='',
+            lease_expires_at=None,
+            last_error='',
+            finished_at=timezone.now(),
+        )
+        if not completed:
+            raise LeaseLost(f"Bail perdu par {worker_id} avant la fin de la tâche {job.id}.")
+    return detection_log
+
+
+def release_failed_job(job, worker_id, error):
+    """Remet en attente (délai exponentiel) ou marque en échec une tâche ; renvoie (bail encore détenu, statut)"""
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        updates = {'status': 'FAILED', 'finished_at': now}
+    else:
+        # Délai exponentiel entre les tentatives
+        delay = settings.DETECTION_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        updates = {'status': 'PENDING', 'available_at': now + timedelta(seconds=delay)}
+    released = DetectionJob.objects.filter(pk=job.pk, lease_owner=worker_id).update(
+        lease_owner='', lease_expires_at=None, last_error=str(error), **updates
+    )
+    return bool(released), updates['status']
+
+
+def process_job(job, worker_id):
+    """Exécute une tâche réclamée et enregistre son issue (succès, nouvel essai ou échec)"""
+    if job.kind == 'RESCORE':
+        return process_rescore_job(job, worker_id)
+    try:
+        detection_log = execute_job(job, worker_id)
+    except LeaseLost:
+        # Le fichier original reste à la tentative qui a repris la tâche ; seul le résultat de celle-ci est supprimé
+        logger.warning(f"Detection job {job.id}: lease lost before completion (attempt {job.attempts}), result discarded")
+        media_store.remove_annotated_output(attempt_output_path(job.annotated_file, job.attempts))
+        DETECTION_JOBS_COMPLETED.labels(job.media_type, 'lease_lost').inc()
+        return None
+    except Exception as e:
+        logger.error(f"Detection job {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {str(e)}", exc_info=True)
+        released, status = release_failed_job(job, worker_id, e)
+        # Résultat partiel propre à cette tentative : la suivante écrit ailleurs
+        media_store.remove_annotated_output(attempt_output_path(job.annotated_file, job.attempts))
+        if released and status == 'FAILED':
+            # La référence prise à l'upload n'est pas transmise à une détection
+            media_store.release(job.original_file)
+        DETECTION_JOBS_COMPLETED.labels(job.media_type, 'failed' if status == 'FAILED' else 'retried').inc()
+        return None
+
+    DETECTION_JOBS_COMPLETED.labels(job.media_type, 'succeeded').inc()
+    observe_detection(
+        job.media_type,
+        detection_log.model_used,
+        job.stage_timings,
+        detection_log.processing_duration,
+        frames_analyzed=detection_log.frames_analyzed,
+        frame_count=(detection_log.video_metadata or {}).get('frame_count', 0),
+    )
+
+    logger.info(f"Detection job {job.id} succeeded: DetectionLog {detection_log.id}")
+    return detection_log
+
+
+def enqueue_rescore(categories, user=None):
+    """
+    Met en file la re-notation des détections contenant ces catégories (après
+    ajout, modification ou suppression de catégories dangereuses, voir
+    signals.py). Une tâche encore en attente est complétée plutôt que doublée.
+    """
+    categories = {category.strip().lower() for category in categories if category and category.strip()}
+    if not categories:
+        return None
+    with transaction.atomic():
+        job = DetectionJob.objects.select_for_update().filter(kind='RESCORE', status='PENDING', attempts=0).first()
+        if job is not None:
+            job.categories = sorted(categories | set(job.categories or []))
+            job.save(update_fields=['categories'])
+        else:
+            job = DetectionJob.objects.create(
+                user=user,
+                kind='RESCORE',
+                original_file='',
+                annotated_file='',
+                categories=sorted(categories),
+                priority=PRIORITY_MAINTENANCE,
+            )
+    logger.info(f"Enqueued rescore job {job.id}: {job.categories}")
+
+    if settings.DETECTION_JOBS_EAGER:
+        claimed = claim_job(job.id, 'eager', EAGER_LEASE_SECONDS)
+        if claimed:
+            process_job(claimed, 'eager')
+        job.refresh_from_db()
+    return job
+
+
+def process_rescore_job(job, worker_id):
+    """Re-note les détections d'une tâche RESCORE par lots, en enregistrant la progression après chacun"""
+    running = DetectionJob.objects.filter(kind='RESCORE', status='RUNNING', lease_expires_at__gte=timezone.now())
+    if running.exclude(pk=job.pk).exists():
+        # Deux re-notations simultanées se disputeraient les mêmes détections : reprise plus tard
+        DetectionJob.objects.filter(pk=job.pk, lease_owner=worker_id).update(
+            status='PENDING', attempts=F('attempts') - 1, lease_owner='', lease_expires_at=None,
+            available_at=timezone.now() + timedelta(seconds=settings.DETECTION_JOB_RETRY_DELAY),
+        )
+        return None
+
+    def progress(scanned, changed, total):
+        DetectionJob.objects.filter(pk=job.pk).update(progress={'scanned': scanned, 'changed': changed, 'total': total})
+
+    try:
+        scanned, changed = rescore_categories(job.categories or [], progress=progress)
+    except Exception as e:
+        logger.error(f"Rescore job {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {str(e)}", exc_info=True)
+        release_failed_job(job, worker_id, e)
+        return None
+
+    DetectionJob.objects.filter(pk=job.pk, lease_owner=worker_id).update(
+        status='SUCCEEDED',
+        lease_owner='',
+        lease_expires_at=None,
+        last_error='',
+        finished_at=timezone.now(),
+    )
+    logger.info(f"Rescore job {job.id} succeeded: {changed} of {scanned} detection(s) changed")
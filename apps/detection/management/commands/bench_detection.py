@@ -0,0 +1,243 @@
+import json
+import os
+import platform
+import shutil
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.core.models import AppSettings
+from apps.detection.timing import StageTimer, percentile, stage_breakdown
+from apps.detection.upload_handlers import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+from apps.detection.utils import DetectionModel, run_detection, run_video_detection
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus depuis son démarrage (None si indisponible)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilo-octets sous Linux, octets sous macOS
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+@contextmanager
+def settings_override(model=None, threshold=None):
+    """Remplace le modèle ou le seuil pour la durée du benchmark, sans modifier AppSettings en base"""
+    if model is None and threshold is None:
+        yield AppSettings.load()
+        return
+    app_settings = AppSettings.load()
+    if model is not None:
+        app_settings.active_detection_model = model
+    if threshold is not None:
+        app_settings.dangerous_threshold = threshold
+    original_load = AppSettings.__dict__['load']
+    AppSettings.load = classmethod(lambda cls: app_settings)
+    DetectionModel._instance = None
+    try:
+        yield app_settings
+    finally:
+        AppSettings.load = original_load
+        DetectionModel._instance = None
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 4) if values else None,
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': values[-1] if values else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit et la latence de run_detection / run_video_detection sur des médias "
+        "synthétiques ou un répertoire d'échantillons ; résultat en JSON pour le suivi des régressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', help="Répertoire d'images et de vidéos à utiliser au lieu de médias synthétiques.")
+        parser.add_argument('--images', type=int, default=20, help="Nombre d'images synthétiques (défaut : 20).")
+        parser.add_argument('--videos', type=int, default=2, help="Nombre de vidéos synthétiques (défaut : 2).")
+        parser.add_argument('--resolution', default='1280x720', help="Résolution des médias synthétiques, LxH (défaut : 1280x720).")
+        parser.add_argument('--video-seconds', type=float, default=10, help="Durée des vidéos synthétiques (défaut : 10 s).")
+        parser.add_argument('--fps', type=int, default=25, help="Cadence des vidéos synthétiques (défaut : 25).")
+        parser.add_argument('--frame-interval', type=int, default=30, help="Intervalle d'analyse vidéo (défaut : 30).")
+        parser.add_argument('--output-mode', default='standard', choices=('standard', 'hls', 'timelapse'))
+        parser.add_argument('--concurrency', type=int, default=1, help="Détections simultanées (un modèle par thread au-delà de 1).")
+        parser.add_argument('--warmup', type=int, default=1, help="Images traitées avant la mesure (chargement du modèle).")
+        parser.add_argument('--model', help="Modèle à utiliser à la place du modèle actif ('simulation' possible sans poids).")
+        parser.add_argument('--threshold', type=float, help="Seuil de confiance à la place du seuil actif.")
+        parser.add_argument('--seed', type=int, default=0, help="Graine des médias synthétiques.")
+        parser.add_argument('--output', help="Écrire le JSON dans ce fichier plutôt que sur la sortie standard.")
+
+    def handle(self, *args, **options):
+        try:
+            width, height = (int(value) for value in options['resolution'].lower().split('x'))
+        except ValueError:
+            raise CommandError("--resolution attend LARGEURxHAUTEUR, par exemple 1280x720.")
+        concurrency = max(1, options['concurrency'])
+
+        work_dir = tempfile.mkdtemp(prefix='bench_detection_')
+        try:
+            if options['samples']:
+                images, videos = self.collect_samples(options['samples'])
+            else:
+                rng = np.random.default_rng(options['seed'])
+                images = [self.make_image(work_dir, index, width, height, rng) for index in range(options['images'])]
+                videos = [
+                    self.make_video(work_dir, index, width, height, options['fps'], options['video_seconds'], rng)
+                    for index in range(options['videos'])
+                ]
+            if not images and not videos:
+                raise CommandError("Aucun média à traiter.")
+
+            if concurrency > 1:
+                DetectionModel.per_thread = True
+
+            with settings_override(options['model'], options['threshold']) as app_settings:
+                # Le premier appel charge le modèle : exclu de la mesure
+                for index in range(min(options['warmup'], len(images))):
+                    run_detection(images[index], os.path.join(work_dir, f"warmup_{index}.jpg"))
+
+                report = {
+                    'timestamp': timezone.now().isoformat(),
+                    'host': socket.gethostname(),
+                    'platform': platform.platform(),
+                    'python': platform.python_version(),
+                    'opencv': cv2.__version__,
+                    'cpu_count': os.cpu_count(),
+                    'model': app_settings.active_detection_model,
+                    'threshold': app_settings.dangerous_threshold,
+                    'concurrency': concurrency,
+                    'source': options['samples'] or f"synthetic {width}x{height}",
+                }
+                if images:
+                    report['images'] = self.bench(images, work_dir, concurrency, self.run_image)
+                if videos:
+                    report['videos'] = self.bench(
+                        videos, work_dir, concurrency, self.run_video,
+                        frame_interval=options['frame_interval'], output_mode=options['output_mode'],
+                    )
+                report['peak_rss_bytes'] = peak_rss_bytes()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(f"Résultats écrits dans {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def collect_samples(self, directory):
+        if not os.path.isdir(directory):
+            raise CommandError(f"Répertoire introuvable : {directory}")
+        images, videos = [], []
+        for name in sorted(os.listdir(directory)):
+            ext = os.path.splitext(name)[1].lower()
+            if ext in IMAGE_EXTENSIONS:
+                images.append(os.path.join(directory, name))
+            elif ext in VIDEO_EXTENSIONS:
+                videos.append(os.path.join(directory, name))
+        return images, videos
+
+    def make_image(self, work_dir, index, width, height, rng):
+        """Bruit et formes aléatoires : l'image n'est ni uniforme ni triviale à compresser"""
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        for _ in range(5):
+            x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.rectangle(image, (x, y), (x + width // 8, y + height // 8), color, -1)
+        path = os.path.join(work_dir, f"image_{index:04d}.jpg")
+        cv2.imwrite(path, image)
+        return path
+
+    def make_video(self, work_dir, index, width, height, fps, seconds, rng):
+        """Fond bruité fixe et rectangle en mouvement"""
+        path = os.path.join(work_dir, f"video_{index:04d}.mp4")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        background = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        size = max(8, min(width, height) // 6)
+        for frame_index in range(max(1, int(fps * seconds))):
+            frame = background.copy()
+            x = (frame_index * 7) % max(1, width - size)
+            y = (frame_index * 3) % max(1, height - size)
+            cv2.rectangle(frame, (x, y), (x + size, y + size), (0, 0, 255), -1)
+            writer.write(frame)
+        writer.release()
+        return path
+
+    def run_image(self, path, output_path, timer, **kwargs):
+        detected_objects, _, _ = run_detection(path, output_path, timer=timer)
+        failed = bool(detected_objects) and detected_objects[0].get('category') == 'error'
+        return {'failed': failed, 'frames': 1, 'analyzed': 1}
+
+    def run_video(self, path, output_path, timer, frame_interval=30, output_mode='standard'):
+        if output_mode == 'hls':
+            output_path = os.path.join(os.path.splitext(output_path)[0] + '_hls', 'index.m3u8')
+        _, _, _, video_info, frames_analyzed = run_video_detection(
+            path, output_path, frame_interval=frame_interval, output_mode=output_mode, timer=timer
+        )
+        return {'failed': False, 'frames': video_info['frame_count'], 'analyzed': frames_analyzed}
+
+    def bench(self, paths, work_dir, concurrency, run, **kwargs):
+        """Traite tous les médias (en parallèle si demandé) et agrège latences, débit et étapes"""
+        def timed(index_path):
+            index, path = index_path
+            timer = StageTimer()
+            output_path = os.path.join(work_dir, f"out_{run.__name__}_{index:04d}{os.path.splitext(path)[1]}")
+            start = time.perf_counter()
+            try:
+                result = run(path, output_path, timer, **kwargs)
+            except Exception as e:
+                self.stderr.write(f"Échec sur {os.path.basename(path)} : {str(e)}")
+                result = {'failed': True, 'frames': 0, 'analyzed': 0}
+            finally:
+                if concurrency > 1:
+                    connection.close()
+            result['latency'] = time.perf_counter() - start
+            result['timings'] = timer.as_dict()
+            return result
+
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(timed, enumerate(paths)))
+        else:
+            results = [timed(item) for item in enumerate(paths)]
+        wall = time.perf_counter() - start
+
+        succeeded = [result for result in results if not result['failed']]
+        frames = sum(result['frames'] for result in succeeded)
+        analyzed = sum(result['analyzed'] for result in succeeded)
+        stages = stage_breakdown(('', '', result['timings']) for result in succeeded)
+        return {
+            'count': len(results),
+            'failed': len(results) - len(succeeded),
+            'wall_seconds': round(wall, 4),
+            'throughput_per_second': round(len(succeeded) / wall, 3) if wall else None,
+            'frames_per_second': round(frames / wall, 2) if wall else None,
+            'analyzed_frames_per_second': round(analyzed / wall, 2) if wall else None,
+            'latency_seconds': summarize([round(result['latency'], 4) for result in succeeded]),
+            'stages': {stage['name']: {'p50': stage['p50'], 'p95': stage['p95']} for stage in stages[0]['stages']} if stages else {},
+        }
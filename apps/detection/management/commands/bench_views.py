@@ -0,0 +1,155 @@
+import io
+import json
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Count, Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.detection.dates import filter_days
+from apps.detection.models import DetectionLog, DetectionObject, Report
+from apps.detection.timing import percentile
+from apps.users.models import User
+
+from .seed_detections import SEED_EMAIL_DOMAIN
+
+# Pages de liste et de statistiques qui parcourent les DetectionLog
+DEFAULT_VIEWS = ('detection:history', 'detection:reports_history', 'users:home', 'dashboard:stats')
+
+
+def query_plan_checks(user):
+    """Requêtes représentatives des listes et l'index que chacune doit utiliser"""
+    today = timezone.localdate()
+    logs = DetectionLog.objects.order_by('-detection_timestamp', '-id')
+    newest = logs.first()
+    return (
+        ('historique par utilisateur', logs.filter(user=user)[:10], 'detlog_user_ts_idx'),
+        ('page suivante (curseur)', logs.filter(
+            Q(detection_timestamp__lt=newest.detection_timestamp) | Q(detection_timestamp=newest.detection_timestamp, id__lt=newest.id)
+        )[:10], 'detlog_ts_idx'),
+        ('rapports par utilisateur', Report.objects.filter(user=user).order_by('-created_at', '-id')[:10], 'report_user_created_idx'),
+        ('filtre niveau de danger', logs.filter(danger_level='HYPERDANGEROUS')[:10], 'detlog_danger_ts_idx'),
+        ('filtre par période', filter_days(logs, 'detection_timestamp', today - timedelta(days=7), today)[:10], 'detlog_ts_idx'),
+        ('comptage par type et niveau', DetectionLog.objects.filter(media_type='VIDEO', danger_level='DANGEROUS').order_by(), 'detlog_media_danger_idx'),
+        ('comptage par localisation', DetectionLog.objects.order_by('user_location').values('user_location').annotate(count=Count('id')), 'detlog_location_idx'),
+        ('filtre par classe', DetectionObject.objects.filter(category='couteau').values('detection_log_id'), 'detobj_category_log_idx'),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le nombre de requêtes SQL et la latence des pages d'historique et de statistiques "
+        "à plusieurs volumes de données, générés par seed_detections dans une base de test dédiée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', default='1000,10000,100000', help="Volumes de détections à mesurer (défaut : 1000,10000,100000).")
+        parser.add_argument('--views', default=','.join(DEFAULT_VIEWS), help="Noms de routes à mesurer, séparés par des virgules.")
+        parser.add_argument('--repeat', type=int, default=3, help="Requêtes par vue et par volume (défaut : 3).")
+        parser.add_argument('--role', default='ADMIN', choices=('ADMIN', 'SUPERVISOR', 'OPERATOR'), help="Rôle de l'utilisateur connecté.")
+        parser.add_argument('--seed', type=int, default=0, help="Graine de génération des données.")
+        parser.add_argument('--keepdb', action='store_true', help="Conserver la base de test (les volumes déjà générés sont réutilisés).")
+        parser.add_argument('--output', help="Écrire le JSON dans ce fichier.")
+        parser.add_argument('--skip-plans', action='store_true', help="Ne pas vérifier les plans de requête (EXPLAIN QUERY PLAN, SQLite).")
+
+    def handle(self, *args, **options):
+        try:
+            tiers = sorted(int(tier) for tier in options['tiers'].split(','))
+        except ValueError:
+            raise CommandError("--tiers attend des entiers séparés par des virgules.")
+        views = [name.strip() for name in options['views'].split(',') if name.strip()]
+        urls = {name: reverse(name) for name in views}
+
+        # Jamais sur la base réelle : base de test créée (ou réutilisée) pour la mesure
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = self.run_tiers(tiers, urls, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        self.print_table(results)
+        if not options['output']:
+            self.stdout.write(output)
+
+        missing = sorted({
+            check['query'] for tier_result in results for check in tier_result.get('query_plans', []) if not check['uses_index']
+        })
+        if missing:
+            raise CommandError(f"Index non utilisé pour : {', '.join(missing)}")
+
+    def run_tiers(self, tiers, urls, options):
+        results = []
+        for tier in tiers:
+            seeded = DetectionLog.objects.filter(user__email__endswith=f"@{SEED_EMAIL_DOMAIN}").count()
+            if seeded < tier:
+                self.stderr.write(f"Génération de {tier - seeded} détection(s) pour le volume {tier}...")
+                call_command(
+                    'seed_detections', detections=tier - seeded, users=max(20, tier // 500),
+                    seed=options['seed'] + seeded, stdout=io.StringIO(),
+                )
+
+            user = User.objects.filter(email__endswith=f"@{SEED_EMAIL_DOMAIN}", role=options['role']).first()
+            if user is None:
+                user = User.objects.filter(email__endswith=f"@{SEED_EMAIL_DOMAIN}").first()
+                user.role = options['role']
+                user.save(update_fields=['role'])
+            client = Client()
+            client.force_login(user)
+
+            tier_result = {'detections': DetectionLog.objects.count(), 'views': {}}
+            for name, url in urls.items():
+                latencies = []
+                queries = None
+                status = None
+                for _ in range(max(1, options['repeat'])):
+                    # Journal des requêtes plafonné (9000) : rempli par la génération, il fausserait le comptage
+                    reset_queries()
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        response = client.get(url)
+                        latencies.append(time.perf_counter() - start)
+                    queries = len(captured.captured_queries)
+                    status = response.status_code
+                latencies.sort()
+                tier_result['views'][name] = {
+                    'status': status,
+                    'queries': queries,
+                    'p50_seconds': round(percentile(latencies, 0.5), 4),
+                    'max_seconds': round(latencies[-1], 4),
+                }
+            if not options['skip_plans'] and connection.vendor == 'sqlite':
+                tier_result['query_plans'] = self.check_query_plans(user)
+            results.append(tier_result)
+        return results
+
+    def check_query_plans(self, user):
+        """EXPLAIN QUERY PLAN de chaque requête type : l'index attendu doit apparaître dans le plan"""
+        checks = []
+        for label, queryset, index in query_plan_checks(user):
+            plan = queryset.explain()
+            checks.append({'query': label, 'index': index, 'uses_index': index in plan, 'plan': plan})
+        return checks
+
+    def print_table(self, results):
+        self.stderr.write(f"\n{'Vue':<28}{'Détections':>12}{'Statut':>8}{'Requêtes':>10}{'p50 (s)':>10}{'max (s)':>10}")
+        for tier_result in results:
+            for name, view in tier_result['views'].items():
+                self.stderr.write(
+                    f"{name:<28}{tier_result['detections']:>12}{view['status']:>8}{view['queries']:>10}"
+                    f"{view['p50_seconds']:>10}{view['max_seconds']:>10}"
+                )
+            for check in tier_result.get('query_plans', []):
+                status = 'OK' if check['uses_index'] else 'ABSENT'
+                self.stderr.write(f"  plan {check['query']:<30}{check['index']:<26}{status}")
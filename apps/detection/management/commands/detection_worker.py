@@ -0,0 +1,111 @@
+import logging
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.detection.jobs import (
+    WorkerHeartbeat,
+    claim_next_job,
+    default_worker_id,
+    fail_expired_jobs,
+    process_job,
+    register_worker,
+    unregister_worker,
+)
+from apps.detection.utils import DetectionModel
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Traite les tâches de détection en attente (plusieurs workers, sur un ou plusieurs hôtes, peuvent tourner en parallèle)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', default=None, help="Identifiant du worker (défaut : hôte:pid).")
+        parser.add_argument('--concurrency', type=int, default=1, help="Nombre de tâches traitées simultanément (capacité annoncée).")
+        parser.add_argument('--lease', type=int, default=None, help="Durée du bail en secondes (défaut : DETECTION_JOB_LEASE_SECONDS).")
+        parser.add_argument('--heartbeat', type=float, default=None, help="Intervalle du heartbeat en secondes (défaut : DETECTION_WORKER_HEARTBEAT_SECONDS).")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Attente en secondes quand la file est vide.")
+        parser.add_argument('--once', action='store_true', help="Traiter les tâches disponibles puis quitter.")
+        parser.add_argument('--max-jobs', type=int, default=0, help="Quitter après N tâches (0 = illimité).")
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        concurrency = max(1, options['concurrency'])
+        lease_seconds = options['lease'] or settings.DETECTION_JOB_LEASE_SECONDS
+        heartbeat_interval = options['heartbeat'] or settings.DETECTION_WORKER_HEARTBEAT_SECONDS
+        if heartbeat_interval >= lease_seconds:
+            self.stdout.write(self.style.WARNING(
+                "Le heartbeat est plus lent que le bail : les tâches longues risquent d'être reprises par un autre worker."
+            ))
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        if concurrency > 1:
+            DetectionModel.per_thread = True
+
+        register_worker(worker_id, concurrency)
+        heartbeat = WorkerHeartbeat(worker_id, lease_seconds, heartbeat_interval)
+        heartbeat.start()
+        self.stdout.write(f"Worker {worker_id} démarré (capacité {concurrency}).")
+
+        in_flight = set()
+        claimed = 0
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='detection')
+        try:
+            while not self.stopping:
+                in_flight = {future for future in in_flight if not future.done()}
+                if len(in_flight) >= concurrency:
+                    wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    continue
+
+                fail_expired_jobs()
+                job = claim_next_job(worker_id, lease_seconds)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Tâche {job.id} réclamée (tentative {job.attempts}/{job.max_attempts}).")
+                in_flight.add(executor.submit(self._run_job, job, worker_id))
+                claimed += 1
+                if options['max_jobs'] and claimed >= options['max_jobs']:
+                    break
+        finally:
+            # Terminer les tâches en cours avant de libérer l'enregistrement du worker
+            wait(in_flight)
+            executor.shutdown()
+            heartbeat.stop()
+            unregister_worker(worker_id)
+
+        self.stdout.write(f"Worker {worker_id} arrêté ({claimed} tâche(s) traitée(s)).")
+
+    def _run_job(self, job, worker_id):
+        try:
+            detection_log = process_job(job, worker_id)
+            if job.kind == 'RESCORE':
+                job.refresh_from_db(fields=['status', 'progress'])
+                progress = job.progress or {}
+                self.stdout.write(
+                    f"Tâche {job.id} (re-notation) {job.get_status_display().lower()} : "
+                    f"{progress.get('changed', 0)} détection(s) modifiée(s) sur {progress.get('scanned', 0)}."
+                )
+            elif detection_log:
+                self.stdout.write(self.style.SUCCESS(f"Tâche {job.id} terminée : détection {detection_log.id}."))
+            else:
+                self.stdout.write(self.style.WARNING(f"Tâche {job.id} en échec."))
+        finally:
+            # Chaque thread a sa propre connexion à la base
+            connection.close()
+
+    def _request_stop(self, signum, frame):
+        # Terminer les tâches en cours avant de quitter
+        logger.info(f"Signal {signum} received, stopping after current jobs")
+        self.stopping = True
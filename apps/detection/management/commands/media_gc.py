@@ -0,0 +1,206 @@
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.detection.models import DetectionJob, DetectionLog, MediaBlob, UploadSession
+from apps.detection.storage import CAS_DIRECTORY, annotated_output_paths, attempt_output_path
+from apps.users.models import User
+
+logger = logging.getLogger(__name__)
+
+# Répertoires de MEDIA_ROOT dont les fichiers sont tous référencés en base ; les autres sont seulement comptés
+MANAGED_DIRECTORIES = ('uploads', 'detection_results', CAS_DIRECTORY, 'profile_pics')
+
+ITERATOR_CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les fichiers média qui ne sont plus référencés en base (uploads échoués, "
+        "détections supprimées en cascade) et affiche l'occupation disque par répertoire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Lister les orphelins sans rien supprimer.")
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help="Ignorer les fichiers modifiés depuis moins de N heures (uploads et détections en cours). Défaut : 24.",
+        )
+        parser.add_argument(
+            '--fix-refcounts', action='store_true',
+            help="Recalculer les compteurs de références des fichiers du stockage adressé par contenu avant le balayage.",
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        self.root = os.path.realpath(settings.MEDIA_ROOT)
+        self.cutoff = time.time() - options['min_age'] * 3600
+        if not os.path.isdir(self.root):
+            self.stdout.write(f"MEDIA_ROOT introuvable : {self.root}")
+            return
+
+        if options['fix_refcounts']:
+            self.fix_refcounts(timezone.now() - timedelta(hours=options['min_age']))
+
+        self.referenced_files, self.referenced_directories = self.collect_references()
+        self.stdout.write(
+            f"{len(self.referenced_files)} fichier(s) et {len(self.referenced_directories)} répertoire(s) HLS référencés."
+        )
+
+        # {répertoire de premier niveau: [fichiers, octets, orphelins, octets orphelins]}
+        self.usage = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    self.scan(entry.path, entry.name, entry.name, entry.name in MANAGED_DIRECTORIES)
+                elif entry.is_file(follow_symlinks=False):
+                    self.account('.', entry.stat(follow_symlinks=False).st_size)
+
+        self.report()
+
+    def collect_references(self):
+        """Chemins relatifs encore référencés, lus par values_list sans instancier de modèles"""
+        files = set()
+        directories = set()
+
+        def add_annotated(name):
+            derived, directory = annotated_output_paths(name)
+            files.update(derived)
+            if directory:
+                directories.add(directory)
+
+        logs = DetectionLog.objects.order_by().values_list('original_file', 'uploaded_file')
+        for original_file, uploaded_file in logs.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            if original_file:
+                files.add(original_file)
+            if uploaded_file:
+                add_annotated(uploaded_file)
+
+        # Tâches non terminées : le résultat annoté est peut-être en cours d'écriture
+        jobs = DetectionJob.objects.filter(status__in=('PENDING', 'RUNNING')).order_by()
+        rows = jobs.values_list('original_file', 'annotated_file', 'attempts')
+        for original_file, annotated_file, attempts in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            files.add(original_file)
+            add_annotated(attempt_output_path(annotated_file, attempts))
+
+        sessions = UploadSession.objects.filter(status='UPLOADING').order_by().values_list('relative_path', flat=True)
+        files.update(sessions.iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+
+        blobs = MediaBlob.objects.filter(ref_count__gt=0).order_by().values_list('path', flat=True)
+        files.update(blobs.iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+
+        pictures = User.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        files.update(pictures.order_by().values_list('profile_picture', flat=True).iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+
+        files.discard('')
+        return files, directories
+
+    def fix_refcounts(self, referenced_before):
+        """Aligne ref_count sur le nombre réel de détections et de tâches en attente qui pointent vers chaque fichier"""
+        counts = {}
+        for queryset in (
+            DetectionLog.objects.filter(original_file__startswith=f"{CAS_DIRECTORY}/"),
+            DetectionJob.objects.filter(original_file__startswith=f"{CAS_DIRECTORY}/", status__in=('PENDING', 'RUNNING')),
+        ):
+            grouped = queryset.order_by().values_list('original_file').annotate(total=Count('pk'))
+            for path, total in grouped.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+                counts[path] = counts.get(path, 0) + total
+
+        fixed = dropped = 0
+        # Les fichiers référencés récemment sont ignorés : un upload peut avoir pris sa référence sans avoir encore créé sa tâche
+        blobs = MediaBlob.objects.filter(last_referenced_at__lt=referenced_before).order_by()
+        for pk, path, ref_count in list(blobs.values_list('pk', 'path', 'ref_count')):
+            actual = counts.get(path, 0)
+            if actual == ref_count:
+                continue
+            if self.verbosity >= 2:
+                self.stdout.write(f"{path} : {ref_count} -> {actual} référence(s)")
+            if actual == 0:
+                dropped += 1
+            else:
+                fixed += 1
+            if self.dry_run:
+                continue
+            # Mise à jour conditionnelle : un compteur modifié entre-temps est laissé tel quel
+            if actual == 0:
+                MediaBlob.objects.filter(pk=pk, ref_count=ref_count).delete()
+            else:
+                MediaBlob.objects.filter(pk=pk, ref_count=ref_count).update(ref_count=actual)
+
+        prefix = "[dry-run] " if self.dry_run else ""
+        self.stdout.write(f"{prefix}{fixed} compteur(s) corrigé(s), {dropped} fichier(s) sans référence.")
+
+    def scan(self, path, relative, top, managed):
+        """Parcours en profondeur par os.scandir : aucune liste complète des fichiers n'est construite"""
+        if relative in self.referenced_directories:
+            managed = False
+        removed = False
+        with os.scandir(path) as entries:
+            for entry in entries:
+                entry_relative = f"{relative}/{entry.name}"
+                if entry.is_dir(follow_symlinks=False):
+                    removed |= self.scan(entry.path, entry_relative, top, managed)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                orphan = managed and entry_relative not in self.referenced_files and stat.st_mtime < self.cutoff
+                self.account(top, stat.st_size, orphan)
+                if orphan:
+                    removed = True
+                    self.delete(entry.path, entry_relative)
+
+        # Les répertoires vidés par le balayage (dates, préfixes de hachage, HLS) sont supprimés aussi
+        if removed and not self.dry_run and relative != top:
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+        return removed
+
+    def delete(self, full_path, relative):
+        if self.verbosity >= 2:
+            self.stdout.write(f"{'[dry-run] ' if self.dry_run else ''}Orphelin : {relative}")
+        if self.dry_run:
+            return
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"media_gc could not delete {relative}: {str(e)}")
+
+    def account(self, top, size, orphan=False):
+        usage = self.usage.setdefault(top, [0, 0, 0, 0])
+        usage[0] += 1
+        usage[1] += size
+        if orphan:
+            usage[2] += 1
+            usage[3] += size
+
+    def report(self):
+        def megabytes(size):
+            return f"{size / (1024 * 1024):.1f} Mo"
+
+        self.stdout.write(f"\n{'Répertoire':<22}{'Fichiers':>12}{'Taille':>14}{'Orphelins':>12}{'Libéré':>14}")
+        totals = [0, 0, 0, 0]
+        for directory, usage in sorted(self.usage.items(), key=lambda item: -item[1][1]):
+            self.stdout.write(
+                f"{directory:<22}{usage[0]:>12}{megabytes(usage[1]):>14}{usage[2]:>12}{megabytes(usage[3]):>14}"
+            )
+            totals = [total + value for total, value in zip(totals, usage)]
+
+        prefix = "[dry-run] " if self.dry_run else ""
+        verb = "à supprimer" if self.dry_run else "supprimé(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{prefix}{totals[0]} fichier(s), {megabytes(totals[1])} au total ; "
+            f"{totals[2]} orphelin(s) {verb} ({megabytes(totals[3])})."
+        ))
+        logger.info(f"media_gc: {totals[2]} orphan(s), {totals[3]} bytes (dry_run={self.dry_run})")
@@ -0,0 +1,65 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from apps.detection.models import DetectionJob, DetectionLog, MediaBlob
+from apps.detection.storage import CAS_DIRECTORY, media_store
+
+
+class Command(BaseCommand):
+    help = "Déplace les fichiers originaux existants dans le stockage adressé par contenu (cas/) et les déduplique."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Afficher ce qui serait migré sans rien modifier.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # Liste matérialisée : les lignes sont mises à jour pendant le parcours
+        legacy_paths = list(
+            DetectionLog.objects
+            .exclude(original_file__isnull=True)
+            .exclude(original_file='')
+            .exclude(original_file__startswith=f"{CAS_DIRECTORY}/")
+            .order_by()
+            .values_list('original_file', flat=True)
+            .distinct()
+        )
+
+        migrated = duplicates = missing = 0
+        bytes_saved = 0
+        for old_path in legacy_paths:
+            full_path = os.path.join(settings.MEDIA_ROOT, old_path)
+            if not os.path.isfile(full_path):
+                self.stdout.write(self.style.WARNING(f"Fichier manquant : {old_path}"))
+                missing += 1
+                continue
+            if dry_run:
+                self.stdout.write(f"[dry-run] {old_path}")
+                migrated += 1
+                continue
+
+            size = os.path.getsize(full_path)
+            blob = media_store.adopt(old_path)
+            # Un blob n'existe jamais sans référence : plus d'une référence signifie un contenu déjà stocké
+            if blob.ref_count > 1:
+                duplicates += 1
+                bytes_saved += size
+
+            # Une référence par détection, plus une par tâche encore en file (déjà comptée par adopt)
+            logs = DetectionLog.objects.filter(original_file=old_path).update(original_file=blob.path)
+            pending_jobs = DetectionJob.objects.filter(
+                original_file=old_path, status__in=('PENDING', 'RUNNING')
+            ).count()
+            DetectionJob.objects.filter(original_file=old_path).update(original_file=blob.path)
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + logs + pending_jobs - 1)
+
+            migrated += 1
+            self.stdout.write(f"{old_path} -> {blob.path} ({logs} détection(s))")
+
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{migrated} fichier(s) migré(s), {duplicates} doublon(s) supprimé(s) "
+            f"({bytes_saved / (1024 * 1024):.1f} Mo libérés), {missing} manquant(s)."
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.detection import facets, rollups, summaries
+from apps.detection.dates import parse_day
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les agrégats quotidiens (DetectionDailyRollup) des pages de statistiques "
+        "à partir des détections, objets détectés et validations, puis les compteurs "
+        "des filtres des pages d'historique (FacetCount) et le résumé des rapports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Ne recalculer qu'à partir de ce jour inclus (AAAA-MM-JJ).")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_day(options['since'])
+            if since is None:
+                raise CommandError("--since attend une date AAAA-MM-JJ.")
+        count = rollups.rebuild(since)
+        scope = f"depuis le {since:%d/%m/%Y}" if since else "en totalité"
+        self.stdout.write(self.style.SUCCESS(f"{count} ligne(s) d'agrégats recalculée(s) {scope}."))
+        # Compteurs de filtres et résumés de rapport non datés : toujours recalculés en totalité
+        count = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{count} compteur(s) de filtres recalculé(s)."))
+        count = summaries.refresh()
+        self.stdout.write(self.style.SUCCESS(f"{count} résumé(s) de rapport recalculé(s)."))
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import AppSettings
+from apps.detection import regrade
+from apps.detection.models import DetectionLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Réapplique le seuil de confiance et les catégories dangereuses actuels aux détections "
+        "enregistrées, sans relancer le modèle : objets retenus (à partir des boîtes brutes) et "
+        "niveau de danger, puis agrégats, compteurs de filtres et résumés de rapport."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float,
+            help="Seuil à appliquer (défaut : seuil des paramètres de l'application).",
+        )
+        parser.add_argument(
+            '--stale-only', action='store_true',
+            help="Seulement les détections notées à un autre seuil (changement de seuil sans changement de catégories).",
+        )
+        parser.add_argument('--batch-size', type=int, default=regrade.BATCH_SIZE, help="Détections par lot.")
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        if threshold is not None and not settings.DETECTION_RAW_CONFIDENCE_FLOOR <= threshold <= 1.0:
+            raise CommandError(f"--threshold attend une valeur entre {settings.DETECTION_RAW_CONFIDENCE_FLOOR} et 1.0.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être positif.")
+
+        queryset = DetectionLog.objects.all()
+        if options['stale_only']:
+            threshold = AppSettings.load().dangerous_threshold if threshold is None else threshold
+            queryset = queryset.filter(raw_detections__isnull=False).exclude(graded_threshold=threshold)
+
+        started = time.perf_counter()
+
+        def progress(scanned, changed, total):
+            self.stdout.write(f"{scanned}/{total} détection(s) examinée(s), {changed} modifiée(s)")
+
+        scanned, changed = regrade.regrade(queryset, threshold, options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"{changed} détection(s) re-notée(s) sur {scanned} en {time.perf_counter() - started:.1f} s."
+        ))
@@ -0,0 +1,261 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.models import AppSettings
+from apps.detection import facets, grading, rollups, summaries
+from apps.detection.models import (
+    CategoryValidation, DangerousCategory, DetectionLog, DetectionObject, ModelValidation, Report,
+)
+from apps.users.models import User
+
+# Domaine réservé (RFC 2606) : les comptes générés ne peuvent pas recevoir de courriel
+SEED_EMAIL_DOMAIN = 'seed.example.test'
+
+SEED_CATEGORIES = (
+    ('pistolet', 'HYPERDANGEROUS'),
+    ('fusil', 'HYPERDANGEROUS'),
+    ('couteau', 'DANGEROUS'),
+    ('sword', 'DANGEROUS'),
+)
+BENIGN_CATEGORIES = ('person', 'car', 'backpack', 'umbrella', 'bicycle', 'phone')
+LOCATIONS = (
+    'Place de la République', 'Gare Centrale', 'Marché Central', 'Avenue de la Paix',
+    'Parc Municipal', 'Boulevard du Port', 'Quartier Nord', 'Université', '',
+)
+MODELS = ('models_ai/detection/weapon.pt', 'simulation')
+ROLE_WEIGHTS = ((User.Role.OPERATOR, 80), (User.Role.SUPERVISOR, 15), (User.Role.ADMINISTRATOR, 5))
+
+
+@contextmanager
+def settable_created_at(model):
+    """Autorise l'écriture de created_at (auto_now_add) pour étaler les données dans le temps"""
+    field = model._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère en masse des utilisateurs, rapports, détections (images et vidéos) et validations "
+        "réalistes pour mesurer les vues d'historique et de statistiques à grande échelle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--detections', type=int, default=1000, help="Nombre de détections à générer (défaut : 1000).")
+        parser.add_argument('--users', type=int, default=20, help="Nombre d'utilisateurs générés, au minimum (défaut : 20).")
+        parser.add_argument('--days', type=int, default=365, help="Étalement des détections dans le passé, en jours (défaut : 365).")
+        parser.add_argument('--video-ratio', type=float, default=0.2, help="Part de vidéos (défaut : 0.2).")
+        parser.add_argument('--report-ratio', type=float, default=0.5, help="Part des détections rattachées à un rapport (défaut : 0.5).")
+        parser.add_argument('--validation-ratio', type=float, default=0.3, help="Part des détections validées (défaut : 0.3).")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Taille des lots bulk_create (défaut : 2000).")
+        parser.add_argument('--seed', type=int, default=None, help="Graine aléatoire pour une génération reproductible.")
+        parser.add_argument('--clear', action='store_true', help="Supprimer les données générées précédemment puis quitter.")
+
+    def handle(self, *args, **options):
+        seeded_users = User.objects.filter(email__endswith=f"@{SEED_EMAIL_DOMAIN}")
+        if options['clear']:
+            deleted, _ = seeded_users.delete()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} objet(s) généré(s) supprimé(s)."))
+            return
+        if options['detections'] < 0 or options['users'] < 1:
+            raise CommandError("--detections doit être positif et --users au moins égal à 1.")
+
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.days = max(1, options['days'])
+        self.categories = self.ensure_categories()
+        self.threshold = AppSettings.load().dangerous_threshold
+
+        users = self.ensure_users(seeded_users, options['users'])
+        validators = [user for user in users if user.role != User.Role.OPERATOR] or users
+        batch_size = max(1, options['batch_size'])
+
+        created = 0
+        while created < options['detections']:
+            count = min(batch_size, options['detections'] - created)
+            with transaction.atomic():
+                self.create_batch(count, users, validators, options)
+            created += count
+            self.stdout.write(f"{created}/{options['detections']} détection(s) générée(s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} détection(s) générée(s) pour {len(users)} utilisateur(s) "
+            f"({DetectionLog.objects.filter(user__in=seeded_users).count()} au total)."
+        ))
+
+    def ensure_categories(self):
+        for name, category_type in SEED_CATEGORIES:
+            DangerousCategory.objects.get_or_create(name=name, defaults={'category_type': category_type})
+        return dict(DangerousCategory.objects.filter(is_active=True).values_list('name', 'category_type'))
+
+    def ensure_users(self, seeded_users, wanted):
+        existing = seeded_users.count()
+        if existing < wanted:
+            # Un seul hachage pour tous les comptes : le hachage PBKDF2 coûte plusieurs centaines de ms
+            password = make_password('seed-password')
+            roles, weights = zip(*ROLE_WEIGHTS)
+            new_users = []
+            for index in range(existing, wanted):
+                role = User.Role.ADMINISTRATOR if index == 0 else self.rng.choices(roles, weights)[0]
+                new_users.append(User(
+                    email=f"user{index:05d}@{SEED_EMAIL_DOMAIN}",
+                    first_name=f"Agent{index}",
+                    last_name='Seed',
+                    role=role,
+                    password=password,
+                    location=self.rng.choice(LOCATIONS),
+                ))
+            User.objects.bulk_create(new_users)
+        return list(seeded_users.order_by('pk'))
+
+    def random_timestamp(self):
+        return self.now - timedelta(seconds=self.rng.uniform(0, self.days * 86400))
+
+    def random_objects(self, media_type):
+        """Boîtes brutes : les objets retenus au seuil courant, plus quelques boîtes de faible confiance"""
+        objects = []
+        confident = self.rng.choices((0, 1, 2, 3, 5), (20, 40, 20, 12, 8))[0]
+        for index in range(confident + self.rng.choices((0, 1, 2), (60, 30, 10))[0]):
+            dangerous = self.rng.random() < 0.35
+            category = self.rng.choice(list(self.categories) if dangerous and self.categories else BENIGN_CATEGORIES)
+            low, high = (self.threshold, 0.99) if index < confident else (settings.DETECTION_RAW_CONFIDENCE_FLOOR, self.threshold)
+            obj = {
+                'category': category,
+                'confidence': round(self.rng.uniform(low, high), 3),
+                'bbox': [round(self.rng.uniform(0, 1200), 1), round(self.rng.uniform(0, 700), 1),
+                         round(self.rng.uniform(20, 300), 1), round(self.rng.uniform(20, 300), 1)],
+            }
+            if media_type == 'VIDEO':
+                frame = self.rng.randrange(0, 9000, 30)
+                obj['frame'] = frame
+                obj['timestamp'] = round(frame / 30, 2)
+            objects.append(obj)
+        return objects
+
+    def danger_level(self, objects):
+        levels = {self.categories.get(obj['category']) for obj in objects}
+        if 'HYPERDANGEROUS' in levels:
+            return 'HYPERDANGEROUS'
+        if 'DANGEROUS' in levels:
+            return 'DANGEROUS'
+        return None
+
+    def create_batch(self, count, users, validators, options):
+        rng = self.rng
+        # Rapports : quelques détections chacun, à la date de leur première détection
+        reports = []
+        report_slots = []
+        remaining = int(count * options['report_ratio'])
+        while remaining > 0:
+            size = min(remaining, rng.randint(2, 8))
+            timestamp = self.random_timestamp()
+            user = rng.choice(users)
+            reports.append(Report(
+                user=user,
+                name=f"Rapport {timestamp:%Y-%m-%d %H:%M}",
+                location=rng.choice(LOCATIONS),
+                created_at=timestamp,
+            ))
+            report_slots.extend([len(reports) - 1] * size)
+            remaining -= size
+        with settable_created_at(Report):
+            reports = Report.objects.bulk_create(reports)
+
+        logs = []
+        for index in range(count):
+            report = reports[report_slots[index]] if index < len(report_slots) else None
+            user = report.user if report else rng.choice(users)
+            timestamp = report.created_at + timedelta(seconds=index % 60) if report else self.random_timestamp()
+            media_type = 'VIDEO' if rng.random() < options['video_ratio'] else 'IMAGE'
+            raw_detections = grading.pack_detections(self.random_objects(media_type))
+            objects = grading.unpack_detections(raw_detections, self.threshold)
+            model_used = rng.choice(MODELS)
+            stem = f"seed_{timestamp:%Y%m%d%H%M%S}_{index}"
+            video_metadata = None
+            frames_analyzed = 0
+            if media_type == 'VIDEO':
+                fps = rng.choice((25.0, 30.0))
+                frame_count = rng.randint(300, 9000)
+                duration = frame_count / fps
+                video_metadata = {
+                    'fps': fps, 'frame_count': frame_count, 'width': 1280, 'height': 720,
+                    'duration': duration, 'duration_formatted': f"{int(duration // 60)}m {int(duration % 60)}s",
+                    'output_mode': 'standard',
+                }
+                frames_analyzed = frame_count // 30
+                inference = frames_analyzed * rng.uniform(0.02, 0.08)
+                processing_duration = inference + frame_count * rng.uniform(0.002, 0.006)
+            else:
+                inference = rng.uniform(0.03, 0.25)
+                processing_duration = inference + rng.uniform(0.01, 0.08)
+            logs.append(DetectionLog(
+                user=user,
+                report=report,
+                uploaded_file=f"detection_results/seed/{stem}{'.mp4' if media_type == 'VIDEO' else '.jpg'}",
+                original_file=f"uploads/seed/{stem}{'.mp4' if media_type == 'VIDEO' else '.jpg'}",
+                detection_timestamp=timestamp,
+                user_location=report.location if report else rng.choice(LOCATIONS),
+                detected_objects=objects,
+                raw_detections=raw_detections,
+                graded_threshold=self.threshold,
+                danger_level=self.danger_level(objects),
+                model_used=model_used,
+                is_simulated=model_used == 'simulation',
+                media_type=media_type,
+                video_metadata=video_metadata,
+                frames_analyzed=frames_analyzed,
+                processing_duration=round(processing_duration, 3),
+                stage_timings={'inference': round(inference, 4)},
+            ))
+        logs = DetectionLog.objects.bulk_create(logs)
+        DetectionObject.objects.bulk_create(
+            [row for log in logs for row in DetectionObject.from_log(log)], batch_size=options['batch_size']
+        )
+
+        validations = []
+        category_validations = []
+        for log in logs:
+            if rng.random() >= options['validation_ratio']:
+                continue
+            validator = rng.choice(validators)
+            validated_at = log.detection_timestamp + timedelta(minutes=rng.randint(5, 2880))
+            is_correct = rng.random() < 0.8
+            validations.append(ModelValidation(
+                detection_log=log,
+                validator=validator,
+                validation_timestamp=min(validated_at, self.now),
+                is_correct=is_correct,
+                corrected_category=None if is_correct else rng.choice(BENIGN_CATEGORIES),
+            ))
+            if log.media_type == 'VIDEO':
+                seen = set()
+                for obj in log.detected_objects:
+                    key = (obj['category'], obj.get('frame'))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    category_validations.append(CategoryValidation(
+                        detection_log=log,
+                        category_name=obj['category'],
+                        validator=validator,
+                        validation_timestamp=min(validated_at, self.now),
+                        is_valid=rng.random() < 0.8,
+                        frame_number=obj.get('frame'),
+                        confidence=obj['confidence'],
+                    ))
+        ModelValidation.objects.bulk_create(validations)
+        CategoryValidation.objects.bulk_create(category_validations)
+        # bulk_create ne déclenche pas les signaux : agrégats, compteurs de filtres et résumés mis à jour pour le lot
+        rollups.record_detections(logs, validations)
+        facets.record_batch(reports, logs)
+        summaries.refresh([report.pk for report in reports])
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0007_categoryvalidation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_file', models.CharField(help_text='Chemin relatif à MEDIA_ROOT du fichier téléversé.', max_length=500, verbose_name='fichier original')),
+                ('annotated_file', models.CharField(help_text='Chemin relatif à MEDIA_ROOT du résultat annoté à produire.', max_length=500, verbose_name='fichier annoté')),
+                ('media_type', models.CharField(choices=[('IMAGE', 'Image'), ('VIDEO', 'Vidéo')], default='IMAGE', max_length=10, verbose_name='type de média')),
+                ('user_location', models.CharField(blank=True, max_length=255, null=True, verbose_name='localisation utilisateur')),
+                ('frame_interval', models.IntegerField(default=30, verbose_name="intervalle d'analyse vidéo")),
+                ('output_mode', models.CharField(default='standard', max_length=20, verbose_name='format de sortie vidéo')),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('SUCCEEDED', 'Terminée'), ('FAILED', 'Échouée')], default='PENDING', max_length=10, verbose_name='statut')),
+                ('priority', models.IntegerField(default=0, help_text='Les tâches de priorité la plus élevée sont traitées en premier.', verbose_name='priorité')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='tentatives')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='tentatives maximum')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Date à partir de laquelle la tâche peut être réclamée (délai entre tentatives).', verbose_name='disponible à partir de')),
+                ('lease_owner', models.CharField(blank=True, default='', max_length=255, verbose_name='worker titulaire')),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text='Passé ce délai, une tâche en cours peut être réclamée par un autre worker.', null=True, verbose_name='expiration du bail')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='dernière erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créée le')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='démarrée le')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='terminée le')),
+                ('detection_log', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='job', to='detection.detectionlog', verbose_name='log de détection')),
+                ('report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='detection.report', verbose_name='rapport')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detection_jobs', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Tâche de Détection',
+                'verbose_name_plural': 'Tâches de Détection',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', '-priority', 'available_at'], name='detection_job_claim_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0008_detectionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=255, unique=True, verbose_name='identifiant')),
+                ('hostname', models.CharField(max_length=255, verbose_name='hôte')),
+                ('pid', models.PositiveIntegerField(verbose_name='PID')),
+                ('capacity', models.PositiveIntegerField(default=1, help_text='Nombre de tâches que le worker peut traiter simultanément.', verbose_name='capacité')),
+                ('in_flight', models.PositiveIntegerField(default=0, verbose_name='tâches en cours')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='démarré le')),
+                ('last_heartbeat', models.DateTimeField(default=django.utils.timezone.now, verbose_name='dernier heartbeat')),
+            ],
+            options={
+                'verbose_name': 'Worker de Détection',
+                'verbose_name_plural': 'Workers de Détection',
+                'ordering': ['hostname', 'worker_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:28
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0009_detectionworker'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='nom du fichier')),
+                ('relative_path', models.CharField(help_text='Emplacement final relatif à MEDIA_ROOT, alimenté morceau par morceau.', max_length=500, verbose_name='chemin')),
+                ('total_size', models.BigIntegerField(verbose_name='taille totale')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='octets reçus')),
+                ('crc32', models.BigIntegerField(default=0, help_text='Somme de contrôle des octets déjà reçus, mise à jour à chaque morceau.', verbose_name='CRC32 courant')),
+                ('expected_crc32', models.BigIntegerField(blank=True, null=True, verbose_name='CRC32 attendu')),
+                ('user_location', models.CharField(blank=True, default='', max_length=255, verbose_name='localisation utilisateur')),
+                ('frame_interval', models.IntegerField(default=30, verbose_name="intervalle d'analyse vidéo")),
+                ('output_mode', models.CharField(default='standard', max_length=20, verbose_name='format de sortie vidéo')),
+                ('status', models.CharField(choices=[('UPLOADING', 'En cours'), ('COMPLETED', 'Terminé'), ('ABORTED', 'Abandonné')], default='UPLOADING', max_length=10, verbose_name='statut')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créé le')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='mis à jour le')),
+                ('job', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='detection.detectionjob', verbose_name='tâche de détection')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': "Session d'Upload",
+                'verbose_name_plural': "Sessions d'Upload",
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
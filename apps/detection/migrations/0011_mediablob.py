@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0010_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('path', models.CharField(help_text='Chemin relatif à MEDIA_ROOT : cas/<2 car.>/<2 car.>/<sha256><ext>.', max_length=500, unique=True, verbose_name='chemin')),
+                ('size', models.BigIntegerField(verbose_name='taille')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Détections (ou tâches en cours) utilisant ce fichier ; supprimé à zéro.', verbose_name='références')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créé le')),
+                ('last_referenced_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='dernière référence')),
+            ],
+            options={
+                'verbose_name': 'Fichier Média',
+                'verbose_name_plural': 'Fichiers Média',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
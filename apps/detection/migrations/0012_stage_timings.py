@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0011_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='stage_timings',
+            field=models.JSONField(blank=True, help_text='Étapes mesurées avant la mise en file, reprises dans le DetectionLog.', null=True, verbose_name='durées par étape'),
+        ),
+        migrations.AddField(
+            model_name='detectionlog',
+            name='stage_timings',
+            field=models.JSONField(blank=True, help_text='Secondes passées dans chaque étape (stockage, attente, décodage, inférence, encodage, écriture...)', null=True, verbose_name='durées par étape'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def backfill_detection_objects(apps, schema_editor):
+    """Recopie le JSON detected_objects des détections existantes dans DetectionObject"""
+    DetectionLog = apps.get_model('detection', 'DetectionLog')
+    DetectionObject = apps.get_model('detection', 'DetectionObject')
+    rows = []
+    logs = DetectionLog.objects.order_by().values_list('id', 'detected_objects')
+    for log_id, detected_objects in logs.iterator(chunk_size=BACKFILL_CHUNK_SIZE):
+        for obj in detected_objects if isinstance(detected_objects, list) else []:
+            if not isinstance(obj, dict):
+                continue
+            category = obj.get('category') or obj.get('label') or obj.get('class_name')
+            if not isinstance(category, str) or not category.strip():
+                continue
+            try:
+                confidence = float(obj.get('confidence') or 0.0)
+            except (TypeError, ValueError):
+                confidence = 0.0
+            rows.append(DetectionObject(
+                detection_log_id=log_id,
+                category=category.strip().lower()[:100],
+                confidence=confidence,
+                frame=obj.get('frame') if isinstance(obj.get('frame'), int) else None,
+                timestamp=obj.get('timestamp') if isinstance(obj.get('timestamp'), (int, float)) else None,
+                bbox=obj.get('bbox'),
+            ))
+        if len(rows) >= BACKFILL_CHUNK_SIZE:
+            DetectionObject.objects.bulk_create(rows)
+            rows = []
+    DetectionObject.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0012_stage_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100, verbose_name='catégorie')),
+                ('confidence', models.FloatField(default=0.0, verbose_name='confiance')),
+                ('frame', models.IntegerField(blank=True, null=True, verbose_name='numéro de frame')),
+                ('timestamp', models.FloatField(blank=True, help_text='Position de la frame dans la vidéo, en secondes', null=True, verbose_name='position (s)')),
+                ('bbox', models.JSONField(blank=True, null=True, verbose_name='boîte englobante')),
+                ('detection_log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detection_objects', to='detection.detectionlog', verbose_name='log de détection')),
+            ],
+            options={
+                'verbose_name': 'Objet Détecté',
+                'verbose_name_plural': 'Objets Détectés',
+                'indexes': [models.Index(fields=['category', 'detection_log'], name='detobj_category_log_idx'), models.Index(fields=['category', 'timestamp'], name='detobj_category_ts_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_detection_objects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0013_detectionobject'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['-detection_timestamp'], name='detlog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['user', '-detection_timestamp'], name='detlog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['danger_level', '-detection_timestamp'], name='detlog_danger_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['media_type', 'danger_level'], name='detlog_media_danger_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['user_location'], name='detlog_location_idx'),
+        ),
+    ]
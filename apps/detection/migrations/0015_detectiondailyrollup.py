@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0014_detectionlog_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='jour')),
+                ('location', models.CharField(blank=True, default='', max_length=255, verbose_name='localisation')),
+                ('media_type', models.CharField(max_length=10, verbose_name='type de média')),
+                ('danger_level', models.CharField(blank=True, default='', max_length=20, verbose_name='niveau de danger')),
+                ('category', models.CharField(blank=True, default='', max_length=100, verbose_name='catégorie')),
+                ('detection_count', models.IntegerField(default=0, verbose_name='détections')),
+                ('object_count', models.IntegerField(default=0, verbose_name='objets')),
+                ('frames_analyzed', models.BigIntegerField(default=0, verbose_name='frames analysées')),
+                ('processing_seconds', models.FloatField(default=0.0, verbose_name='durée de traitement cumulée (s)')),
+                ('processed_count', models.IntegerField(default=0, help_text='Détections dont la durée de traitement est connue (> 0)', verbose_name='détections chronométrées')),
+                ('valid_count', models.IntegerField(default=0, verbose_name='validées correctes')),
+                ('invalid_count', models.IntegerField(default=0, verbose_name='validées incorrectes')),
+                ('incorrect_count', models.IntegerField(default=0, verbose_name='incorrectes avec correction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detection_rollups', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Agrégat Quotidien',
+                'verbose_name_plural': 'Agrégats Quotidiens',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['user', 'day'], name='detrollup_user_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'user', 'location', 'media_type', 'danger_level', 'category'), name='detection_rollup_key')],
+            },
+        ),
+    ]
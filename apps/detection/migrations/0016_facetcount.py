@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0015_detectiondailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text="'global' ou 'user:<id>' (données d'un seul utilisateur)", max_length=32, verbose_name='portée')),
+                ('facet', models.CharField(choices=[('class', 'Classe (objets détectés)'), ('danger_level', 'Niveau de danger (détections)'), ('location', 'Localisation (détections)'), ('flagged_user', 'Utilisateur (détections hyperdangereuses)'), ('flagged_location', 'Localisation (détections hyperdangereuses)'), ('report_class', 'Classe (objets des rapports)'), ('report_danger_level', 'Niveau de danger (rapports)'), ('report_location', 'Localisation (rapports)')], max_length=32, verbose_name='filtre')),
+                ('value', models.CharField(blank=True, default='', max_length=255, verbose_name='valeur')),
+                ('count', models.IntegerField(default=0, verbose_name='nombre')),
+            ],
+            options={
+                'verbose_name': 'Compteur de Filtre',
+                'verbose_name_plural': 'Compteurs de Filtres',
+                'constraints': [models.UniqueConstraint(fields=('scope', 'facet', 'value'), name='facet_count_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0016_facetcount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='detectionlog',
+            name='detlog_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='detectionlog',
+            name='detlog_user_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='detectionlog',
+            name='detlog_danger_ts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['-detection_timestamp', '-id'], name='detlog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['user', '-detection_timestamp', '-id'], name='detlog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionlog',
+            index=models.Index(fields=['danger_level', '-detection_timestamp', '-id'], name='detlog_danger_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['-created_at', '-id'], name='report_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='report_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:08
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_report_summaries(apps, schema_editor):
+    """Calcule le résumé des rapports existants à partir de leurs détections"""
+    Report = apps.get_model('detection', 'Report')
+    DetectionLog = apps.get_model('detection', 'DetectionLog')
+    DetectionObject = apps.get_model('detection', 'DetectionObject')
+    totals = {
+        row.pop('report_id'): row
+        for row in DetectionLog.objects.filter(report__isnull=False).order_by().values('report_id').annotate(
+            detection_count=Count('id'),
+            normal_count=Count('id', filter=Q(danger_level__isnull=True) | Q(danger_level='')),
+            dangerous_count=Count('id', filter=Q(danger_level='DANGEROUS')),
+            hyperdangerous_count=Count('id', filter=Q(danger_level='HYPERDANGEROUS')),
+            image_count=Count('id', filter=Q(media_type='IMAGE')),
+            video_count=Count('id', filter=Q(media_type='VIDEO')),
+            frames_analyzed=Coalesce(Sum('frames_analyzed'), 0),
+            processing_seconds=Coalesce(
+                Sum('processing_duration', filter=Q(processing_duration__gt=0)), Value(0.0), output_field=FloatField()
+            ),
+            valid_count=Count('id', filter=Q(validation__is_correct=True)),
+            invalid_count=Count('id', filter=Q(validation__is_correct=False)),
+        )
+    }
+    categories = {}
+    objects = DetectionObject.objects.filter(detection_log__report__isnull=False).order_by()
+    for report_id, category, count in objects.values_list('detection_log__report_id', 'category').annotate(n=Count('id')):
+        categories.setdefault(report_id, {})[category] = count
+    reports = []
+    for report in Report.objects.filter(pk__in=totals).only('id'):
+        for field, value in totals[report.pk].items():
+            setattr(report, field, value)
+        report.category_counts = dict(sorted(categories.get(report.pk, {}).items()))
+        reports.append(report)
+    fields = [*next(iter(totals.values())).keys(), 'category_counts'] if totals else []
+    if reports:
+        Report.objects.bulk_update(reports, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0017_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='category_counts',
+            field=models.JSONField(blank=True, default=dict, help_text="Nombre d'objets détectés par catégorie normalisée", verbose_name='objets par catégorie'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='dangerous_count',
+            field=models.IntegerField(default=0, verbose_name='détections dangereuses'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='detection_count',
+            field=models.IntegerField(default=0, verbose_name='détections'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='frames_analyzed',
+            field=models.BigIntegerField(default=0, verbose_name='frames analysées'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='hyperdangerous_count',
+            field=models.IntegerField(default=0, verbose_name='détections hyperdangereuses'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='image_count',
+            field=models.IntegerField(default=0, verbose_name='images'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='invalid_count',
+            field=models.IntegerField(default=0, verbose_name='validations incorrectes'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='normal_count',
+            field=models.IntegerField(default=0, verbose_name='détections normales'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='processing_seconds',
+            field=models.FloatField(default=0.0, verbose_name='durée de traitement cumulée (s)'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='valid_count',
+            field=models.IntegerField(default=0, verbose_name='validations correctes'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='video_count',
+            field=models.IntegerField(default=0, verbose_name='vidéos'),
+        ),
+        migrations.RunPython(backfill_report_summaries, migrations.RunPython.noop),
+    ]
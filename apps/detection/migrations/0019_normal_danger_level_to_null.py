@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:12
+
+from django.db import migrations
+
+
+def normal_to_null(apps, schema_editor):
+    """Les validations par catégorie enregistraient 'NORMAL' au lieu de NULL pour une détection normale"""
+    DetectionLog = apps.get_model('detection', 'DetectionLog')
+    DetectionLog.objects.filter(danger_level='NORMAL').update(danger_level=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0018_report_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(normal_to_null, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0019_normal_danger_level_to_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionlog',
+            name='graded_threshold',
+            field=models.FloatField(blank=True, help_text='Seuil de confiance auquel objets détectés et niveau de danger ont été calculés.', null=True, verbose_name='seuil appliqué'),
+        ),
+        migrations.AddField(
+            model_name='detectionlog',
+            name='raw_detections',
+            field=models.JSONField(blank=True, help_text='Toutes les boîtes au-dessus du plancher de confiance, sous forme compacte (voir grading.py).', null=True, verbose_name='boîtes brutes'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0020_raw_detections'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='categories',
+            field=models.JSONField(blank=True, help_text='Re-notation : catégories (en minuscules) ajoutées, modifiées ou supprimées.', null=True, verbose_name='catégories à re-noter'),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='kind',
+            field=models.CharField(choices=[('DETECTION', 'Détection'), ('RESCORE', 'Re-notation')], default='DETECTION', max_length=10, verbose_name='type de tâche'),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='progress',
+            field=models.JSONField(blank=True, help_text='Re-notation : détections examinées, modifiées et à examiner.', null=True, verbose_name='progression'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0021_rescore_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='detectionjob',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='detection_jobs', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0022_rescore_job_without_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='detectionjob',
+            name='stage_timings',
+            field=models.JSONField(blank=True, help_text='Étapes mesurées avant la mise en file, reprises dans le DetectionLog ; une fois terminée, toutes les étapes, écriture en base comprise.', null=True, verbose_name='durées par étape'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import os
+from datetime import timedelta
+import uuid
 
 def detection_media_path(instance, filename):
     now = timezone.now()
@@ -71,11 +73,33 @@ class Report(models.Model):
         null=True,
         help_text=_("Localisation associée au rapport")
     )
+    # Résumé des détections du rapport, maintenu à l'écriture (voir summaries.py)
+    detection_count = models.IntegerField(_("détections"), default=0)
+    normal_count = models.IntegerField(_("détections normales"), default=0)
+    dangerous_count = models.IntegerField(_("détections dangereuses"), default=0)
+    hyperdangerous_count = models.IntegerField(_("détections hyperdangereuses"), default=0)
+    image_count = models.IntegerField(_("images"), default=0)
+    video_count = models.IntegerField(_("vidéos"), default=0)
+    frames_analyzed = models.BigIntegerField(_("frames analysées"), default=0)
+    processing_seconds = models.FloatField(_("durée de traitement cumulée (s)"), default=0.0)
+    valid_count = models.IntegerField(_("validations correctes"), default=0)
+    invalid_count = models.IntegerField(_("validations incorrectes"), default=0)
+    category_counts = models.JSONField(
+        _("objets par catégorie"),
+        default=dict,
+        blank=True,
+        help_text=_("Nombre d'objets détectés par catégorie normalisée")
+    )
 
     class Meta:
         verbose_name = _("Rapport")
         verbose_name_plural = _("Rapports")
         ordering = ["-created_at"]
+        # Pagination par curseur : tri (created_at, id), éventuellement par utilisateur
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='report_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='report_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Rapport {self.id} par {self.user.email} le {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -128,6 +152,18 @@ class DetectionLog(models.Model):
         null=True, 
         help_text=_("Résultats bruts du modèle IA (ex: [{\"category\": \"knife\", \"confidence\": 0.85, \"bbox\": [x,y,w,h]}]).")
     )
+    raw_detections = models.JSONField(
+        _("boîtes brutes"),
+        blank=True,
+        null=True,
+        help_text=_("Toutes les boîtes au-dessus du plancher de confiance, sous forme compacte (voir grading.py).")
+    )
+    graded_threshold = models.FloatField(
+        _("seuil appliqué"),
+        null=True,
+        blank=True,
+        help_text=_("Seuil de confiance auquel objets détectés et niveau de danger ont été calculés.")
+    )
     danger_level = models.CharField(
         _("niveau de danger"),
         max_length=20,
@@ -177,15 +213,120 @@ class DetectionLog(models.Model):
         help_text=_("Temps total de traitement de la détection")
     )
 
+    stage_timings = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name=_("durées par étape"),
+        help_text=_("Secondes passées dans chaque étape (stockage, attente, décodage, inférence, encodage, écriture...)")
+    )
+
     class Meta:
         verbose_name = _("Journal de Détection")
         verbose_name_plural = _("Journaux de Détection")
         ordering = ["-detection_timestamp"]
+        # Formes réelles des listes : filtre éventuel puis tri antichronologique sur
+        # (detection_timestamp, id), la clé de la pagination par curseur
+        indexes = [
+            models.Index(fields=['-detection_timestamp', '-id'], name='detlog_ts_idx'),
+            models.Index(fields=['user', '-detection_timestamp', '-id'], name='detlog_user_ts_idx'),
+            models.Index(fields=['danger_level', '-detection_timestamp', '-id'], name='detlog_danger_ts_idx'),
+            models.Index(fields=['media_type', 'danger_level'], name='detlog_media_danger_idx'),
+            models.Index(fields=['user_location'], name='detlog_location_idx'),
+        ]
+
+    @property
+    def is_hls(self):
+        """La vidéo annotée est-elle une playlist HLS segmentée ?"""
+        return bool(self.uploaded_file) and self.uploaded_file.name.endswith('.m3u8')
+
+    @property
+    def is_timelapse(self):
+        """La vidéo annotée ne contient-elle que les frames analysées ?"""
+        return (self.video_metadata or {}).get('output_mode') == 'timelapse'
+
+    @property
+    def keyframes(self):
+        """Index de la planche de vignettes (vidéos), ou None"""
+        return (self.video_metadata or {}).get('keyframes')
+
+    @property
+    def keyframe_sprite_url(self):
+        """URL de la planche de vignettes, rangée à côté de la vidéo annotée"""
+        keyframes = self.keyframes
+        if not keyframes or not self.uploaded_file:
+            return None
+        directory = os.path.dirname(self.uploaded_file.name)
+        return f"{settings.MEDIA_URL}{directory}/{keyframes['sprite']}"
 
     def __str__(self):
         sim_status = "(Simulé)" if self.is_simulated else ""
         return f"Détection par {self.user.email} le {self.detection_timestamp.strftime('%Y-%m-%d %H:%M')} {sim_status}"
 
+
+def object_category(obj):
+    """Catégorie normalisée d'un objet détecté (clés héritées 'label' et 'class_name' comprises), ou None"""
+    category = obj.get('category') or obj.get('label') or obj.get('class_name')
+    if isinstance(category, str) and category.strip():
+        return category.strip().lower()
+    return None
+
+
+class DetectionObjectQuerySet(models.QuerySet):
+    def category_counts(self):
+        """Occurrences par catégorie, calculées en SQL : {catégorie: nombre}"""
+        return dict(self.order_by().values_list('category').annotate(count=models.Count('id')))
+
+
+class DetectionObject(models.Model):
+    """Objet détecté, copie indexée de DetectionLog.detected_objects pour les filtres et comptages par classe"""
+    detection_log = models.ForeignKey(
+        DetectionLog,
+        on_delete=models.CASCADE,
+        related_name='detection_objects',
+        verbose_name=_("log de détection")
+    )
+    category = models.CharField(_("catégorie"), max_length=100)
+    confidence = models.FloatField(_("confiance"), default=0.0)
+    frame = models.IntegerField(_("numéro de frame"), null=True, blank=True)
+    timestamp = models.FloatField(
+        _("position (s)"),
+        null=True,
+        blank=True,
+        help_text=_("Position de la frame dans la vidéo, en secondes")
+    )
+    bbox = models.JSONField(_("boîte englobante"), null=True, blank=True)
+
+    objects = DetectionObjectQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("Objet Détecté")
+        verbose_name_plural = _("Objets Détectés")
+        indexes = [
+            models.Index(fields=['category', 'detection_log'], name='detobj_category_log_idx'),
+            models.Index(fields=['category', 'timestamp'], name='detobj_category_ts_idx'),
+        ]
+
+    @classmethod
+    def from_log(cls, detection_log):
+        """Lignes (non enregistrées) correspondant au JSON detected_objects d'un log"""
+        rows = []
+        for obj in detection_log.detected_objects or []:
+            category = object_category(obj) if isinstance(obj, dict) else None
+            if category is None:
+                continue
+            rows.append(cls(
+                detection_log=detection_log,
+                category=category[:100],
+                confidence=float(obj.get('confidence') or 0.0),
+                frame=obj.get('frame'),
+                timestamp=obj.get('timestamp'),
+                bbox=obj.get('bbox'),
+            ))
+        return rows
+
+    def __str__(self):
+        return f"{self.category} ({self.confidence:.2f}) - détection {self.detection_log_id}"
+
 class ModelValidation(models.Model):
     detection_log = models.OneToOneField(DetectionLog, on_delete=models.CASCADE, related_name='validation', verbose_name=_("log de détection"))
     validator = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='validations', verbose_name=_("validateur"))
@@ -258,4 +399,321 @@ class CategoryValidation(models.Model):
 
     def __str__(self):
         status = _("Valide") if self.is_valid else _("Invalide")
-        return f"{self.category_name} - {status} (Frame {self.frame_number or 'N/A'})"
\ No newline at end of file
+        return f"{self.category_name} - {status} (Frame {self.frame_number or 'N/A'})"
+
+class DetectionJob(models.Model):
+    """Tâche de détection (ou de re-notation) persistée, exécutée par `manage.py detection_worker`"""
+    STATUS_CHOICES = (
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('SUCCEEDED', 'Terminée'),
+        ('FAILED', 'Échouée'),
+    )
+    KIND_CHOICES = (
+        ('DETECTION', 'Détection'),
+        ('RESCORE', 'Re-notation'),
+    )
+    kind = models.CharField(_("type de tâche"), max_length=10, choices=KIND_CHOICES, default='DETECTION')
+    # Vide pour une re-notation déclenchée par une modification de catégorie (signal, sans requête)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='detection_jobs',
+        null=True,
+        blank=True,
+        verbose_name=_("utilisateur")
+    )
+    report = models.ForeignKey(
+        Report,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        null=True,
+        blank=True,
+        verbose_name=_("rapport")
+    )
+    original_file = models.CharField(
+        _("fichier original"),
+        max_length=500,
+        help_text=_("Chemin relatif à MEDIA_ROOT du fichier téléversé.")
+    )
+    annotated_file = models.CharField(
+        _("fichier annoté"),
+        max_length=500,
+        help_text=_("Chemin relatif à MEDIA_ROOT du résultat annoté à produire.")
+    )
+    media_type = models.CharField(
+        max_length=10,
+        choices=(('IMAGE', 'Image'), ('VIDEO', 'Vidéo')),
+        default='IMAGE',
+        verbose_name=_("type de média")
+    )
+    user_location = models.CharField(
+        _("localisation utilisateur"),
+        max_length=255,
+        blank=True,
+        null=True
+    )
+    frame_interval = models.IntegerField(_("intervalle d'analyse vidéo"), default=30)
+    output_mode = models.CharField(_("format de sortie vidéo"), max_length=20, default='standard')
+    stage_timings = models.JSONField(
+        _("durées par étape"),
+        blank=True,
+        null=True,
+        help_text=_("Étapes mesurées avant la mise en file, reprises dans le DetectionLog ; une fois terminée, toutes les étapes, écriture en base comprise.")
+    )
+    categories = models.JSONField(
+        _("catégories à re-noter"),
+        blank=True,
+        null=True,
+        help_text=_("Re-notation : catégories (en minuscules) ajoutées, modifiées ou supprimées.")
+    )
+    progress = models.JSONField(
+        _("progression"),
+        blank=True,
+        null=True,
+        help_text=_("Re-notation : détections examinées, modifiées et à examiner.")
+    )
+
+    status = models.CharField(
+        _("statut"),
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='PENDING'
+    )
+    priority = models.IntegerField(
+        _("priorité"),
+        default=0,
+        help_text=_("Les tâches de priorité la plus élevée sont traitées en premier.")
+    )
+    attempts = models.PositiveIntegerField(_("tentatives"), default=0)
+    max_attempts = models.PositiveIntegerField(_("tentatives maximum"), default=3)
+    available_at = models.DateTimeField(
+        _("disponible à partir de"),
+        default=timezone.now,
+        help_text=_("Date à partir de laquelle la tâche peut être réclamée (délai entre tentatives).")
+    )
+    lease_owner = models.CharField(_("worker titulaire"), max_length=255, blank=True, default='')
+    lease_expires_at = models.DateTimeField(
+        _("expiration du bail"),
+        null=True,
+        blank=True,
+        help_text=_("Passé ce délai, une tâche en cours peut être réclamée par un autre worker.")
+    )
+    last_error = models.TextField(_("dernière erreur"), blank=True, default='')
+    detection_log = models.OneToOneField(
+        DetectionLog,
+        on_delete=models.SET_NULL,
+        related_name='job',
+        null=True,
+        blank=True,
+        verbose_name=_("log de détection")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("créée le"))
+    started_at = models.DateTimeField(_("démarrée le"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("terminée le"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Tâche de Détection")
+        verbose_name_plural = _("Tâches de Détection")
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['status', '-priority', 'available_at'], name='detection_job_claim_idx'),
+        ]
+
+    def __str__(self):
+        if self.kind == 'RESCORE':
+            return f"Tâche {self.id} ({self.get_status_display()}) - re-notation : {', '.join(self.categories or [])}"
+        return f"Tâche {self.id} ({self.get_status_display()}) - {os.path.basename(self.original_file)}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('SUCCEEDED', 'FAILED')
+
+class DetectionWorker(models.Model):
+    """Processus `detection_worker` actif ; annonce sa capacité et son activité via un heartbeat"""
+    worker_id = models.CharField(_("identifiant"), max_length=255, unique=True)
+    hostname = models.CharField(_("hôte"), max_length=255)
+    pid = models.PositiveIntegerField(_("PID"))
+    capacity = models.PositiveIntegerField(
+        _("capacité"),
+        default=1,
+        help_text=_("Nombre de tâches que le worker peut traiter simultanément.")
+    )
+    in_flight = models.PositiveIntegerField(_("tâches en cours"), default=0)
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name=_("démarré le"))
+    last_heartbeat = models.DateTimeField(_("dernier heartbeat"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("Worker de Détection")
+        verbose_name_plural = _("Workers de Détection")
+        ordering = ["hostname", "worker_id"]
+
+    def __str__(self):
+        return f"{self.worker_id} ({self.in_flight}/{self.capacity})"
+
+    @property
+    def is_alive(self):
+        # Trois heartbeats manqués : le worker est considéré comme arrêté
+        timeout = settings.DETECTION_WORKER_HEARTBEAT_SECONDS * 3
+        return self.last_heartbeat >= timezone.now() - timedelta(seconds=timeout)
+
+class UploadSession(models.Model):
+    """Upload par morceaux reprenable : les morceaux sont ajoutés directement au fichier final"""
+    STATUS_CHOICES = (
+        ('UPLOADING', 'En cours'),
+        ('COMPLETED', 'Terminé'),
+        ('ABORTED', 'Abandonné'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name=_("utilisateur")
+    )
+    filename = models.CharField(_("nom du fichier"), max_length=255)
+    relative_path = models.CharField(
+        _("chemin"),
+        max_length=500,
+        help_text=_("Emplacement final relatif à MEDIA_ROOT, alimenté morceau par morceau.")
+    )
+    total_size = models.BigIntegerField(_("taille totale"))
+    offset = models.BigIntegerField(_("octets reçus"), default=0)
+    crc32 = models.BigIntegerField(
+        _("CRC32 courant"),
+        default=0,
+        help_text=_("Somme de contrôle des octets déjà reçus, mise à jour à chaque morceau.")
+    )
+    expected_crc32 = models.BigIntegerField(_("CRC32 attendu"), null=True, blank=True)
+    user_location = models.CharField(_("localisation utilisateur"), max_length=255, blank=True, default='')
+    frame_interval = models.IntegerField(_("intervalle d'analyse vidéo"), default=30)
+    output_mode = models.CharField(_("format de sortie vidéo"), max_length=20, default='standard')
+    status = models.CharField(_("statut"), max_length=10, choices=STATUS_CHOICES, default='UPLOADING')
+    job = models.OneToOneField(
+        DetectionJob,
+        on_delete=models.SET_NULL,
+        related_name='upload_session',
+        null=True,
+        blank=True,
+        verbose_name=_("tâche de détection")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("créé le"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("mis à jour le"))
+
+    class Meta:
+        verbose_name = _("Session d'Upload")
+        verbose_name_plural = _("Sessions d'Upload")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.total_size})"
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.total_size
+
+class MediaBlob(models.Model):
+    """Fichier du stockage adressé par contenu (voir storage.ContentAddressedStorage)"""
+    sha256 = models.CharField(_("SHA-256"), max_length=64, unique=True)
+    path = models.CharField(
+        _("chemin"),
+        max_length=500,
+        unique=True,
+        help_text=_("Chemin relatif à MEDIA_ROOT : cas/<2 car.>/<2 car.>/<sha256><ext>.")
+    )
+    size = models.BigIntegerField(_("taille"))
+    ref_count = models.PositiveIntegerField(
+        _("références"),
+        default=0,
+        help_text=_("Détections (ou tâches en cours) utilisant ce fichier ; supprimé à zéro.")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("créé le"))
+    last_referenced_at = models.DateTimeField(_("dernière référence"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("Fichier Média")
+        verbose_name_plural = _("Fichiers Média")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} réf.)"
+
+class DetectionDailyRollup(models.Model):
+    """
+    Agrégats quotidiens des détections, lus par les pages de statistiques.
+
+    La ligne de catégorie vide porte les compteurs de la détection elle-même
+    (nombre, frames, durée, validations) ; les autres lignes comptent les
+    objets détectés de leur catégorie. Tenu à jour par apps.detection.rollups.
+    """
+    day = models.DateField(_("jour"))
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='detection_rollups',
+        verbose_name=_("utilisateur")
+    )
+    location = models.CharField(_("localisation"), max_length=255, blank=True, default='')
+    media_type = models.CharField(_("type de média"), max_length=10)
+    danger_level = models.CharField(_("niveau de danger"), max_length=20, blank=True, default='')
+    category = models.CharField(_("catégorie"), max_length=100, blank=True, default='')
+    detection_count = models.IntegerField(_("détections"), default=0)
+    object_count = models.IntegerField(_("objets"), default=0)
+    frames_analyzed = models.BigIntegerField(_("frames analysées"), default=0)
+    processing_seconds = models.FloatField(_("durée de traitement cumulée (s)"), default=0.0)
+    processed_count = models.IntegerField(
+        _("détections chronométrées"),
+        default=0,
+        help_text=_("Détections dont la durée de traitement est connue (> 0)")
+    )
+    valid_count = models.IntegerField(_("validées correctes"), default=0)
+    invalid_count = models.IntegerField(_("validées incorrectes"), default=0)
+    incorrect_count = models.IntegerField(_("incorrectes avec correction"), default=0)
+
+    class Meta:
+        verbose_name = _("Agrégat Quotidien")
+        verbose_name_plural = _("Agrégats Quotidiens")
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'user', 'location', 'media_type', 'danger_level', 'category'],
+                name='detection_rollup_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='detrollup_user_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.user_id} {self.media_type} {self.category or '-'} : {self.detection_count}/{self.object_count}"
+
+class FacetCount(models.Model):
+    """Compteur matérialisé d'une valeur de filtre (listes déroulantes), tenu à jour par apps.detection.facets"""
+    FACETS = (
+        ('class', 'Classe (objets détectés)'),
+        ('danger_level', 'Niveau de danger (détections)'),
+        ('location', 'Localisation (détections)'),
+        ('flagged_user', 'Utilisateur (détections hyperdangereuses)'),
+        ('flagged_location', 'Localisation (détections hyperdangereuses)'),
+        ('report_class', 'Classe (objets des rapports)'),
+        ('report_danger_level', 'Niveau de danger (rapports)'),
+        ('report_location', 'Localisation (rapports)'),
+    )
+    scope = models.CharField(
+        _("portée"),
+        max_length=32,
+        help_text=_("'global' ou 'user:<id>' (données d'un seul utilisateur)")
+    )
+    facet = models.CharField(_("filtre"), max_length=32, choices=FACETS)
+    value = models.CharField(_("valeur"), max_length=255, blank=True, default='')
+    count = models.IntegerField(_("nombre"), default=0)
+
+    class Meta:
+        verbose_name = _("Compteur de Filtre")
+        verbose_name_plural = _("Compteurs de Filtres")
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'facet', 'value'], name='facet_count_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.facet}={self.value or '-'} : {self.count}"
@@ -0,0 +1,98 @@
+"""
+Pagination par curseur (keyset) des listes d'historique.
+
+Paginator compte toute la requête filtrée (COUNT(*)) puis saute les lignes
+des pages précédentes (OFFSET) : chaque page coûte d'autant plus cher qu'elle
+est loin. Ici la page suivante part de la dernière ligne affichée,
+WHERE (horodatage, id) < (t, n) ORDER BY horodatage DESC, id DESC LIMIT n,
+servie par l'index (horodatage, id) quelle que soit la profondeur.
+
+Le curseur est porté par l'URL (?after=… ou ?before=…) : une page mise en
+favori reste la même lorsque de nouvelles détections arrivent. Le nombre
+total, facultatif, vient des compteurs matérialisés (voir facets.py).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CURSOR_PARAMS = ('page', 'after', 'before')
+
+
+def encode_cursor(value, pk):
+    """Curseur '<microsecondes depuis 1970>_<id>' d'une ligne"""
+    return f"{(value - EPOCH) // timedelta(microseconds=1)}_{pk}"
+
+
+def decode_cursor(cursor):
+    """(horodatage, id) d'un curseur, ou None s'il est absent ou invalide"""
+    try:
+        micros, pk = cursor.split('_')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+class KeysetPage:
+    """Page de résultats ; les liens conservent les autres paramètres de la requête"""
+
+    def __init__(self, object_list, field, params, has_next, has_previous, count=None):
+        self.object_list = object_list
+        self.field = field
+        self.params = params
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def query(self, name=None, row=None):
+        params = self.params.copy()
+        for key in CURSOR_PARAMS:
+            params.pop(key, None)
+        if name:
+            params[name] = encode_cursor(getattr(row, self.field), row.pk)
+        return params.urlencode()
+
+    @property
+    def first_query(self):
+        return self.query()
+
+    @property
+    def next_query(self):
+        return self.query('after', self.object_list[-1]) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self.query('before', self.object_list[0]) if self.has_previous else ''
+
+
+def keyset_page(queryset, params, per_page=10, field='detection_timestamp', count=None):
+    """Page de `queryset` (du plus récent au plus ancien sur (field, id)) désignée par after/before dans `params`"""
+    after = decode_cursor(params.get('after'))
+    before = decode_cursor(params.get('before')) if after is None else None
+
+    if before is not None:
+        value, pk = before
+        newer = queryset.filter(Q(**{f"{field}__gt": value}) | Q(**{field: value, 'pk__gt': pk}))
+        rows = list(newer.order_by(field, 'pk')[:per_page + 1])
+        if len(rows) > per_page:
+            return KeysetPage(rows[:per_page][::-1], field, params, has_next=True, has_previous=True, count=count)
+        # Début de la liste atteint : première page complète
+
+    rows = queryset.order_by(f"-{field}", '-pk')
+    if after is not None:
+        value, pk = after
+        rows = rows.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value, 'pk__lt': pk}))
+    rows = list(rows[:per_page + 1])
+    return KeysetPage(rows[:per_page], field, params, has_next=len(rows) > per_page, has_previous=after is not None, count=count)
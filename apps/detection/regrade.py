@@ -0,0 +1,137 @@
+"""
+Recalcul en masse des objets retenus et du niveau de danger des détections.
+
+Quand le seuil de confiance ou les catégories dangereuses changent, chaque
+détection est re-notée sans relancer le modèle : ses objets sont extraits de
+`raw_detections` au nouveau seuil (détections antérieures au stockage brut :
+objets inchangés), puis son niveau de danger est recalculé, catégories
+rejetées par validation exclues (voir grading.py). Après une modification de
+catégories, `rescore_categories` ne parcourt que les détections qui les
+contiennent (tâche RESCORE de la file, voir jobs.py).
+
+Les détections sont parcourues par lots dans l'ordre des id ; seules celles qui
+changent sont écrites (bulk_update). bulk_update ne déclenchant pas les
+signaux, chaque lot met lui-même à jour les objets indexés (DetectionObject),
+les agrégats, les compteurs de filtres et les résumés de rapport.
+"""
+import copy
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from apps.core.models import AppSettings
+
+from . import facets, grading, rollups, summaries
+from .models import CategoryValidation, DetectionLog, DetectionObject
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Champs lus par la re-notation et par la mise à jour des données dérivées
+LOADED_FIELDS = (
+    'id', 'user', 'report', 'detection_timestamp', 'user_location', 'media_type', 'danger_level',
+    'detected_objects', 'raw_detections', 'graded_threshold', 'frames_analyzed', 'processing_duration',
+)
+
+
+def rejected_categories(logs):
+    """{id de détection: catégories rejetées par validation} d'un lot, en une requête"""
+    rejected = defaultdict(set)
+    validations = CategoryValidation.objects.filter(detection_log__in=logs, is_valid=False)
+    for detection_log_id, category_name in validations.values_list('detection_log_id', 'category_name'):
+        rejected[detection_log_id].add(category_name.strip().lower())
+    return rejected
+
+
+def regrade_batch(queryset, threshold, levels):
+    """
+    Re-note un lot de détections (verrouillées le temps du lot) ; threshold=None
+    garde leurs objets et ne recalcule que le niveau. Renvoie (détections, modifiées).
+    """
+    with transaction.atomic():
+        logs = list(queryset.select_for_update().only(*LOADED_FIELDS))
+        rejected = rejected_categories(logs)
+        updated, changes = [], []
+        for log in logs:
+            if log.detected_objects is not None and not isinstance(log.detected_objects, list):
+                # JSON enregistré sous forme de chaîne par d'anciennes versions : laissé tel quel
+                continue
+            previous = copy.copy(log)
+            if threshold is not None and log.raw_detections:
+                log.detected_objects = grading.unpack_detections(log.raw_detections, threshold)
+                log.graded_threshold = threshold
+            log.danger_level = grading.danger_level(log.detected_objects, levels, rejected.get(log.pk, ()))
+            changed = (log.detected_objects, log.danger_level) != (previous.detected_objects, previous.danger_level)
+            if changed:
+                changes.append((previous, log))
+            if changed or log.graded_threshold != previous.graded_threshold:
+                updated.append(log)
+        if not updated:
+            return logs, 0
+
+        DetectionLog.objects.bulk_update(updated, ['detected_objects', 'danger_level', 'graded_threshold'])
+        regraded_objects = [current for previous, current in changes if current.detected_objects != previous.detected_objects]
+        if regraded_objects:
+            DetectionObject.objects.filter(detection_log__in=regraded_objects).delete()
+            DetectionObject.objects.bulk_create([row for log in regraded_objects for row in DetectionObject.from_log(log)])
+        if changes:
+            rollups.record_detection_changes(changes)
+            facets.record_detection_changes(changes)
+            summaries.record_detection_changes(changes)
+    return logs, len(changes)
+
+
+def regrade(queryset=None, threshold=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Re-note les détections de `queryset` (toutes par défaut) au seuil donné
+    (celui des paramètres par défaut). `progress(examinées, modifiées, total)`
+    est appelé après chaque lot ; renvoie (examinées, modifiées).
+    """
+    queryset = DetectionLog.objects.all() if queryset is None else queryset
+    threshold = AppSettings.load().dangerous_threshold if threshold is None else threshold
+    levels = grading.category_levels()
+    total = queryset.count()
+    scanned = changed = 0
+    last_id = 0
+    while True:
+        logs, batch_changed = regrade_batch(queryset.filter(pk__gt=last_id).order_by('pk')[:batch_size], threshold, levels)
+        if not logs:
+            break
+        last_id = logs[-1].pk
+        scanned += len(logs)
+        changed += batch_changed
+        if progress:
+            progress(scanned, changed, total)
+    logger.info(f"Re-notation au seuil {threshold} : {scanned} détection(s) examinée(s), {changed} modifiée(s)")
+    return scanned, changed
+
+
+def rescore_categories(categories, batch_size=BATCH_SIZE, progress=None):
+    """
+    Recalcule le niveau de danger des seules détections contenant l'une des
+    catégories données (ajoutées, modifiées ou supprimées), trouvées par l'index
+    (catégorie, détection) de DetectionObject ; objets inchangés. Même
+    `progress` et même retour que `regrade`.
+    """
+    categories = sorted({category.strip().lower() for category in categories if category and category.strip()})
+    containing = DetectionObject.objects.filter(category__in=categories).order_by('detection_log_id')
+    total = containing.values('detection_log_id').distinct().count()
+    levels = grading.category_levels()
+    scanned = changed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            containing.filter(detection_log_id__gt=last_id)
+            .values_list('detection_log_id', flat=True).distinct()[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        logs, batch_changed = regrade_batch(DetectionLog.objects.filter(pk__in=ids).order_by('pk'), None, levels)
+        scanned += len(ids)
+        changed += batch_changed
+        if progress:
+            progress(scanned, changed, total)
+    logger.info(f"Re-notation des catégories {categories} : {scanned} détection(s) examinée(s), {changed} modifiée(s)")
+    return scanned, changed
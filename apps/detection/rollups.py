@@ -0,0 +1,307 @@
+"""
+Agrégats quotidiens des détections (DetectionDailyRollup).
+
+Chaque détection contribue à une ligne « détection » (catégorie vide) et à une
+ligne par catégorie d'objet détecté, sous la clé (jour, utilisateur,
+localisation, type de média, niveau de danger, catégorie). Les contributions
+sont ajoutées ou retirées par UPDATE ... SET n = n + delta au moment où une
+détection ou une validation est écrite (voir signals.py), et
+`manage.py rebuild_rollups` recalcule la table en SQL à partir des données.
+
+Les écritures en masse (bulk_create, bulk_update, QuerySet.update) ne déclenchent
+pas les signaux : elles appellent `record_detections` ou
+`record_detection_changes`, ou reconstruisent les agrégats.
+
+Toute modification change la version des statistiques (`stats_version`) une
+fois la transaction validée : les statistiques mises en cache sous l'ancienne
+version ne sont plus lues.
+"""
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .dates import day_start
+from .models import DetectionDailyRollup, DetectionLog, DetectionObject, ModelValidation, object_category
+
+KEY_FIELDS = ('day', 'user_id', 'location', 'media_type', 'danger_level', 'category')
+VALIDATION_FIELDS = ('valid_count', 'invalid_count', 'incorrect_count')
+STATS_VERSION_CACHE_KEY = 'detection:stats_version'
+
+
+def cache_version(version_key):
+    """Version courante d'un ensemble d'entrées de cache, à inclure dans leurs clés"""
+    version = cache.get(version_key)
+    if version is None:
+        # Initialisée à l'horloge : une clé évincée ne ressert jamais une ancienne version
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def bump_cache_version(version_key):
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.add(version_key, time.time_ns(), timeout=None)
+
+
+def stats_version():
+    """Version courante des statistiques, à inclure dans les clés de cache"""
+    return cache_version(STATS_VERSION_CACHE_KEY)
+
+
+def invalidate_stats():
+    bump_cache_version(STATS_VERSION_CACHE_KEY)
+
+
+def increment(model, lookup, deltas, create=True):
+    """UPDATE ... SET n = n + delta sur la ligne `lookup`, créée si absente (sauf create=False)"""
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Ligne créée entre-temps par une écriture concurrente
+        model.objects.filter(**lookup).update(**updates)
+
+
+def increment_many(model, key_fields, deltas, create=True, batch_size=500):
+    """
+    `increment` pour un lot de lignes : {clé (valeurs de key_fields): {compteur:
+    delta}}. Les lignes sont lues en une requête, les absentes créées (sauf
+    create=False), puis chaque paquet est mis à jour en un seul UPDATE ... SET
+    n = n + CASE WHEN id IN (...) THEN delta ... END : les incréments restent
+    atomiques.
+    """
+    deltas = {key: {field: delta for field, delta in counters.items() if delta} for key, counters in deltas.items()}
+    deltas = {key: counters for key, counters in deltas.items() if counters}
+    if not deltas:
+        return
+
+    def existing_rows():
+        # Sur-ensemble filtré champ par champ (pas de OR par clé), affiné en mémoire
+        candidates = model.objects.filter(**{
+            f"{field}__in": {key[index] for key in deltas} for index, field in enumerate(key_fields)
+        })
+        rows = {}
+        for pk, *key in candidates.values_list('pk', *key_fields):
+            if tuple(key) in deltas:
+                rows[tuple(key)] = pk
+        return rows
+
+    rows = existing_rows()
+    missing = [key for key in deltas if key not in rows]
+    if missing and create:
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key in missing], ignore_conflicts=True, batch_size=batch_size
+        )
+        rows = existing_rows()
+
+    fields = {field for counters in deltas.values() for field in counters}
+    items = [(pk, deltas[key]) for key, pk in rows.items()]
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        updates = {}
+        for field in fields:
+            output_field = type(model._meta.get_field(field))()
+            # Une branche par valeur de delta (peu nombreuses), pas par ligne
+            by_delta = defaultdict(list)
+            for pk, counters in chunk:
+                if field in counters:
+                    by_delta[counters[field]].append(pk)
+            whens = [When(pk__in=pks, then=Value(delta, output_field=output_field)) for delta, pks in by_delta.items()]
+            if whens:
+                updates[field] = F(field) + Case(*whens, default=Value(0, output_field=output_field))
+        model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(**updates)
+
+
+def detection_key(log, category=''):
+    """Clé d'agrégat d'une détection (jour dans le fuseau courant)"""
+    return (
+        timezone.localdate(log.detection_timestamp),
+        log.user_id,
+        log.user_location or '',
+        log.media_type,
+        log.danger_level or '',
+        category,
+    )
+
+
+def detection_contributions(log):
+    """{clé: {compteur: valeur}} d'une détection, hors validation"""
+    contributions = {
+        detection_key(log): {
+            'detection_count': 1,
+            'frames_analyzed': log.frames_analyzed or 0,
+            'processing_seconds': log.processing_duration if (log.processing_duration or 0) > 0 else 0.0,
+            'processed_count': 1 if (log.processing_duration or 0) > 0 else 0,
+        }
+    }
+    for obj in log.detected_objects or []:
+        category = object_category(obj) if isinstance(obj, dict) else None
+        if category is None:
+            continue
+        counters = contributions.setdefault(detection_key(log, category[:100]), {'object_count': 0})
+        counters['object_count'] += 1
+    return contributions
+
+
+def validation_counters(validation):
+    """Compteurs de validation d'une ModelValidation (ou de son état précédent)"""
+    if validation is None:
+        return {}
+    return {
+        'valid_count': 1 if validation.is_correct else 0,
+        'invalid_count': 0 if validation.is_correct else 1,
+        'incorrect_count': 1 if not validation.is_correct and validation.corrected_category is not None else 0,
+    }
+
+
+def apply(contributions, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) des contributions ; un retrait ne crée jamais de ligne"""
+    changed = False
+    for key, counters in contributions.items():
+        deltas = {field: value * sign for field, value in counters.items() if value}
+        if not deltas:
+            continue
+        changed = True
+        increment(DetectionDailyRollup, dict(zip(KEY_FIELDS, key)), deltas, create=sign > 0)
+    if changed:
+        transaction.on_commit(invalidate_stats)
+
+
+def record_detections(logs, validations=()):
+    """Ajoute un lot de détections (et leurs validations) en une mise à jour par clé"""
+    totals = defaultdict(lambda: defaultdict(float))
+    for log in logs:
+        for key, counters in detection_contributions(log).items():
+            for field, value in counters.items():
+                totals[key][field] += value
+    for validation in validations:
+        for field, value in validation_counters(validation).items():
+            totals[detection_key(validation.detection_log)][field] += value
+    apply({key: {field: value if field == 'processing_seconds' else int(value) for field, value in counters.items()}
+           for key, counters in totals.items()})
+
+
+def record_detection(log):
+    apply(detection_contributions(log))
+
+
+def forget_detection(log):
+    apply(detection_contributions(log), sign=-1)
+
+
+def record_detection_change(previous, current):
+    """Déplace les contributions d'une détection modifiée, validation comprise, de son ancien état au nouveau"""
+    validation = ModelValidation.objects.filter(detection_log_id=current.pk).first()
+    before, after = detection_contributions(previous), detection_contributions(current)
+    for field, value in validation_counters(validation).items():
+        before[detection_key(previous)][field] = value
+        after[detection_key(current)][field] = value
+    apply(before, sign=-1)
+    apply(after)
+
+
+def record_detection_changes(pairs):
+    """Déplace en lot les contributions de détections modifiées en masse : paires (avant, après)"""
+    validations = {
+        validation.detection_log_id: validation
+        for validation in ModelValidation.objects.filter(detection_log_id__in=[current.pk for _, current in pairs])
+    }
+    totals = defaultdict(lambda: defaultdict(float))
+    for previous, current in pairs:
+        for log, sign in ((previous, -1), (current, 1)):
+            contributions = detection_contributions(log)
+            contributions[detection_key(log)].update(validation_counters(validations.get(log.pk)))
+            for key, counters in contributions.items():
+                for field, value in counters.items():
+                    totals[key][field] += value * sign
+
+    increment_many(DetectionDailyRollup, KEY_FIELDS, {
+        key: {field: round(value, 6) if field == 'processing_seconds' else int(value) for field, value in counters.items()}
+        for key, counters in totals.items()
+    })
+    transaction.on_commit(invalidate_stats)
+
+
+def record_validation_change(log, previous, current):
+    """Remplace l'état de validation `previous` par `current` (None : absente) sur la ligne de la détection"""
+    before, after = validation_counters(previous), validation_counters(current)
+    deltas = {field: after.get(field, 0) - before.get(field, 0) for field in VALIDATION_FIELDS}
+    if any(deltas.values()):
+        # Les deltas négatifs retirent, les positifs ajoutent : appliqués séparément
+        apply({detection_key(log): {f: -d for f, d in deltas.items() if d < 0}}, sign=-1)
+        apply({detection_key(log): {f: d for f, d in deltas.items() if d > 0}})
+
+
+def rebuild(since=None):
+    """Recalcule les agrégats en SQL (à partir du jour `since` inclus, ou en totalité) ; renvoie le nombre de lignes"""
+    logs = DetectionLog.objects.order_by()
+    objects = DetectionObject.objects.order_by()
+    stale = DetectionDailyRollup.objects.all()
+    if since is not None:
+        logs = logs.filter(detection_timestamp__gte=day_start(since))
+        objects = objects.filter(detection_log__detection_timestamp__gte=day_start(since))
+        stale = stale.filter(day__gte=since)
+
+    timed = Q(processing_duration__gt=0)
+    detection_rows = logs.values(
+        agg_day=TruncDate('detection_timestamp'),
+        agg_user=F('user_id'),
+        agg_location=Coalesce('user_location', Value('')),
+        agg_media_type=F('media_type'),
+        agg_danger_level=Coalesce('danger_level', Value('')),
+    ).annotate(
+        detections=Count('id'),
+        frames=Coalesce(Sum('frames_analyzed'), 0),
+        seconds=Coalesce(Sum('processing_duration', filter=timed), Value(0.0), output_field=FloatField()),
+        timed=Count('id', filter=timed),
+        valid=Count('id', filter=Q(validation__is_correct=True)),
+        invalid=Count('id', filter=Q(validation__is_correct=False)),
+        incorrect=Count('id', filter=Q(validation__is_correct=False, validation__corrected_category__isnull=False)),
+    )
+    object_rows = objects.values(
+        agg_day=TruncDate('detection_log__detection_timestamp'),
+        agg_user=F('detection_log__user_id'),
+        agg_location=Coalesce('detection_log__user_location', Value('')),
+        agg_media_type=F('detection_log__media_type'),
+        agg_danger_level=Coalesce('detection_log__danger_level', Value('')),
+        agg_category=F('category'),
+    ).annotate(objects=Count('id'))
+
+    def key(row, category=''):
+        return {
+            'day': row['agg_day'], 'user_id': row['agg_user'], 'location': row['agg_location'],
+            'media_type': row['agg_media_type'], 'danger_level': row['agg_danger_level'], 'category': category,
+        }
+
+    rows = [
+        DetectionDailyRollup(
+            **key(row), detection_count=row['detections'], frames_analyzed=row['frames'],
+            processing_seconds=row['seconds'], processed_count=row['timed'],
+            valid_count=row['valid'], invalid_count=row['invalid'], incorrect_count=row['incorrect'],
+        )
+        for row in detection_rows.iterator()
+    ]
+    rows.extend(
+        DetectionDailyRollup(**key(row, row['agg_category']), object_count=row['objects'])
+        for row in object_rows.iterator()
+    )
+    with transaction.atomic():
+        stale.delete()
+        DetectionDailyRollup.objects.bulk_create(rows, batch_size=2000)
+    invalidate_stats()
+    return len(rows)
+
+
+def validation_snapshot(validation_id):
+    """État enregistré d'une validation avant sa modification, ou None"""
+    return ModelValidation.objects.filter(pk=validation_id).only('is_correct', 'corrected_category').first()
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import facets, rollups, summaries
+from .jobs import enqueue_rescore
+from .models import DangerousCategory, DetectionLog, ModelValidation, Report
+from .storage import media_store
+
+
+@receiver(post_delete, sender=DetectionLog)
+def release_detection_media(sender, instance, **kwargs):
+    """Libère les fichiers de la détection supprimée (y compris lors d'une suppression en cascade)"""
+    media_store.release(instance.original_file.name)
+    media_store.release(instance.uploaded_file.name)
+    # Le résultat annoté n'appartient qu'à cette détection : supprimé une fois la transaction validée
+    annotated_file = instance.uploaded_file.name
+    transaction.on_commit(lambda: media_store.remove_annotated_output(annotated_file))
+
+
+# Champs d'une détection dont dépendent agrégats, compteurs de filtres et résumés de rapport
+AGGREGATED_DETECTION_FIELDS = (
+    'user_id', 'report_id', 'detection_timestamp', 'user_location', 'media_type', 'danger_level',
+    'detected_objects', 'frames_analyzed', 'processing_duration',
+)
+
+
+@receiver(pre_save, sender=DetectionLog)
+def remember_previous_detection(sender, instance, raw=False, **kwargs):
+    instance._aggregated_previous = None
+    if not raw and not instance._state.adding:
+        instance._aggregated_previous = DetectionLog.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=DetectionLog)
+def add_detection_to_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        rollups.record_detection(instance)
+        facets.record_detection(instance)
+        summaries.record_detection(instance)
+        return
+    # Détection modifiée (niveau de danger recalculé après une validation de catégorie...)
+    previous = getattr(instance, '_aggregated_previous', None)
+    if previous is not None and any(
+        getattr(previous, field) != getattr(instance, field) for field in AGGREGATED_DETECTION_FIELDS
+    ):
+        rollups.record_detection_change(previous, instance)
+        facets.forget_detection(previous)
+        facets.record_detection(instance)
+        summaries.record_detection_change(previous, instance)
+
+
+@receiver(post_delete, sender=DetectionLog)
+def remove_detection_from_rollups(sender, instance, **kwargs):
+    # Sa validation, supprimée avant elle par la cascade, a déjà été retirée
+    rollups.forget_detection(instance)
+    facets.forget_detection(instance)
+    if instance.report_id not in facets.reports_being_deleted():
+        summaries.forget_detection(instance)
+
+
+@receiver(pre_save, sender=ModelValidation)
+def remember_previous_validation(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None if raw or instance.pk is None else rollups.validation_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=ModelValidation)
+def update_validation_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        previous = getattr(instance, '_rollup_previous', None)
+        rollups.record_validation_change(instance.detection_log, previous, instance)
+        summaries.record_validation_change(instance.detection_log, previous, instance)
+
+
+@receiver(post_delete, sender=ModelValidation)
+def remove_validation_from_rollups(sender, instance, **kwargs):
+    detection_log = DetectionLog.objects.filter(pk=instance.detection_log_id).first()
+    if detection_log is not None:
+        rollups.record_validation_change(detection_log, instance, None)
+        if detection_log.report_id not in facets.reports_being_deleted():
+            summaries.record_validation_change(detection_log, instance, None)
+
+
+@receiver(post_save, sender=Report)
+def add_report_to_facets(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        facets.record_report(instance)
+
+
+@receiver(pre_delete, sender=Report)
+def remove_report_from_facets(sender, instance, **kwargs):
+    # Avant la cascade : les détections du rapport sont encore lisibles
+    facets.forget_report(instance)
+
+
+@receiver(post_delete, sender=Report)
+def forget_deleted_report(sender, instance, **kwargs):
+    facets.report_deleted(instance)
+
+
+# Champs d'une catégorie dont dépend le niveau de danger des détections
+GRADED_CATEGORY_FIELDS = ('name', 'category_type', 'is_active')
+
+
+@receiver(pre_save, sender=DangerousCategory)
+def remember_previous_category(sender, instance, raw=False, **kwargs):
+    instance._graded_previous = None
+    if not raw and not instance._state.adding:
+        instance._graded_previous = DangerousCategory.objects.filter(pk=instance.pk).values(*GRADED_CATEGORY_FIELDS).first()
+
+
+@receiver(post_save, sender=DangerousCategory)
+def rescore_saved_category(sender, instance, created, raw=False, **kwargs):
+    """Re-note les détections concernées après l'ajout ou la modification d'une catégorie (vues ou administration)"""
+    if raw:
+        return
+    previous = getattr(instance, '_graded_previous', None)
+    if created or previous is None:
+        categories = [instance.name]
+    elif any(previous[field] != getattr(instance, field) for field in GRADED_CATEGORY_FIELDS):
+        # Un renommage concerne les détections de l'ancien nom comme du nouveau
+        categories = [previous['name'], instance.name]
+    else:
+        return
+    transaction.on_commit(lambda: enqueue_rescore(categories))
+
+
+@receiver(post_delete, sender=DangerousCategory)
+def rescore_deleted_category(sender, instance, **kwargs):
+    name = instance.name
+    transaction.on_commit(lambda: enqueue_rescore([name]))
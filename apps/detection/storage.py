@@ -0,0 +1,173 @@
+"""
+Stockage des médias adressé par contenu.
+
+Un fichier est rangé sous `cas/<h[0:2]>/<h[2:4]>/<sha256><ext>` : deux uploads
+identiques partagent le même fichier, et le chemin se déduit du contenu sans
+sonder le disque. Chaque `MediaBlob` compte ses références (une par upload
+en cours de traitement ou par DetectionLog) ; le fichier est supprimé quand
+la dernière référence est libérée.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MediaBlob
+
+logger = logging.getLogger(__name__)
+
+CAS_DIRECTORY = 'cas'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def blob_path(sha256, ext=''):
+    """Chemin relatif à MEDIA_ROOT d'un contenu"""
+    return f"{CAS_DIRECTORY}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}"
+
+
+def is_blob_path(name):
+    return bool(name) and str(name).startswith(f"{CAS_DIRECTORY}/")
+
+
+def annotated_output_paths(name):
+    """Fichiers d'un résultat annoté (résultat, planche de vignettes et son index) et, pour HLS, son répertoire"""
+    stem = os.path.splitext(name)[0]
+    files = [name, f"{stem}_keyframes.jpg", f"{stem}_keyframes.json"]
+    directory = os.path.dirname(name) if name.endswith('.m3u8') else None
+    return files, directory
+
+
+def attempt_output_path(name, attempt):
+    """
+    Résultat annoté propre à une tentative de tâche : un worker dont le bail a
+    expiré n'écrit jamais dans les fichiers de la tentative qui l'a remplacé.
+    La première tentative garde le nom choisi à l'upload.
+    """
+    if not name or attempt <= 1:
+        return name
+    if name.endswith('.m3u8'):
+        directory, filename = os.path.split(name)
+        return f"{directory}_{attempt}/{filename}"
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_{attempt}{ext}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage dont les noms sont dérivés du SHA-256 du contenu, avec déduplication"""
+
+    def reference(self, sha256):
+        """Ajoute une référence à un contenu déjà stocké ; None s'il est inconnu"""
+        updated = MediaBlob.objects.filter(sha256=sha256).update(
+            ref_count=F('ref_count') + 1,
+            last_referenced_at=timezone.now(),
+        )
+        if not updated:
+            return None
+        return MediaBlob.objects.get(sha256=sha256)
+
+    def save_chunks(self, chunks, filename, sha256=None):
+        """
+        Stocke un contenu fourni par blocs et retourne son MediaBlob (avec une référence).
+
+        Si `sha256` est déjà connu (calculé pendant l'upload) et stocké, rien
+        n'est écrit. Sinon le contenu est écrit dans cas/tmp en calculant le
+        hachage, puis renommé atomiquement à son emplacement définitif.
+        """
+        if sha256:
+            blob = self.reference(sha256)
+            if blob:
+                logger.info(f"Deduplicated upload {filename}: {blob.path}")
+                return blob
+
+        tmp_dir = self.path(f"{CAS_DIRECTORY}/tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as destination:
+                for chunk in chunks:
+                    destination.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            return self._commit(tmp_path, digest.hexdigest(), size, os.path.splitext(filename)[1])
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def adopt(self, name, filename=None):
+        """Déplace un fichier existant sous MEDIA_ROOT dans le stockage (migration, upload par morceaux)"""
+        full_path = self.path(name)
+        digest = hashlib.sha256()
+        with open(full_path, 'rb') as source:
+            for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        size = os.path.getsize(full_path)
+        return self._commit(full_path, digest.hexdigest(), size, os.path.splitext(filename or name)[1])
+
+    def _commit(self, source_path, sha256, size, ext):
+        """Range `source_path` sous son hachage, ou le supprime si le contenu existe déjà"""
+        blob = self.reference(sha256)
+        if blob:
+            os.remove(source_path)
+            return blob
+
+        path = blob_path(sha256, ext)
+        full_path = self.path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(source_path, full_path)
+        try:
+            with transaction.atomic():
+                return MediaBlob.objects.create(sha256=sha256, path=path, size=size, ref_count=1)
+        except IntegrityError:
+            # Même contenu stocké simultanément par une autre requête
+            blob = self.reference(sha256)
+            if blob is None:
+                raise
+            if blob.path != path:
+                os.remove(full_path)
+            return blob
+
+    def release(self, name):
+        """Libère une référence ; supprime le fichier à la dernière. Retourne True si supprimé."""
+        if not is_blob_path(name):
+            return False
+        with transaction.atomic():
+            MediaBlob.objects.filter(path=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+            deleted, _ = MediaBlob.objects.filter(path=name, ref_count=0).delete()
+            # Suppression avant le commit : un upload concurrent du même contenu attend le verrou puis réécrit le fichier
+            if deleted and os.path.exists(self.path(name)):
+                os.remove(self.path(name))
+        if deleted:
+            logger.info(f"Released last reference, deleted {name}")
+        return bool(deleted)
+
+    def remove_annotated_output(self, name):
+        """Supprime un résultat annoté et ses fichiers dérivés (non dédupliqués, jamais partagés)"""
+        if not name or is_blob_path(name):
+            return
+        files, directory = annotated_output_paths(name)
+        if directory:
+            shutil.rmtree(self.path(directory), ignore_errors=True)
+            return
+        for path in files:
+            if os.path.exists(self.path(path)):
+                os.remove(self.path(path))
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif est choisi dans _save à partir du contenu
+        return name
+
+    def _save(self, name, content):
+        blob = self.save_chunks(content.chunks(), name, getattr(content, 'sha256', None))
+        return blob.path
+
+
+media_store = ContentAddressedStorage()
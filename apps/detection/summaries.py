@@ -0,0 +1,160 @@
+"""
+Résumé des rapports (compteurs et `category_counts` de Report).
+
+Chaque détection d'un rapport y ajoute une unité à son niveau de danger et à
+son type de média, ses objets par catégorie, ses images analysées et sa durée
+de traitement ; sa validation compte comme valide ou non valide. Le résumé est
+mis à jour dans la transaction qui écrit la détection ou la validation (voir
+signals.py) : les pages et PDF de rapport le lisent sans parcourir les
+détections. Les modifications en masse appellent `record_detection_changes`,
+et `refresh` le recalcule en SQL (écritures en masse, rebuild_rollups).
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import DetectionLog, DetectionObject, ModelValidation, Report, object_category
+from .rollups import increment_many
+
+LEVEL_FIELDS = {'': 'normal_count', 'DANGEROUS': 'dangerous_count', 'HYPERDANGEROUS': 'hyperdangerous_count'}
+MEDIA_FIELDS = {'IMAGE': 'image_count', 'VIDEO': 'video_count'}
+COUNTER_FIELDS = (
+    'detection_count', 'normal_count', 'dangerous_count', 'hyperdangerous_count', 'image_count', 'video_count',
+    'frames_analyzed', 'processing_seconds', 'valid_count', 'invalid_count',
+)
+
+
+def detection_summary(log):
+    """(compteurs, objets par catégorie) apportés par une détection, hors validation"""
+    counters = Counter({
+        'detection_count': 1,
+        'frames_analyzed': log.frames_analyzed or 0,
+        'processing_seconds': max(log.processing_duration or 0, 0),
+    })
+    if (log.danger_level or '') in LEVEL_FIELDS:
+        counters[LEVEL_FIELDS[log.danger_level or '']] += 1
+    if log.media_type in MEDIA_FIELDS:
+        counters[MEDIA_FIELDS[log.media_type]] += 1
+    categories = Counter()
+    for obj in log.detected_objects or []:
+        category = object_category(obj) if isinstance(obj, dict) else None
+        if category is not None:
+            categories[category] += 1
+    return counters, categories
+
+
+def validation_summary(validation):
+    if validation is None:
+        return Counter()
+    return Counter({'valid_count' if validation.is_correct else 'invalid_count': 1})
+
+
+def apply(report_id, counters, categories=None, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) des compteurs au résumé d'un rapport"""
+    updates = {field: F(field) + value * sign for field, value in counters.items() if value}
+    with transaction.atomic():
+        if categories:
+            # Lecture-écriture du JSON sous verrou de ligne : pas d'incrément SQL possible
+            current = Report.objects.select_for_update().filter(pk=report_id).values_list('category_counts', flat=True).first()
+            if current is None:
+                return
+            merged = Counter(current)
+            for category, count in categories.items():
+                merged[category] += count * sign
+            updates['category_counts'] = {category: count for category, count in sorted(merged.items()) if count > 0}
+        if updates:
+            Report.objects.filter(pk=report_id).update(**updates)
+
+
+def record_detection(log, sign=1):
+    if log.report_id:
+        counters, categories = detection_summary(log)
+        apply(log.report_id, counters, categories, sign)
+
+
+def forget_detection(log):
+    record_detection(log, sign=-1)
+
+
+def record_detection_change(previous, current):
+    """Remplace l'état précédent d'une détection modifiée par le nouveau (validation suivie si le rapport change)"""
+    forget_detection(previous)
+    record_detection(current)
+    if previous.report_id != current.report_id:
+        validation = ModelValidation.objects.filter(detection_log_id=current.pk).first()
+        record_validation_change(previous, validation, None)
+        record_validation_change(current, None, validation)
+
+
+def record_detection_changes(pairs):
+    """Remplace en lot l'état précédent de détections modifiées en masse (paires (avant, après), rapport inchangé)"""
+    totals = defaultdict(lambda: (Counter(), Counter()))
+    for previous, current in pairs:
+        for log, sign in ((previous, -1), (current, 1)):
+            if log.report_id:
+                counters, categories = detection_summary(log)
+                report_counters, report_categories = totals[log.report_id]
+                for field, value in counters.items():
+                    report_counters[field] += value * sign
+                for category, count in categories.items():
+                    report_categories[category] += count * sign
+    with transaction.atomic():
+        increment_many(Report, ('id',), {
+            (report_id,): {field: round(value, 6) for field, value in counters.items()}
+            for report_id, (counters, _) in totals.items()
+        }, create=False)
+        changed = {report_id: categories for report_id, (_, categories) in totals.items() if any(categories.values())}
+        # JSON des catégories : lecture-écriture sous verrou de ligne, en une requête chacune
+        reports = list(Report.objects.select_for_update().filter(pk__in=changed).only('id', 'category_counts'))
+        for report in reports:
+            merged = Counter(report.category_counts)
+            merged.update(changed[report.pk])
+            report.category_counts = {category: count for category, count in sorted(merged.items()) if count > 0}
+        Report.objects.bulk_update(reports, ['category_counts'], batch_size=500)
+
+
+def record_validation_change(log, previous, current):
+    if log.report_id:
+        deltas = validation_summary(current)
+        deltas.subtract(validation_summary(previous))
+        apply(log.report_id, deltas)
+
+
+def refresh(reports=None):
+    """Recalcule en SQL le résumé des rapports donnés (queryset ou liste d'id), ou de tous ; renvoie leur nombre"""
+    queryset = Report.objects.all() if reports is None else Report.objects.filter(pk__in=reports)
+    logs = DetectionLog.objects.filter(report__in=queryset).order_by()
+    objects = DetectionObject.objects.filter(detection_log__report__in=queryset).order_by()
+
+    totals = {
+        row.pop('report_id'): row
+        for row in logs.values('report_id').annotate(
+            detection_count=Count('id'),
+            normal_count=Count('id', filter=Q(danger_level__isnull=True) | Q(danger_level='')),
+            dangerous_count=Count('id', filter=Q(danger_level='DANGEROUS')),
+            hyperdangerous_count=Count('id', filter=Q(danger_level='HYPERDANGEROUS')),
+            image_count=Count('id', filter=Q(media_type='IMAGE')),
+            video_count=Count('id', filter=Q(media_type='VIDEO')),
+            frames_analyzed=Coalesce(Sum('frames_analyzed'), 0),
+            processing_seconds=Coalesce(
+                Sum('processing_duration', filter=Q(processing_duration__gt=0)), Value(0.0), output_field=FloatField()
+            ),
+            valid_count=Count('id', filter=Q(validation__is_correct=True)),
+            invalid_count=Count('id', filter=Q(validation__is_correct=False)),
+        )
+    }
+    categories = {}
+    for report_id, category, count in objects.values_list('detection_log__report_id', 'category').annotate(n=Count('id')):
+        categories.setdefault(report_id, {})[category] = count
+
+    updated = []
+    for report in queryset.only('id'):
+        row = totals.get(report.pk, {})
+        for field in COUNTER_FIELDS:
+            setattr(report, field, row.get(field, 0))
+        report.category_counts = dict(sorted(categories.get(report.pk, {}).items()))
+        updated.append(report)
+    Report.objects.bulk_update(updated, [*COUNTER_FIELDS, 'category_counts'], batch_size=500)
+    return len(updated)
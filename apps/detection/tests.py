@@ -1,3 +1,216 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.detection import jobs
+from apps.detection.models import DetectionJob, DetectionLog, DetectionObject, MediaBlob, Report
+from apps.detection.storage import media_store
+from apps.users.models import User
+
+
+class ReportsHistoryQueryCountTests(TestCase):
+    """Le nombre de requêtes de reports_history ne dépend pas du nombre de rapports affichés"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'secret', role=User.Role.ADMINISTRATOR)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_reports(self, count):
+        for index in range(count):
+            report = Report.objects.create(user=self.admin, name=f"Rapport {index}", location='Gare')
+            for danger_level in (None, 'DANGEROUS', 'HYPERDANGEROUS', 'DANGEROUS', None):
+                log = DetectionLog.objects.create(
+                    user=self.admin, report=report, uploaded_file=f"detection_results/{index}.jpg",
+                    detected_objects=[{'category': 'couteau', 'confidence': 0.9}], danger_level=danger_level,
+                )
+                DetectionObject.objects.bulk_create(DetectionObject.from_log(log))
+
+    def count_queries(self, params=None):
+        # Compteurs de filtres relus en base à chaque mesure
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('detection:reports_history'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_constant(self):
+        self.add_reports(1)
+        _, one_report = self.count_queries()
+        self.add_reports(9)
+        response, full_page = self.count_queries()
+
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertEqual(full_page, one_report)
+        # Session, utilisateur, compteurs de filtres, rapports, aperçus, liste des utilisateurs
+        self.assertLessEqual(full_page, 6)
+
+    def test_stats_and_previews(self):
+        self.add_reports(2)
+        response, _ = self.count_queries({'danger_level': 'hyperdangerous', 'class': 'couteau'})
+
+        reports = list(response.context['page_obj'])
+        self.assertEqual(len(reports), 2)
+        for report in reports:
+            self.assertEqual(report.stats, {'normal': 2, 'dangerous': 2, 'hyperdangerous': 1, 'total': 5})
+            self.assertEqual(len(report.preview_detections), 3)
+
+
+class TemporaryMediaRootMixin:
+    """MEDIA_ROOT propre à chaque test, supprimé ensuite"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_media(self, name, content):
+        full_path = media_store.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as destination:
+            destination.write(content)
+        return full_path
+
+
+class DetectionJobQueueTests(TemporaryMediaRootMixin, TestCase):
+    """Réclamation, bail et libération des fichiers de la file de détection"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operateur@example.com', 'secret')
+
+    def enqueue(self):
+        blob = media_store.save_chunks([b'\xff\xd8\xff image'], 'photo.jpg')
+        return jobs.enqueue_detection(self.user, blob.path, 'detection_results/photo.jpg', 'IMAGE')
+
+    def expire_lease(self, job):
+        DetectionJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_only_one_worker_claims_a_job(self):
+        job = self.enqueue()
+
+        claimed = jobs.claim_job(job.id, 'worker-1')
+        self.assertIsNotNone(claimed)
+        self.assertIsNone(jobs.claim_job(job.id, 'worker-2'))
+        self.assertIsNone(jobs.claim_next_job('worker-2'))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.lease_owner, job.attempts), ('RUNNING', 'worker-1', 1))
+
+    def test_stale_worker_rolls_back_after_lease_is_reclaimed(self):
+        job = self.enqueue()
+        stale = jobs.claim_job(job.id, 'worker-1')
+        self.expire_lease(job)
+        current = jobs.claim_job(job.id, 'worker-2')
+        self.assertIsNotNone(current)
+        self.assertEqual(current.attempts, 2)
+
+        with self.assertRaises(jobs.LeaseLost):
+            jobs.execute_job(stale, 'worker-1')
+        self.assertFalse(DetectionLog.objects.exists())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.lease_owner), ('RUNNING', 'worker-2'))
+
+        detection_log = jobs.execute_job(current, 'worker-2')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(job.detection_log, detection_log)
+        self.assertEqual(detection_log.uploaded_file.name, 'detection_results/photo_2.jpg')
+        self.assertEqual(DetectionLog.objects.count(), 1)
+
+    def test_fail_expired_jobs_releases_the_original(self):
+        job = self.enqueue()
+        DetectionJob.objects.filter(pk=job.pk).update(attempts=job.max_attempts - 1)
+        jobs.claim_job(job.id, 'worker-1')
+        self.expire_lease(job)
+
+        self.assertEqual(jobs.fail_expired_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertFalse(MediaBlob.objects.filter(path=job.original_file).exists())
+        self.assertFalse(os.path.exists(media_store.path(job.original_file)))
+        # Déjà en échec : rien à libérer une seconde fois
+        self.assertEqual(jobs.fail_expired_jobs(), 0)
+
+
+class ContentAddressedStorageTests(TemporaryMediaRootMixin, TestCase):
+    """Comptage des références : un fichier n'est supprimé qu'à sa dernière référence"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operateur@example.com', 'secret')
+
+    def create_log(self, original_file):
+        return DetectionLog.objects.create(user=self.user, original_file=original_file, uploaded_file='detection_results/x.jpg')
+
+    def test_identical_uploads_share_one_file_until_the_last_log_is_deleted(self):
+        first = media_store.save_chunks([b'\xff\xd8\xff', b' identique'], 'a.jpg')
+        second = media_store.save_chunks([b'\xff\xd8\xff identique'], 'b.jpg')
+        self.assertEqual(first.path, second.path)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+        logs = [self.create_log(first.path), self.create_log(second.path)]
+        logs[0].delete()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(media_store.path(first.path)))
+
+        logs[1].delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(os.path.exists(media_store.path(first.path)))
+
+    def test_concurrent_store_of_the_same_content_adds_a_reference(self):
+        stored = media_store.save_chunks([b'contenu'], 'a.jpg')
+        real_reference = media_store.reference
+        lookups = []
+
+        def racing_reference(sha256):
+            # L'autre requête enregistre le MediaBlob juste après notre première recherche
+            lookups.append(sha256)
+            return None if len(lookups) == 1 else real_reference(sha256)
+
+        with mock.patch.object(media_store, 'reference', side_effect=racing_reference):
+            blob = media_store.save_chunks([b'contenu'], 'b.jpg')
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(blob.pk, stored.pk)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        self.assertTrue(os.path.exists(media_store.path(stored.path)))
+        self.assertEqual(os.listdir(media_store.path('cas/tmp')), [])
+
+    def test_migrate_media_counts_references_of_duplicate_legacy_files(self):
+        for name in ('uploads/a.jpg', 'uploads/b.jpg'):
+            self.write_media(name, b'\xff\xd8\xff doublon')
+        self.create_log('uploads/a.jpg')
+        self.create_log('uploads/a.jpg')
+        self.create_log('uploads/b.jpg')
+        DetectionJob.objects.create(user=self.user, original_file='uploads/b.jpg', annotated_file='detection_results/y.jpg')
+
+        call_command('migrate_media', stdout=io.StringIO())
+
+        blob = MediaBlob.objects.get()
+        # Trois détections et une tâche en attente
+        self.assertEqual(blob.ref_count, 4)
+        self.assertEqual(set(DetectionLog.objects.values_list('original_file', flat=True)), {blob.path})
+        self.assertEqual(DetectionJob.objects.get().original_file, blob.path)
+        self.assertFalse(os.path.exists(media_store.path('uploads/a.jpg')))
+        self.assertFalse(os.path.exists(media_store.path('uploads/b.jpg')))
+
+        for detection_log in DetectionLog.objects.all():
+            detection_log.delete()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(media_store.path(blob.path)))
@@ -0,0 +1,89 @@
+"""
+Mesure du temps passé dans chaque étape d'une détection.
+
+Un `StageTimer` accompagne une détection de l'upload jusqu'à l'écriture du
+DetectionLog : les durées d'une même étape s'additionnent (une vidéo décode
+des milliers de frames) et le résultat est enregistré dans
+`DetectionLog.stage_timings`, en secondes. La durée de l'écriture de ce
+DetectionLog (`db_write`) n'est connue qu'après son insertion : elle est
+enregistrée sur la tâche (`DetectionJob.stage_timings`), dans la même
+transaction.
+"""
+import math
+import time
+from contextlib import contextmanager
+
+# Étapes dans l'ordre du traitement, avec leur libellé pour le tableau de bord
+STAGES = (
+    ('store', 'Réception et stockage'),
+    ('queue_wait', "Attente en file"),
+    ('setup', 'Préparation'),
+    ('decode', 'Décodage'),
+    ('inference', 'Inférence'),
+    ('annotate', 'Annotation'),
+    ('encode', 'Encodage'),
+    ('keyframes', 'Vignettes'),
+    ('db_write', 'Écriture en base'),
+)
+
+
+class StageTimer:
+    """Chronomètre cumulatif par étape"""
+
+    def __init__(self, initial=None):
+        self.stages = dict(initial or {})
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        return {name: round(seconds, 4) for name, seconds in self.stages.items()}
+
+
+def with_db_write(timings, job_timings):
+    """Durées d'un DetectionLog complétées de son écriture en base, lue sur la tâche qui l'a créé"""
+    if timings is not None and job_timings and 'db_write' in job_timings:
+        return {**timings, 'db_write': job_timings['db_write']}
+    return timings
+
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche d'une liste déjà triée"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def stage_breakdown(rows):
+    """
+    p50 / p95 de chaque étape, par type de média et modèle.
+
+    `rows` : itérable de (media_type, model_used, stage_timings).
+    """
+    groups = {}
+    for media_type, model_used, timings in rows:
+        if not timings:
+            continue
+        group = groups.setdefault((media_type, model_used or 'inconnu'), {'count': 0, 'stages': {}})
+        group['count'] += 1
+        for name, seconds in timings.items():
+            group['stages'].setdefault(name, []).append(seconds)
+
+    breakdown = []
+    for (media_type, model_used), group in sorted(groups.items()):
+        stages = []
+        for name, label in STAGES:
+            values = sorted(group['stages'].get(name, []))
+            if values:
+                stages.append({'name': name, 'label': label, 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95)})
+        breakdown.append({'media_type': media_type, 'model_used': model_used, 'count': group['count'], 'stages': stages})
+    return breakdown
@@ -0,0 +1,162 @@
+"""
+Contrôle des uploads de détection pendant la réception du corps de la requête.
+
+`DetectionUploadHandler` est placé en tête de la chaîne des upload handlers :
+il vérifie l'extension à l'ouverture de chaque fichier, les octets magiques sur
+le premier bloc et la limite de taille du type au fil de l'eau, puis calcule le
+SHA-256 dans le même passage. Les données sont transmises telles quelles aux
+handlers par défaut (mémoire / fichier temporaire). Un fichier refusé
+interrompt la réception immédiatement au lieu d'attendre la fin des 500 Mo.
+"""
+import hashlib
+import logging
+import os
+from functools import partial, wraps
+
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.jfif')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv')
+ZIP_EXTENSIONS = ('.zip',)
+
+MAX_UPLOAD_SIZES = {
+    'IMAGE': 10 * 1024 * 1024,    # 10 MB
+    'VIDEO': 500 * 1024 * 1024,   # 500 MB
+    'ZIP': 100 * 1024 * 1024,     # 100 MB
+}
+
+SIZE_LABELS = {'IMAGE': '10 Mo', 'VIDEO': '500 Mo', 'ZIP': '100 Mo'}
+
+# Marge pour les autres champs du formulaire quand la requête ne contient qu'un fichier
+SINGLE_FILE_FORM_OVERHEAD = 64 * 1024
+
+# Atomes ISO-BMFF possibles en tête d'un MP4/MOV
+MP4_LEADING_ATOMS = (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot')
+
+
+def media_kind_for_filename(filename):
+    """Type attendu d'après l'extension : 'IMAGE', 'VIDEO', 'ZIP' ou None"""
+    ext = os.path.splitext(filename.lower())[1]
+    if ext in IMAGE_EXTENSIONS:
+        return 'IMAGE'
+    if ext in VIDEO_EXTENSIONS:
+        return 'VIDEO'
+    if ext in ZIP_EXTENSIONS:
+        return 'ZIP'
+    return None
+
+
+def sniff_media_kind(head):
+    """Type réel d'après les premiers octets du fichier, ou None si non reconnu"""
+    if head.startswith(b'\xff\xd8\xff') or head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'IMAGE'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'IMAGE'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'VIDEO'
+    if head[4:8] in MP4_LEADING_ATOMS:
+        return 'VIDEO'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):  # Matroska
+        return 'VIDEO'
+    if head.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'):  # ASF / WMV
+        return 'VIDEO'
+    if head.startswith(b'FLV'):
+        return 'VIDEO'
+    if head.startswith(b'PK\x03\x04') or head.startswith(b'PK\x05\x06'):
+        return 'ZIP'
+    return None
+
+
+class DetectionUploadHandler(FileUploadHandler):
+    """Refuse au plus tôt les fichiers trop volumineux ou dont le contenu ne correspond pas à l'extension"""
+
+    def __init__(self, request=None, single_file=False):
+        super().__init__(request)
+        self.single_file = single_file
+        self.request_length = None
+        request.upload_errors = []
+        request.upload_digests = {}
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_length = content_length
+        return None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.kind = media_kind_for_filename(file_name)
+        self.received = 0
+        self.sha256 = hashlib.sha256()
+        if self.kind is None:
+            self.reject(
+                f"Le fichier '{file_name}' doit être une image (JPG, PNG, WEBP, JFIF), "
+                f"une vidéo (MP4, AVI, MOV) ou un fichier ZIP."
+            )
+        if content_length and content_length > MAX_UPLOAD_SIZES[self.kind]:
+            self.reject_size()
+        # Formulaire à fichier unique : la taille totale de la requête suffit à refuser avant toute lecture
+        if self.single_file and self.request_length and \
+                self.request_length > MAX_UPLOAD_SIZES[self.kind] + SINGLE_FILE_FORM_OVERHEAD:
+            self.reject_size()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and sniff_media_kind(raw_data[:16]) != self.kind:
+            self.reject(f"Le contenu du fichier '{self.file_name}' ne correspond pas à son extension.")
+
+        self.received += len(raw_data)
+        if self.received > MAX_UPLOAD_SIZES[self.kind]:
+            self.reject_size()
+
+        self.sha256.update(raw_data)
+        # Transmettre le bloc au handler suivant, qui construit le fichier
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_digests.setdefault(self.field_name, []).append(self.sha256.hexdigest())
+        return None
+
+    def reject_size(self):
+        labels = {'IMAGE': "L'image", 'VIDEO': 'La vidéo', 'ZIP': 'Le fichier ZIP'}
+        self.reject(f"{labels[self.kind]} '{self.file_name}' dépasse la limite de {SIZE_LABELS[self.kind]}.")
+
+    def reject(self, message):
+        logger.warning(f"Upload rejected while streaming ({self.received} bytes read): {message}")
+        self.request.upload_errors.append(message)
+        # Couper la connexion plutôt que lire le reste du corps
+        raise StopUpload(connection_reset=True)
+
+
+def upload_digest(request, field_name, index=0):
+    """SHA-256 calculé pendant la réception du n-ième fichier du champ"""
+    digests = getattr(request, 'upload_digests', {}).get(field_name, [])
+    return digests[index] if index < len(digests) else None
+
+
+def detection_upload_view(view=None, *, single_file=False):
+    """
+    Installe DetectionUploadHandler avant la lecture du corps.
+
+    Le middleware CSRF lit request.POST dans process_view : la vue est exemptée
+    puis protégée explicitement une fois le handler en place. `single_file`
+    indique que le formulaire ne porte qu'un fichier (refus sur Content-Length).
+    """
+    if view is None:
+        return partial(detection_upload_view, single_file=single_file)
+    protected_view = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method == 'POST':
+            request.upload_handlers.insert(0, DetectionUploadHandler(request, single_file=single_file))
+        return protected_view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def attach_upload_digests(request, field_name):
+    """Expose le SHA-256 de chaque fichier reçu via l'attribut `sha256` des UploadedFile"""
+    for index, uploaded_file in enumerate(request.FILES.getlist(field_name)):
+        uploaded_file.sha256 = upload_digest(request, field_name, index)
@@ -0,0 +1,141 @@
+"""
+Upload reprenable par morceaux.
+
+Le client initie une session, envoie les morceaux avec leur offset (PUT), puis
+finalise. Chaque morceau est écrit directement dans le fichier de la session
+sous MEDIA_ROOT (pas de fichier temporaire par requête) et un CRC32 courant est
+tenu à jour en base avec l'offset : après une coupure, le client interroge
+l'offset et reprend à partir de là. Les écritures d'une session sont
+sérialisées par un verrou sur sa ligne, et la finalisation relit le CRC32 du
+fichier sur le disque. Le fichier est ensuite déplacé (renommage, sans copie)
+dans le stockage adressé par contenu.
+"""
+import logging
+import os
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+from .upload_handlers import media_kind_for_filename, sniff_media_kind
+
+logger = logging.getLogger(__name__)
+
+# Fichiers en cours de réception ; ils rejoignent le stockage adressé par contenu à la finalisation
+PARTIAL_UPLOAD_DIRECTORY = 'uploads/partial'
+
+# Lecture du corps de la requête par blocs : un morceau n'est jamais chargé entièrement en mémoire
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """Morceau refusé ; `status` est le code HTTP à renvoyer"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def create_partial_upload(session):
+    """Crée le fichier partiel de la session (nommé d'après son UUID) et enregistre la session"""
+    ext = os.path.splitext(session.filename)[1].lower()
+    session.relative_path = f"{PARTIAL_UPLOAD_DIRECTORY}/{session.pk}{ext}"
+    full_path = os.path.join(settings.MEDIA_ROOT, session.relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    open(full_path, 'xb').close()
+    session.save()
+    return session
+
+
+def parse_crc32(value):
+    """CRC32 transmis en hexadécimal (ex. 'a3f0c2d1') ; None si absent"""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value, 16) & 0xFFFFFFFF
+    except (TypeError, ValueError):
+        raise ChunkError("Somme de contrôle CRC32 invalide (hexadécimal attendu).")
+
+
+def append_chunk(session, stream, offset, length, chunk_crc32=None):
+    """
+    Écrit un morceau à `offset` dans le fichier de la session et avance l'offset.
+
+    Sans CRC32 de morceau, un envoi interrompu conserve les octets reçus : le
+    client reprend à l'offset enregistré. Avec un CRC32, le morceau doit être
+    complet et correct, sinon il est entièrement rejeté.
+    """
+    if length <= 0:
+        raise ChunkError("Morceau vide.")
+
+    with transaction.atomic():
+        # Session verrouillée avant de toucher au fichier : deux PUT concurrents au même offset
+        # n'écrivent jamais en même temps (SQLite, sans verrou de ligne, compte sur la vérification
+        # du fichier à la finalisation)
+        locked = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if locked is None or locked.status != 'UPLOADING':
+            raise ChunkError("Cette session d'upload n'accepte plus de morceaux.", status=409)
+        if offset != locked.offset:
+            raise ChunkError("Offset inattendu.", status=409)
+        if offset + length > locked.total_size:
+            raise ChunkError("Le morceau dépasse la taille annoncée du fichier.", status=413)
+
+        full_path = os.path.join(settings.MEDIA_ROOT, locked.relative_path)
+        running_crc = locked.crc32
+        chunk_crc = 0
+        received = 0
+        with open(full_path, 'r+b') as destination:
+            destination.seek(offset)
+            while received < length:
+                block = stream.read(min(READ_BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                # Octets magiques vérifiés avant toute écriture, comme pour les uploads en une requête
+                if offset == 0 and received == 0 and sniff_media_kind(block[:16]) != media_kind_for_filename(locked.filename):
+                    raise ChunkError("Le contenu du fichier ne correspond pas à son extension.", status=415)
+                destination.write(block)
+                running_crc = zlib.crc32(block, running_crc)
+                chunk_crc = zlib.crc32(block, chunk_crc)
+                received += len(block)
+
+            if chunk_crc32 is not None and (received != length or chunk_crc != chunk_crc32):
+                destination.truncate(offset)
+                raise ChunkError("Le morceau reçu ne correspond pas à sa somme de contrôle.", status=422)
+
+            # Un envoi précédent interrompu peut avoir laissé des octets au-delà de l'offset enregistré
+            destination.truncate(offset + received)
+            destination.flush()
+            os.fsync(destination.fileno())
+
+        # Conditionnel malgré le verrou : seule garde sous SQLite
+        updated = UploadSession.objects.filter(pk=session.pk, offset=offset, status='UPLOADING').update(
+            offset=offset + received,
+            crc32=running_crc,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            raise ChunkError("La session a été modifiée par une autre requête.", status=409)
+
+    session.offset = offset + received
+    session.crc32 = running_crc
+    return received
+
+
+def file_crc32(full_path):
+    """CRC32 du fichier tel qu'il est sur le disque, lu par blocs"""
+    crc = 0
+    with open(full_path, 'rb') as source:
+        for block in iter(lambda: source.read(READ_BLOCK_SIZE), b''):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+def abort_session(session):
+    """Abandonne une session et supprime le fichier partiel"""
+    UploadSession.objects.filter(pk=session.pk, status='UPLOADING').update(status='ABORTED')
+    full_path = os.path.join(settings.MEDIA_ROOT, session.relative_path)
+    if os.path.exists(full_path):
+        os.remove(full_path)
+    logger.info(f"Upload session {session.pk} aborted: {session.relative_path}")
@@ -8,11 +8,16 @@ urlpatterns = [
     path('upload-multi/', views.upload_multi_detection, name='upload_multi'),
     path('upload-unified/', views.unified_media_detection, name='upload_unified'),  # NOUVELLE ROUTE VIDÉO/IMAGE
     path('result/<int:detection_id>/', views.detection_result, name='result'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('uploads/', views.chunked_upload_initiate, name='chunked_upload_initiate'),
+    path('uploads/<uuid:upload_id>/', views.chunked_upload, name='chunked_upload'),
+    path('uploads/<uuid:upload_id>/complete/', views.chunked_upload_complete, name='chunked_upload_complete'),
     path('analysis-results/<int:report_id>/', views.analysis_results, name='analysis_results'),
     path('history/', views.detection_history, name='history'),
     path('reports/', views.reports_history, name='reports_history'),
     path('validate/<int:detection_id>/', views.validate_detection, name='validate'),
     path('validate-category/<int:detection_id>/', views.validate_category, name='validate_category'),  # NOUVELLE ROUTE - Validation par catégorie
+    path('validate-categories/<int:detection_id>/', views.validate_categories, name='validate_categories'),
     path('flagged/', views.flagged_detections, name='flagged'),
     path('categories/', views.manage_categories, name='categories'),
     path('categories/add/', views.add_category, name='add_category'),
@@ -2,42 +2,81 @@ from ultralytics import YOLO
 import os
 import logging
 from django.conf import settings
+from django.utils import timezone
+from apps.core.metrics import MODEL_LOAD_SECONDS
 from apps.core.models import AppSettings
 from apps.detection.models import DangerousCategory
+from apps.detection.timing import StageTimer
 from PIL import Image
 import numpy as np
 import cv2
+import json
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import re
+import uuid
 
 logger = logging.getLogger(__name__)
 
 class DetectionModel:
     _instance = None
+    # Workers multi-threads : un modèle par thread, YOLO n'étant pas thread-safe
+    per_thread = False
+    _local = threading.local()
 
     @classmethod
     def get_instance(cls):
-        """Load the YOLO model once and cache it."""
+        """Load the YOLO model once (per thread when per_thread is set) and cache it."""
+        if cls.per_thread:
+            if getattr(cls._local, 'instance', None) is None:
+                cls._local.instance = cls._load()
+            return cls._local.instance
         if cls._instance is None:
-            try:
-                app_settings = AppSettings.load()
-                model_path = os.path.join(settings.BASE_DIR, app_settings.active_detection_model)
-                if not os.path.exists(model_path):
-                    logger.error(f"Model file not found: {model_path}")
-                    return None
-                cls._instance = YOLO(model_path)
-                logger.info(f"YOLO model loaded: {model_path}")
-            except Exception as e:
-                logger.error(f"Failed to load YOLO model: {str(e)}")
-                return None
+            cls._instance = cls._load()
         return cls._instance
 
+    @staticmethod
+    def _load():
+        try:
+            app_settings = AppSettings.load()
+            model_path = os.path.join(settings.BASE_DIR, app_settings.active_detection_model)
+            if not os.path.exists(model_path):
+                logger.error(f"Model file not found: {model_path}")
+                return None
+            load_started = time.perf_counter()
+            model = YOLO(model_path)
+            MODEL_LOAD_SECONDS.observe(time.perf_counter() - load_started)
+            logger.info(f"YOLO model loaded: {model_path}")
+            return model
+        except Exception as e:
+            logger.error(f"Failed to load YOLO model: {str(e)}")
+            return None
+
+def above_threshold(result, threshold):
+    """Résultat YOLO restreint aux boîtes atteignant le seuil (annotation), les autres n'étant que conservées"""
+    if threshold <= settings.DETECTION_RAW_CONFIDENCE_FLOOR:
+        return result
+    return result[result.boxes.conf >= threshold]
+
+
 # In utils.py, modify run_detection
-def run_detection(image_path, output_path):
+def run_detection(image_path, output_path, timer=None, threshold=None):
+    """
+    detected_objects contient toutes les boîtes au-dessus du plancher de
+    confiance ; l'image annotée et le niveau de danger ne retiennent que celles
+    qui atteignent `threshold` (seuil des paramètres par défaut).
+    """
     logger.info(f"Starting detection for image: {image_path}")
+    timer = timer or StageTimer()
     try:
-        app_settings = AppSettings.load()
-        model_path = app_settings.active_detection_model
-        threshold = app_settings.dangerous_threshold
-        dangerous_categories = DangerousCategory.objects.filter(is_active=True).values('name', 'category_type')
+        with timer.stage('setup'):
+            app_settings = AppSettings.load()
+            model_path = app_settings.active_detection_model
+            threshold = app_settings.dangerous_threshold if threshold is None else threshold
+            dangerous_categories = list(DangerousCategory.objects.filter(is_active=True).values('name', 'category_type'))
 
         if model_path == "simulation":
             logger.warning("Running in simulation mode")
@@ -48,7 +87,8 @@ def run_detection(image_path, output_path):
             )
 
         # Load YOLO model
-        model = DetectionModel.get_instance()
+        with timer.stage('setup'):
+            model = DetectionModel.get_instance()
         if model is None:
             logger.error("Model loading failed, falling back to simulation")
             return (
@@ -59,7 +99,8 @@ def run_detection(image_path, output_path):
 
         # Verify image is readable
         try:
-            img = cv2.imread(image_path)
+            with timer.stage('decode'):
+                img = cv2.imread(image_path)
             if img is None:
                 logger.error(f"Failed to read image: {image_path}")
                 raise ValueError("Image file is corrupted or unreadable")
@@ -68,12 +109,15 @@ def run_detection(image_path, output_path):
             raise
 
         # Run detection
-        results = model.predict(image_path, conf=threshold, verbose=False)
+        with timer.stage('inference'):
+            results = model.predict(image_path, conf=min(threshold, settings.DETECTION_RAW_CONFIDENCE_FLOOR), verbose=False)
 
         # Save annotated image
-        annotated_frame = results[0].plot()
+        with timer.stage('annotate'):
+            annotated_frame = above_threshold(results[0], threshold).plot()
         logger.info(f"Before saving: shape={annotated_frame.shape}, dtype={annotated_frame.dtype}")
-        cv2.imwrite(output_path, annotated_frame)
+        with timer.stage('encode'):
+            cv2.imwrite(output_path, annotated_frame)
         if not os.path.exists(output_path):
             logger.error(f"Failed to save annotated image: {output_path}")
             raise ValueError("Failed to save annotated image")
@@ -83,23 +127,24 @@ def run_detection(image_path, output_path):
         detected_objects = []
         danger_level = None
 
-        for result in results:
-            for box in result.boxes:
-                category = result.names[int(box.cls)]
-                confidence = float(box.conf)
-                bbox = box.xywh[0].tolist()
-                detected_objects.append({
-                    "category": category,
-                    "confidence": confidence,
-                    "bbox": bbox
-                })
-                # Check danger level
-                for cat in dangerous_categories:
-                    if category.lower() == cat['name'].lower():
-                        if cat['category_type'] == 'HYPERDANGEROUS':
-                            danger_level = 'HYPERDANGEROUS'
-                        elif cat['category_type'] == 'DANGEROUS' and danger_level != 'HYPERDANGEROUS':
-                            danger_level = 'DANGEROUS'
+        with timer.stage('annotate'):
+            for result in results:
+                for box in result.boxes:
+                    category = result.names[int(box.cls)]
+                    confidence = float(box.conf)
+                    bbox = box.xywh[0].tolist()
+                    detected_objects.append({
+                        "category": category,
+                        "confidence": confidence,
+                        "bbox": bbox
+                    })
+                    # Check danger level
+                    for cat in dangerous_categories:
+                        if confidence >= threshold and category.lower() == cat['name'].lower():
+                            if cat['category_type'] == 'HYPERDANGEROUS':
+                                danger_level = 'HYPERDANGEROUS'
+                            elif cat['category_type'] == 'DANGEROUS' and danger_level != 'HYPERDANGEROUS':
+                                danger_level = 'DANGEROUS'
 
         logger.info(f"Detection completed: {len(detected_objects)} objects found, danger_level: {danger_level}")
         return detected_objects, danger_level, model_path
@@ -154,7 +199,215 @@ def is_image_file(filename: str) -> bool:
     return ext in IMAGE_EXTENSIONS
 
 
-def run_video_detection(video_path, output_path, frame_interval=30, progress_callback=None):
+# Vignettes des frames analysées contenant des détections (timeline cliquable)
+KEYFRAME_THUMB_WIDTH = 160
+KEYFRAME_SPRITE_COLUMNS = 10
+KEYFRAME_MAX_THUMBNAILS = 200
+
+
+def make_keyframe_thumbnail(frame, width=KEYFRAME_THUMB_WIDTH):
+    """Réduit une frame (déjà en mémoire) à la taille d'une vignette"""
+    height, frame_width = frame.shape[:2]
+    thumb_height = max(1, int(round(height * width / frame_width)))
+    return cv2.resize(frame, (width, thumb_height), interpolation=cv2.INTER_AREA)
+
+
+def keyframe_sprite_path(output_path: str) -> str:
+    """Chemin de la planche de vignettes associée à une vidéo annotée"""
+    return f"{os.path.splitext(output_path)[0]}_keyframes.jpg"
+
+
+def write_keyframe_sprite(thumbnails, sprite_path, columns=KEYFRAME_SPRITE_COLUMNS):
+    """
+    Assemble les vignettes en une seule planche JPEG et écrit son index JSON.
+
+    Args:
+        thumbnails: Liste de tuples (frame_idx, timestamp, image)
+        sprite_path: Chemin de la planche JPEG (l'index est écrit à côté en .json)
+        columns: Nombre de vignettes par ligne
+
+    Returns:
+        dict: Index {frame -> position dans la planche}, ou None si aucune vignette
+    """
+    if not thumbnails:
+        return None
+
+    tile_width = max(image.shape[1] for _, _, image in thumbnails)
+    tile_height = max(image.shape[0] for _, _, image in thumbnails)
+    columns = min(columns, len(thumbnails))
+    rows = (len(thumbnails) + columns - 1) // columns
+
+    sprite = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+    frames = []
+    for position, (frame_idx, timestamp, image) in enumerate(thumbnails):
+        x = (position % columns) * tile_width
+        y = (position // columns) * tile_height
+        sprite[y:y + image.shape[0], x:x + image.shape[1]] = image
+        frames.append({"frame": frame_idx, "timestamp": timestamp, "x": x, "y": y})
+
+    if not cv2.imwrite(sprite_path, sprite, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+        raise ValueError(f"Failed to write keyframe sprite: {sprite_path}")
+
+    index = {
+        "sprite": os.path.basename(sprite_path),
+        "tile_width": tile_width,
+        "tile_height": tile_height,
+        "columns": columns,
+        "frames": frames,
+    }
+    with open(f"{os.path.splitext(sprite_path)[0]}.json", 'w') as index_file:
+        json.dump(index, index_file)
+
+    logger.info(f"Keyframe sprite created: {sprite_path} ({len(frames)} thumbnails)")
+    return index
+
+
+# Modes de sortie des vidéos annotées
+VIDEO_OUTPUT_MODES = (
+    ('standard', 'Vidéo MP4 complète'),
+    ('hls', 'Segments HLS (lecture progressive)'),
+    ('timelapse', 'Timelapse (frames analysées uniquement)'),
+)
+
+
+def ffmpeg_available() -> bool:
+    """Vérifie si le binaire ffmpeg configuré est disponible"""
+    return shutil.which(settings.FFMPEG_BINARY) is not None
+
+
+def resolve_video_output_mode(output_mode) -> str:
+    """Retourne le mode de sortie effectif (HLS nécessite ffmpeg)"""
+    if output_mode == 'hls' and not ffmpeg_available():
+        logger.warning(f"ffmpeg not found ({settings.FFMPEG_BINARY}), falling back to standard MP4 output")
+        return 'standard'
+    return output_mode if output_mode in dict(VIDEO_OUTPUT_MODES) else 'standard'
+
+
+def annotated_video_path(relative_path: str, output_mode: str) -> str:
+    """Chemin de sortie de la vidéo annotée selon le mode (playlist HLS ou MP4)"""
+    if output_mode == 'hls':
+        return f"{os.path.splitext(relative_path)[0]}_hls/index.m3u8"
+    if output_mode == 'timelapse':
+        return f"{os.path.splitext(relative_path)[0]}_timelapse.mp4"
+    return relative_path
+
+
+def annotated_result_path(filename, media_type, output_mode='standard', now=None):
+    """Chemin du résultat annoté d'une tâche ; le suffixe aléatoire évite toute collision sans sonder le disque"""
+    now = now or timezone.now()
+    stem, ext = os.path.splitext(re.sub(r'[^\w\-\. ]', '_', os.path.basename(filename)))
+    relative_path = f"detection_results/{now.year}/{now.month:02d}/{now.day:02d}/{stem}_{uuid.uuid4().hex[:8]}{ext}"
+    if media_type == 'VIDEO':
+        relative_path = annotated_video_path(relative_path, output_mode)
+    return relative_path
+
+
+def hls_output_args(fps, playlist_path, segment_seconds=None):
+    """Arguments ffmpeg d'encodage H.264 et de segmentation HLS"""
+    segment_seconds = segment_seconds or settings.HLS_SEGMENT_SECONDS
+    gop = max(1, int(round(fps * segment_seconds)))
+    segment_pattern = os.path.join(os.path.dirname(playlist_path), 'segment_%05d.ts')
+    return [
+        '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-f', 'hls',
+        '-hls_time', str(segment_seconds),
+        '-hls_playlist_type', 'event',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', segment_pattern,
+        playlist_path,
+    ]
+
+
+def hls_playlist_complete(playlist_path):
+    """Vrai si la playlist EVENT a été close par ffmpeg (#EXT-X-ENDLIST) : tous les segments sont écrits"""
+    try:
+        with open(playlist_path, encoding='utf-8', errors='replace') as playlist:
+            return any(line.strip() == '#EXT-X-ENDLIST' for line in playlist)
+    except FileNotFoundError:
+        return False
+
+
+class HLSVideoWriter:
+    """
+    Writer compatible avec cv2.VideoWriter produisant des segments HLS via ffmpeg.
+
+    La playlist est de type EVENT : chaque segment y est ajouté dès qu'il est
+    fermé, la lecture (ou le suivi d'une analyse en cours) peut donc commencer
+    après le premier segment.
+    """
+
+    def __init__(self, playlist_path, fps, frame_size, segment_seconds=None):
+        width, height = frame_size
+        os.makedirs(os.path.dirname(playlist_path), exist_ok=True)
+        command = [
+            settings.FFMPEG_BINARY, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{width}x{height}", '-r', str(fps),
+            '-i', '-',
+            *hls_output_args(fps, playlist_path, segment_seconds),
+        ]
+        self.playlist_path = playlist_path
+        # stderr dans un fichier : un pipe non lu pendant l'encodage pourrait bloquer ffmpeg
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def isOpened(self):
+        return self._process.poll() is None
+
+    def write(self, frame):
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        except BrokenPipeError:
+            # ffmpeg s'est arrêté en cours d'encodage : son message explique pourquoi
+            return_code, error = self._finish()
+            raise RuntimeError(f"ffmpeg HLS encoding failed ({return_code}): {error}") from None
+
+    def release(self):
+        if self._process.stdin.closed:
+            return
+        return_code, error = self._finish()
+        if return_code != 0:
+            # Dernier segment ou playlist non écrits (disque plein...) : la vidéo serait tronquée
+            raise RuntimeError(f"ffmpeg HLS encoding failed ({return_code}): {error}")
+        if not hls_playlist_complete(self.playlist_path):
+            raise RuntimeError(f"ffmpeg HLS playlist not finalized (no #EXT-X-ENDLIST): {self.playlist_path}")
+
+    def _finish(self):
+        """Ferme l'entrée de ffmpeg et attend sa fin ; renvoie (code de retour, sortie d'erreur)"""
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            # Données encore en tampon que ffmpeg, déjà arrêté, ne lira pas
+            pass
+        return_code = self._process.wait()
+        self._stderr.seek(0)
+        error = self._stderr.read().decode(errors='replace').strip()
+        self._stderr.close()
+        return return_code, error
+
+
+def draw_timestamp_overlay(frame, seconds):
+    """Incruste la position dans la vidéo source (HH:MM:SS.s) sur une frame de timelapse"""
+    label = f"{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{seconds % 60:04.1f}"
+    (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
+    cv2.rectangle(frame, (10, 10), (30 + text_width, 30 + text_height + baseline), (0, 0, 0), -1)
+    cv2.putText(frame, label, (20, 20 + text_height), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+    return frame
+
+
+def segment_video_to_hls(video_path, playlist_path):
+    """Transcode une vidéo existante en segments HLS (mode simulation)"""
+    os.makedirs(os.path.dirname(playlist_path), exist_ok=True)
+    fps = get_video_info(video_path)['fps'] or 25
+    command = [
+        settings.FFMPEG_BINARY, '-y', '-loglevel', 'error', '-i', video_path, '-an',
+        *hls_output_args(fps, playlist_path),
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+
+
+def run_video_detection(video_path, output_path, frame_interval=30, progress_callback=None, output_mode='standard', timer=None, threshold=None):
     """
     Détection sur vidéo frame par frame avec génération d'une vidéo annotée
     
@@ -163,29 +416,43 @@ def run_video_detection(video_path, output_path, frame_interval=30, progress_cal
         output_path: Chemin pour la vidéo annotée de sortie
         frame_interval: Analyser 1 frame toutes les X frames (ex: 30 = 1 fps pour vidéo à 30fps)
         progress_callback: Fonction optionnelle pour feedback de progression
+        output_mode: 'standard' (MP4), 'hls' (output_path est alors la playlist .m3u8)
+            ou 'timelapse' (seules les frames analysées sont écrites, à fps / frame_interval)
+        timer: StageTimer optionnel recevant les durées par étape
+        threshold: seuil de confiance (paramètres par défaut) ; detected_objects contient
+            toutes les boîtes au-dessus du plancher, la vidéo annotée et le niveau de danger
+            seulement celles qui l'atteignent
     
     Returns:
         (detected_objects, danger_level, model_used, video_metadata, frames_analyzed)
     """
     logger.info(f"Starting video detection: {video_path}")
+    timer = timer or StageTimer()
     
     try:
         # Charger les paramètres de l'application
+        # Préparation : paramètres, métadonnées, modèle et ouverture des flux (jusqu'à la première frame)
+        setup_started = time.perf_counter()
         app_settings = AppSettings.load()
         model_path = app_settings.active_detection_model
-        threshold = app_settings.dangerous_threshold
-        dangerous_categories = DangerousCategory.objects.filter(is_active=True).values('name', 'category_type')
+        threshold = app_settings.dangerous_threshold if threshold is None else threshold
+        dangerous_categories = list(DangerousCategory.objects.filter(is_active=True).values('name', 'category_type'))
         
         # Obtenir les infos de la vidéo
         video_info = get_video_info(video_path)
+        video_info['output_mode'] = output_mode
         logger.info(f"Video info: {video_info['duration_formatted']}, {video_info['fps']} FPS, "
                    f"{video_info['width']}x{video_info['height']}")
         
         # Mode simulation
         if model_path == "simulation":
             logger.warning("Running video detection in simulation mode")
-            import shutil
-            shutil.copy(video_path, output_path)
+            timer.add('setup', time.perf_counter() - setup_started)
+            with timer.stage('encode'):
+                if output_mode == 'hls':
+                    segment_video_to_hls(video_path, output_path)
+                else:
+                    shutil.copy(video_path, output_path)
             
             return (
                 [{"category": "knife", "confidence": 0.85, "frame": 30, "bbox": [100, 100, 50, 50]}],
@@ -210,6 +477,12 @@ def run_video_detection(video_path, output_path, frame_interval=30, progress_cal
         width = video_info['width']
         height = video_info['height']
         
+        # Timelapse : seules les frames analysées sont encodées, à cadence réduite,
+        # le coût d'encodage suit donc frames_analyzed et non la durée de la vidéo
+        timelapse = output_mode == 'timelapse'
+        output_fps = max(1.0, fps / frame_interval) if timelapse else fps
+        video_info['output_fps'] = output_fps
+        
         # Essayer différents codecs H.264 (compatibles navigateurs)
         codecs_to_try = [
             ('avc1', 'H.264 (avc1)'),
@@ -221,9 +494,14 @@ def run_video_detection(video_path, output_path, frame_interval=30, progress_cal
         
         out = None
         codec_used = None
+        if output_mode == 'hls':
+            codecs_to_try = []
+            out = HLSVideoWriter(output_path, output_fps, (width, height))
+            codec_used = 'H.264 (HLS)'
+            logger.info(f"Writing HLS segments to: {os.path.dirname(output_path)}")
         for codec_code, codec_name in codecs_to_try:
             fourcc = cv2.VideoWriter_fourcc(*codec_code)
-            test_out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            test_out = cv2.VideoWriter(output_path, fourcc, output_fps, (width, height))
             if test_out.isOpened():
                 out = test_out
                 codec_used = codec_name
@@ -238,23 +516,35 @@ def run_video_detection(video_path, output_path, frame_interval=30, progress_cal
         
         # Variables de traitement
         all_detected_objects = []
+        keyframe_thumbnails = []
+        thumbnail_stride = 1
         danger_level = None
         frame_idx = 0
         frames_analyzed = 0
         total_frames = video_info['frame_count']
         
         logger.info(f"Processing {total_frames} frames, analyzing every {frame_interval} frames")
+        timer.add('setup', time.perf_counter() - setup_started)
         
         while True:
-            ret, frame = cap.read()
+            # Analyser seulement les frames à l'intervalle spécifié
+            analyze = frame_idx % frame_interval == 0
+            with timer.stage('decode'):
+                if timelapse and not analyze:
+                    # Frame ignorée en timelapse : avancer sans la convertir
+                    ret, frame = cap.grab(), None
+                else:
+                    ret, frame = cap.read()
             if not ret:
                 break
             
-            # Analyser seulement les frames à l'intervalle spécifié
-            if frame_idx % frame_interval == 0:
+            if analyze:
                 # Détection YOLO sur cette frame
-                results = model.predict(frame, conf=threshold, verbose=False)
-                annotated_frame = results[0].plot()
+                with timer.stage('inference'):
+                    results = model.predict(frame, conf=min(threshold, settings.DETECTION_RAW_CONFIDENCE_FLOOR), verbose=False)
+                annotate_started = time.perf_counter()
+                graded = above_threshold(results[0], threshold)
+                annotated_frame = graded.plot()
                 
                 # Extraire les détections
                 for result in results:
@@ -274,18 +564,34 @@ def run_video_detection(video_path, output_path, frame_interval=30, progress_cal
                         
                         # Vérifier le niveau de danger
                         for cat in dangerous_categories:
-                            if category.lower() == cat['name'].lower():
+                            if confidence >= threshold and category.lower() == cat['name'].lower():
                                 if cat['category_type'] == 'HYPERDANGEROUS':
                                     danger_level = 'HYPERDANGEROUS'
                                 elif cat['category_type'] == 'DANGEROUS' and danger_level != 'HYPERDANGEROUS':
                                     danger_level = 'DANGEROUS'
                 
+                # Vignette de la frame annotée si elle contient des détections.
+                # Au-delà du plafond, on ne garde qu'une vignette sur deux pour
+                # couvrir toute la vidéo avec une mémoire bornée.
+                if len(graded.boxes) > 0 and frames_analyzed % thumbnail_stride == 0:
+                    keyframe_thumbnails.append(
+                        (frame_idx, round(frame_idx / fps, 2), make_keyframe_thumbnail(annotated_frame))
+                    )
+                    if len(keyframe_thumbnails) >= KEYFRAME_MAX_THUMBNAILS:
+                        keyframe_thumbnails = keyframe_thumbnails[::2]
+                        thumbnail_stride *= 2
+                
                 # Écrire la frame annotée
-                out.write(annotated_frame)
+                if timelapse:
+                    draw_timestamp_overlay(annotated_frame, frame_idx / fps)
+                timer.add('annotate', time.perf_counter() - annotate_started)
+                with timer.stage('encode'):
+                    out.write(annotated_frame)
                 frames_analyzed += 1
-            else:
+            elif not timelapse:
                 # Écrire la frame originale (non analysée)
-                out.write(frame)
+                with timer.stage('encode'):
+                    out.write(frame)
             
             frame_idx += 1
             
@@ -294,9 +600,10 @@ def run_video_detection(video_path, output_path, frame_interval=30, progress_cal
                 progress = (frame_idx / total_frames) * 100
                 progress_callback(progress)
         
-        # Libérer les ressources
+        # Libérer les ressources (ffmpeg termine l'encodage HLS à la fermeture)
         cap.release()
-        out.release()
+        with timer.stage('encode'):
+            out.release()
         
         # Vérifier que le fichier de sortie existe
         import os
@@ -307,6 +614,15 @@ def run_video_detection(video_path, output_path, frame_interval=30, progress_cal
             logger.error(f"Output video NOT created: {output_path}")
             raise FileNotFoundError(f"Video output file not created: {output_path}")
         
+        # Planche de vignettes pour la timeline de la page de résultat
+        try:
+            with timer.stage('keyframes'):
+                keyframes = write_keyframe_sprite(keyframe_thumbnails, keyframe_sprite_path(output_path))
+            if keyframes:
+                video_info['keyframes'] = keyframes
+        except Exception as e:
+            logger.warning(f"Keyframe sprite generation failed: {str(e)}")
+        
         logger.info(f"Video detection completed: {len(all_detected_objects)} objects in {frames_analyzed} frames")
         logger.info(f"Danger level: {danger_level}")
         
@@ -0,0 +1,107 @@
+"""
+Validation par catégorie en lot (vidéos).
+
+Une requête transmet toutes les entrées (catégorie, frame, valide ?) d'une
+détection : elles sont enregistrées en un upsert, puis le niveau de danger est
+recalculé une seule fois.
+"""
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import grading
+from .models import CategoryValidation
+
+MAX_CATEGORY_VALIDATIONS = 1000
+UPDATED_FIELDS = ['is_valid', 'validator', 'confidence', 'validation_timestamp']
+
+
+def parse_entries(raw_entries):
+    """Entrées JSON [{category, frame, is_valid, confidence}] ; ValueError si invalides"""
+    if not isinstance(raw_entries, list) or not raw_entries:
+        raise ValueError("Liste 'validations' manquante ou vide")
+    if len(raw_entries) > MAX_CATEGORY_VALIDATIONS:
+        raise ValueError(f"Au plus {MAX_CATEGORY_VALIDATIONS} validations par requête")
+    entries = {}
+    for raw in raw_entries:
+        if not isinstance(raw, dict):
+            raise ValueError("Chaque validation doit être un objet")
+        category = raw.get('category') or raw.get('category_name')
+        if not isinstance(category, str) or not category.strip():
+            raise ValueError("Nom de catégorie manquant")
+        if not isinstance(raw.get('is_valid'), bool):
+            raise ValueError(f"'is_valid' doit être un booléen ({category})")
+        frame = raw.get('frame', raw.get('frame_number'))
+        if frame is not None and (isinstance(frame, bool) or not isinstance(frame, int)):
+            raise ValueError(f"'frame' doit être un entier ou null ({category})")
+        try:
+            confidence = float(raw.get('confidence') or 0.0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        # Une seule entrée par (catégorie, frame) : la dernière l'emporte
+        entries[(category.strip()[:100], frame)] = {'is_valid': raw['is_valid'], 'confidence': confidence}
+    return entries
+
+
+def save_category_validations(detection, entries, validator):
+    """Enregistre les entrées de parse_entries et met à jour le niveau de danger ; renvoie ce niveau"""
+    now = timezone.now()
+    rows = [
+        CategoryValidation(
+            detection_log=detection, category_name=category, frame_number=frame, validator=validator,
+            validation_timestamp=now, **values,
+        )
+        for (category, frame), values in entries.items()
+    ]
+    with transaction.atomic():
+        CategoryValidation.objects.bulk_create(
+            [row for row in rows if row.frame_number is not None],
+            update_conflicts=True,
+            unique_fields=['detection_log', 'category_name', 'frame_number'],
+            update_fields=UPDATED_FIELDS,
+        )
+        # Sans frame, la contrainte d'unicité ne détecte pas de conflit (NULL distincts) :
+        # mise à jour des validations existantes, création des autres
+        unframed = {row.category_name: row for row in rows if row.frame_number is None}
+        if unframed:
+            existing = CategoryValidation.objects.filter(
+                detection_log=detection, frame_number__isnull=True, category_name__in=unframed,
+            )
+            updated = []
+            for validation in existing:
+                row = unframed.pop(validation.category_name)
+                for field in UPDATED_FIELDS:
+                    setattr(validation, field, getattr(row, field))
+                updated.append(validation)
+            CategoryValidation.objects.bulk_update(updated, UPDATED_FIELDS)
+            CategoryValidation.objects.bulk_create(unframed.values())
+
+        level = recalculate_danger_level(detection)
+        if level != detection.danger_level:
+            detection.danger_level = level
+            # save() : agrégats, compteurs de filtres et résumé du rapport suivent (signals.py)
+            detection.save(update_fields=['danger_level'])
+    return level
+
+
+def recalculate_danger_level(detection, levels=None):
+    """
+    Niveau de danger d'après les catégories détectées, hors catégories
+    explicitement rejetées (is_valid=False). Les catégories validées ou pas
+    encore vérifiées comptent ; None si aucune n'est dangereuse.
+    """
+    detected_objects = detection.detected_objects
+    if isinstance(detected_objects, str):
+        try:
+            detected_objects = json.loads(detected_objects)
+        except json.JSONDecodeError:
+            return None
+    if not detected_objects:
+        return None
+    rejected = {
+        name.strip().lower()
+        for name in CategoryValidation.objects.filter(detection_log=detection, is_valid=False)
+        .values_list('category_name', flat=True)
+    }
+    return grading.danger_level(detected_objects, grading.category_levels() if levels is None else levels, rejected)
@@ -5,15 +5,22 @@ from django.contrib.auth.decorators import user_passes_test
 from django.http import HttpResponseForbidden, JsonResponse
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.urls import reverse
 import os
 import json
-import re
-import zipfile
-import tempfile
-from .models import DangerousCategory, DetectionLog, ModelValidation, Report, CategoryValidation
+from .models import DangerousCategory, DetectionLog, DetectionObject, ModelValidation, Report, CategoryValidation, DetectionJob, UploadSession
 from .forms import UploadDetectionForm , SingleImageDetectionForm , ValidationForm, CategoryForm
-from .utils import run_detection
+from .upload_handlers import attach_upload_digests, detection_upload_view
+from .ingest import IngestError, ingest_zip
+from .storage import attempt_output_path, media_store
+from .timing import StageTimer
+from .dates import filter_days, parse_day
+from . import facets
+from .pagination import keyset_page
+from .validations import parse_entries, recalculate_danger_level, save_category_validations
+from .jobs import enqueue_detection, live_workers, PRIORITY_BATCH, PRIORITY_INTERACTIVE
 from apps.chatbot.services import get_chatbot_instructions
+from apps.core.metrics import observe_chatbot_call
 from apps.users.models import User
 from django.conf import settings
 import logging
@@ -28,8 +35,7 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from django.db.models import Count, Q
-import time
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
 
 def is_supervisor_or_admin(user):
     return user.is_supervisor or user.is_administrator
@@ -37,116 +43,60 @@ def is_supervisor_or_admin(user):
 def is_admin(user):
     return user.is_administrator
 
+def has_category(category):
+    """Filtre des DetectionLog contenant au moins un objet de cette catégorie (index category, detection_log)"""
+    return Exists(DetectionObject.objects.filter(detection_log=OuterRef('pk'), category=category))
+
 logger = logging.getLogger(__name__)
 
 
 @login_required
+@detection_upload_view(single_file=True)
 def upload_detection(request):
-    from .utils import is_video_file, is_image_file, run_video_detection
+    from .utils import is_video_file, resolve_video_output_mode, annotated_result_path
     
     if request.method == 'POST':
         form = SingleImageDetectionForm(request.POST, request.FILES)
         logger.info("Received POST request for file upload")
+        # Fichier refusé pendant la réception (taille, type)
+        if request.upload_errors:
+            for error in request.upload_errors:
+                messages.error(request, error)
+            return redirect('detection:upload')
+        attach_upload_digests(request, 'image')
         if form.is_valid():
             uploaded_file = form.cleaned_data.get('image')
             location = form.cleaned_data.get('location', '')
             frame_interval = form.cleaned_data.get('video_frame_interval', 30)
-            logger.info(f"Received file: {uploaded_file.name}, size: {uploaded_file.size}, type: {uploaded_file.content_type}")
+            output_mode = resolve_video_output_mode(form.cleaned_data.get('video_output_mode'))
+            logger.info(f"Received file: {uploaded_file.name}, size: {uploaded_file.size}, type: {uploaded_file.content_type}, sha256: {uploaded_file.sha256}")
             
-            filename = re.sub(r'[^\w\-\. ]', '_', uploaded_file.name)
-            now = timezone.now()
-            relative_path = f"uploads/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-            full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-
+            timer = StageTimer()
             try:
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                logger.info(f"Attempting to save file to: {full_path}")
-                with open(full_path, 'wb+') as destination:
-                    for chunk in uploaded_file.chunks():
-                        destination.write(chunk)
-                if not os.path.exists(full_path):
-                    logger.error(f"File not saved at: {full_path}")
-                    messages.error(request, "Échec de l'enregistrement du fichier.")
-                    return redirect('detection:upload')
-                logger.info(f"File saved to: {full_path}")
+                with timer.stage('store'):
+                    blob = media_store.save_chunks(uploaded_file.chunks(), uploaded_file.name, uploaded_file.sha256)
+                logger.info(f"File stored as: {blob.path}")
             except Exception as e:
                 logger.error(f"Failed to save file: {str(e)}")
                 messages.error(request, f"Erreur lors de l'enregistrement du fichier : {str(e)}")
                 return redirect('detection:upload')
 
-            annotated_relative_path = f"detection_results/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-            annotated_full_path = os.path.join(settings.MEDIA_ROOT, annotated_relative_path)
-            os.makedirs(os.path.dirname(annotated_full_path), exist_ok=True)
-
-            try:
-                start_time = time.time()
-                
-                # Déterminer si c'est une vidéo ou une image
-                if is_video_file(filename):
-                    logger.info(f"[VIDEO] Processing: {filename}")
-                    detected_objects, danger_level, model_used, video_metadata, frames_analyzed = run_video_detection(
-                        full_path,
-                        annotated_full_path,
-                        frame_interval=frame_interval
-                    )
-                    processing_duration = time.time() - start_time
-                    media_type = 'VIDEO'
-                    
-                else:  # Image
-                    logger.info(f"[IMAGE] Processing: {filename}")
-                    detected_objects, danger_level, model_used = run_detection(full_path, annotated_full_path)
-                    processing_duration = time.time() - start_time
-                    media_type = 'IMAGE'
-                    video_metadata = None
-                    frames_analyzed = 0  # 0 pour les images au lieu de None
-                
-                logger.debug(f"Detected objects: {detected_objects}")
-                if detected_objects and detected_objects[0].get("category") == "error":
-                    logger.error("Detection returned error object")
-                    messages.error(request, "Erreur lors de la détection : modèle non chargé.")
-                    return redirect('detection:upload')
-
-                normalized_objects = []
-                for obj in detected_objects:
-                    category = obj.get('category') or obj.get('label') or obj.get('class_name')
-                    if category and isinstance(category, str) and category.strip():
-                        obj_data = {
-                            'category': category.strip().lower(),
-                            'confidence': float(obj.get('confidence', 0.0))
-                        }
-                        # Ajouter frame et timestamp pour les vidéos
-                        if media_type == 'VIDEO':
-                            if 'frame' in obj:
-                                obj_data['frame'] = obj['frame']
-                            if 'timestamp' in obj:
-                                obj_data['timestamp'] = obj['timestamp']
-                        normalized_objects.append(obj_data)
-                    else:
-                        logger.warning(f"Invalid object in detection: {obj}")
-                detected_objects = normalized_objects
-
-                detection_log = DetectionLog.objects.create(
-                    user=request.user,
-                    media_type=media_type,
-                    uploaded_file=annotated_relative_path,
-                    original_file=relative_path,
-                    user_location=location,
-                    detected_objects=detected_objects,
-                    danger_level=danger_level,
-                    model_used=model_used,
-                    is_simulated=True if model_used == "simulation" else False,
-                    video_metadata=video_metadata,
-                    frames_analyzed=frames_analyzed if frames_analyzed is not None else 0,
-                    processing_duration=processing_duration
-                )
-
+            media_type = 'VIDEO' if is_video_file(uploaded_file.name) else 'IMAGE'
+            job = enqueue_detection(
+                user=request.user,
+                original_file=blob.path,
+                annotated_file=annotated_result_path(uploaded_file.name, media_type, output_mode),
+                media_type=media_type,
+                location=location,
+                frame_interval=frame_interval,
+                output_mode=output_mode,
+                priority=PRIORITY_INTERACTIVE,
+                timer=timer
+            )
+            if job.status == 'SUCCEEDED':
                 messages.success(request, "Détection terminée avec succès.")
-                return redirect('detection:result', detection_id=detection_log.id)
-
-            except Exception as e:
-                logger.error(f"Detection failed: {str(e)}", exc_info=True)
-                messages.error(request, f"Erreur lors de la détection : {str(e)}")
-                return redirect('detection:upload')
+                return redirect('detection:result', detection_id=job.detection_log_id)
+            return redirect('detection:job_status', job_id=job.id)
         else:
             logger.error(f"Form invalid: {form.errors}")
             messages.error(request, f"Formulaire invalide : {form.errors}")
@@ -156,30 +106,24 @@ def upload_detection(request):
     return render(request, 'detection/upload.html', {'form': form})
 
 
-def generate_unique_filename(base_name, ext, directory, idx=0):
-    """Generate a unique filename by appending an index or timestamp if the file exists."""
-    filename = f"{base_name}_{idx}{ext}" if idx > 0 else f"{base_name}{ext}"
-    full_path = os.path.join(directory, filename)
-    if os.path.exists(full_path):
-        timestamp = int(time.time())
-        filename = f"{base_name}_{timestamp}{ext}"
-        full_path = os.path.join(directory, filename)
-        if os.path.exists(full_path):
-            return generate_unique_filename(base_name, ext, directory, idx + 1)
-    return filename
-
-
 @login_required
+@detection_upload_view
 def upload_multi_detection(request):
-    from .utils import is_video_file, is_image_file, run_video_detection
+    from .utils import is_video_file, resolve_video_output_mode, annotated_result_path
     
     if request.method == 'POST':
         form = UploadDetectionForm(request.POST, request.FILES)
+        if request.upload_errors:
+            for error in request.upload_errors:
+                messages.error(request, error)
+            return redirect('detection:upload_multi')
+        attach_upload_digests(request, 'files')
         if form.is_valid():
             files = form.cleaned_data['files']
             location = form.cleaned_data.get('location', '')
             report_name = form.cleaned_data.get('report_name', '')
             frame_interval = form.cleaned_data.get('video_frame_interval', 30)
+            output_mode = resolve_video_output_mode(form.cleaned_data.get('video_output_mode'))
             now = timezone.now()
 
             report = Report.objects.create(
@@ -189,149 +133,49 @@ def upload_multi_detection(request):
             )
             logger.info(f"Created Report ID: {report.id}, Name: {report.name}")
 
-            detection_logs = []
-            files_to_process = []
+            jobs = []
+
+            def enqueue(blob, media_type, filename, timer=None):
+                """Met un fichier stocké en file de détection"""
+                jobs.append(enqueue_detection(
+                    user=request.user,
+                    original_file=blob.path,
+                    annotated_file=annotated_result_path(filename, media_type, output_mode, now),
+                    media_type=media_type,
+                    location=location,
+                    report=report,
+                    frame_interval=frame_interval,
+                    output_mode=output_mode,
+                    priority=PRIORITY_BATCH,
+                    timer=timer
+                ))
 
             if len(files) == 1 and files[0].name.lower().endswith('.zip'):
-                # Process ZIP file
-                file = files[0]
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    zip_path = os.path.join(temp_dir, file.name)
-                    logger.info(f"Saving ZIP to temporary path: {zip_path}")
-                    with open(zip_path, 'wb+') as destination:
-                        for chunk in file.chunks():
-                            destination.write(chunk)
-                    logger.info(f"Extracting ZIP: {file.name}")
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                        file_list = zip_ref.namelist()
-                        logger.info(f"ZIP contains {len(file_list)} files: {file_list}")
-                        for zip_idx, zip_file_name in enumerate(file_list):
-                            if zip_file_name.endswith('/') or not os.path.splitext(zip_file_name)[1]:
-                                logger.info(f"Skipping directory in ZIP: {zip_file_name}")
-                                continue
-                            file_ext = os.path.splitext(zip_file_name.lower())[1]
-                            if file_ext in ('.png', '.jpg', '.jpeg', '.webp', '.jfif', '.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv'):
-                                file_path = os.path.join(temp_dir, zip_file_name)
-                                base_name = re.sub(r'[^\w\-\s. ]', '_', os.path.splitext(os.path.basename(zip_file_name))[0])
-                                ext = os.path.splitext(zip_file_name)[1]
-                                filename = generate_unique_filename(
-                                    base_name,
-                                    ext,
-                                    os.path.join(settings.MEDIA_ROOT, f"uploads/{now.year}/{now.month:02d}/{now.day:02d}"),
-                                    zip_idx
-                                )
-                                relative_path = f"uploads/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-                                full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-                                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                                logger.info(f"Moving {file_path} to {full_path}")
-                                try:
-                                    os.rename(file_path, full_path)
-                                except FileExistsError:
-                                    logger.warning(f"File {full_path} already exists, skipping")
-                                    continue
-                                files_to_process.append((filename, relative_path, full_path))
-                            else:
-                                logger.warning(f"Skipping unsupported file in ZIP: {zip_file_name}")
+                # Les membres sont stockés directement et mis en file au fil de l'extraction
+                try:
+                    ingested, skipped = ingest_zip(files[0], enqueue)
+                    logger.info(f"ZIP {files[0].name}: {ingested} file(s) ingested, {len(skipped)} skipped")
+                    if skipped:
+                        messages.warning(request, f"{len(skipped)} fichier(s) du ZIP ignoré(s) (type non supporté, invalide ou trop volumineux).")
+                except IngestError as e:
+                    messages.error(request, str(e))
+                    if not jobs:
+                        report.delete()
+                        return render(request, 'detection/upload_multi.html', {'form': form})
             else:
                 # Process multiple images/videos
-                for idx, file in enumerate(files):
-                    base_name = re.sub(r'[^\w\-\s. ]', '_', os.path.splitext(file.name)[0])
-                    ext = os.path.splitext(file.name)[1]
-                    filename = generate_unique_filename(
-                        base_name,
-                        ext,
-                        os.path.join(settings.MEDIA_ROOT, f"uploads/{now.year}/{now.month:02d}/{now.day:02d}"),
-                        idx
-                    )
-                    relative_path = f"uploads/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-                    full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                    with open(full_path, 'wb+') as destination:
-                        for chunk in file.chunks():
-                            destination.write(chunk)
-                    files_to_process.append((filename, relative_path, full_path))
-
-            # Process files
-            for idx, (filename, relative_path, full_path) in enumerate(files_to_process):
-                logger.info(f"Processing file {idx+1}: {filename}")
-                annotated_relative_path = f"detection_results/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-                annotated_full_path = os.path.join(settings.MEDIA_ROOT, annotated_relative_path)
-                os.makedirs(os.path.dirname(annotated_full_path), exist_ok=True)
-
-                try:
-                    start_time = time.time()
-                    
-                    # Déterminer si c'est une vidéo ou une image
-                    if is_video_file(filename):
-                        logger.info(f"[VIDEO] Processing: {filename}")
-                        detected_objects, danger_level, model_used, video_metadata, frames_analyzed = run_video_detection(
-                            full_path,
-                            annotated_full_path,
-                            frame_interval=frame_interval
-                        )
-                        processing_duration = time.time() - start_time
-                        media_type = 'VIDEO'
-                    else:
-                        logger.info(f"[IMAGE] Processing: {filename}")
-                        detected_objects, danger_level, model_used = run_detection(full_path, annotated_full_path)
-                        processing_duration = time.time() - start_time
-                        media_type = 'IMAGE'
-                        video_metadata = None
-                        frames_analyzed = 0  # 0 pour les images au lieu de None
-                    
-                    logger.debug(f"Detected objects for {filename}: {detected_objects}")
-                    if detected_objects and detected_objects[0].get("category") == "error":
-                        logger.error(f"Detection error for {filename}")
-                        continue
-
-                    normalized_objects = []
-                    for obj in detected_objects:
-                        category = obj.get('category') or obj.get('label') or obj.get('class_name')
-                        if category and isinstance(category, str) and category.strip():
-                            obj_data = {
-                                'category': category.strip().lower(),
-                                'confidence': float(obj.get('confidence', 0.0))
-                            }
-                            # Ajouter frame et timestamp pour les vidéos
-                            if media_type == 'VIDEO':
-                                if 'frame' in obj:
-                                    obj_data['frame'] = obj['frame']
-                                if 'timestamp' in obj:
-                                    obj_data['timestamp'] = obj['timestamp']
-                            normalized_objects.append(obj_data)
-                        else:
-                            logger.warning(f"Invalid object in detection for {filename}: {obj}")
-                    detected_objects = normalized_objects
-
-                    detection_log = DetectionLog.objects.create(
-                        user=request.user,
-                        report=report,
-                        media_type=media_type,
-                        uploaded_file=annotated_relative_path,
-                        original_file=relative_path,
-                        user_location=location,
-                        detected_objects=detected_objects,
-                        danger_level=danger_level,
-                        model_used=model_used,
-                        is_simulated=True if model_used == "simulation" else False,
-                        video_metadata=video_metadata,
-                        frames_analyzed=frames_analyzed if frames_analyzed is not None else 0,
-                        processing_duration=processing_duration
-                    )
-                    detection_logs.append(detection_log)
-                    logger.info(f"Created DetectionLog ID: {detection_log.id} for {filename}")
-                except Exception as e:
-                    logger.error(f"Detection failed for {filename}: {str(e)}", exc_info=True)
-                    messages.warning(request, f"Échec de la détection pour {filename}: {str(e)}")
-                    continue
+                for file in files:
+                    timer = StageTimer()
+                    with timer.stage('store'):
+                        blob = media_store.save_chunks(file.chunks(), file.name, file.sha256)
+                    enqueue(blob, 'VIDEO' if is_video_file(file.name) else 'IMAGE', file.name, timer)
 
-            if not detection_logs:
+            if not jobs:
                 report.delete()
                 messages.error(request, "Aucune détection valide n'a été effectuée. Veuillez vérifier vos fichiers.")
                 return render(request, 'detection/upload_multi.html', {'form': form})
 
-            messages.success(request, f"{len(detection_logs)} détection(s) terminée(s) avec succès.")
+            messages.success(request, f"{len(jobs)} fichier(s) en file de détection.")
             return redirect('detection:analysis_results', report_id=report.id)
 
         else:
@@ -343,6 +187,14 @@ def upload_multi_detection(request):
     return render(request, 'detection/upload_multi.html', {'form': form})
 
 
+def report_stats(report):
+    """Détections du rapport par niveau de danger, d'après son résumé"""
+    return {
+        'normal': report.normal_count,
+        'dangerous': report.dangerous_count,
+        'hyperdangerous': report.hyperdangerous_count,
+    }
+
 @login_required
 def analysis_results(request, report_id):
     report = get_object_or_404(Report, id=report_id)
@@ -351,45 +203,41 @@ def analysis_results(request, report_id):
     
     detections = report.detections.all()
     
-    # Calcul des classes détectées avec occurrences
-    class_counts = {}
-    for detection in detections:
-        for obj in detection.detected_objects:
-            category = obj.get('category')
-            if category and isinstance(category, str) and category.strip():
-                category = category.strip().lower()
-                class_counts[category] = class_counts.get(category, 0) + 1
-    class_choices = [(cls, f"{cls.capitalize()} ({count})") for cls, count in class_counts.items()]
+    # Classes détectées avec occurrences, lues sur le résumé du rapport
+    class_choices = [(cls, f"{cls.capitalize()} ({count})") for cls, count in sorted(report.category_counts.items())]
     
     # Filtrage par classe
     class_filter = request.GET.get('class_filter', '').strip().lower()
     if class_filter:
-        filtered_detection_ids = []
-        for detection in detections:
-            for obj in detection.detected_objects:
-                category = obj.get('category', '').lower()
-                if category == class_filter:
-                    filtered_detection_ids.append(detection.id)
-                    break
-        detections = detections.filter(id__in=filtered_detection_ids)
+        detections = detections.filter(has_category(class_filter))
     
     # Pagination
     paginator = Paginator(detections, 6)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
 
-    # Statistiques
-    stats = {
-        'normal': detections.filter(danger_level__isnull=True).count(),
-        'dangerous': detections.filter(danger_level='DANGEROUS').count(),
-        'hyperdangerous': detections.filter(danger_level='HYPERDANGEROUS').count()
-    }
+    # Statistiques : résumé du rapport, ou comptage des seules détections filtrées par classe
+    if class_filter:
+        stats = detections.aggregate(
+            normal=Count('id', filter=Q(danger_level__isnull=True)),
+            dangerous=Count('id', filter=Q(danger_level='DANGEROUS')),
+            hyperdangerous=Count('id', filter=Q(danger_level='HYPERDANGEROUS')),
+        )
+    else:
+        stats = report_stats(report)
     dangerous_categories = list(DangerousCategory.objects.filter(is_active=True).values_list('name', flat=True))
 
+    # Tâches de détection du rapport encore en file ou en échec
+    job_counts = dict(
+        report.jobs.exclude(status='SUCCEEDED').values_list('status').annotate(count=Count('id'))
+    )
+
     context = {
         'report': report,
         'detections': page_obj,
         'stats': stats,
+        'pending_jobs': job_counts.get('PENDING', 0) + job_counts.get('RUNNING', 0),
+        'failed_jobs': job_counts.get('FAILED', 0),
         'validation_form': ValidationForm(),
         'dangerous_categories': dangerous_categories,
         'dangerous_categories_json': json.dumps(dangerous_categories),
@@ -404,22 +252,9 @@ def download_report_pdf(request, report_id):
     if report.user != request.user and not is_supervisor_or_admin(request.user):
         return HttpResponseForbidden("Vous n'avez pas la permission de voir ce rapport.")
     
-    detections = report.detections.all()
-    stats = {
-        'normal': detections.filter(danger_level__isnull=True).count(),
-        'dangerous': detections.filter(danger_level='DANGEROUS').count(),
-        'hyperdangerous': detections.filter(danger_level='HYPERDANGEROUS').count()
-    }
-    dangerous_categories = list(DangerousCategory.objects.filter(is_active=True).values_list('name', flat=True))
-    categories = {}
-    for detection in detections:
-        for obj in detection.detected_objects:
-            category = obj.get('category') or obj.get('label') or obj.get('class_name')
-            if category and isinstance(category, str):
-                category = category.strip().lower()
-                categories[category] = categories.get(category, 0) + 1
-            else:
-                logger.warning(f"Object without valid category in Detection ID {detection.id}: {obj}")
+    detections = report.detections.select_related('validation')
+    stats = report_stats(report)
+    categories = report.category_counts
 
     # Créer la réponse HTTP pour le PDF
     response = HttpResponse(content_type='application/pdf')
@@ -456,6 +291,10 @@ def download_report_pdf(request, report_id):
     elements.append(Paragraph(f"Normale: {stats['normal']} détections", normal_style))
     elements.append(Paragraph(f"Dangereuse: {stats['dangerous']} détections", normal_style))
     elements.append(Paragraph(f"Hyperdangereuse: {stats['hyperdangerous']} détections", normal_style))
+    elements.append(Paragraph(f"Images: {report.image_count}, Vidéos: {report.video_count}", normal_style))
+    elements.append(Paragraph(f"Frames analysées: {report.frames_analyzed}", normal_style))
+    elements.append(Paragraph(f"Durée de traitement cumulée: {report.processing_seconds:.1f} s", normal_style))
+    elements.append(Paragraph(f"Validations: {report.valid_count} correcte(s), {report.invalid_count} incorrecte(s)", normal_style))
     elements.append(Spacer(1, 0.5 * inch))
 
     # Catégories détectées
@@ -536,10 +375,10 @@ def reports_history(request):
     # Récupérer les rapports en fonction des permissions
     if request.user.is_administrator or request.user.is_supervisor:
         reports = Report.objects.all().order_by('-created_at')
-        all_reports = Report.objects.all()
+        facet_scope = facets.GLOBAL_SCOPE
     else:
         reports = Report.objects.filter(user=request.user).order_by('-created_at')
-        all_reports = Report.objects.filter(user=request.user)
+        facet_scope = facets.user_scope(request.user.id)
 
     # Récupérer les paramètres de filtrage
     name_filter = request.GET.get('name', '').strip()
@@ -564,79 +403,61 @@ def reports_history(request):
     if location_filter:
         reports = reports.filter(location=location_filter)
 
-    if date_from:
-        try:
-            date_from = datetime.strptime(date_from, '%Y-%m-%d')
-            reports = reports.filter(created_at__gte=date_from)
-        except ValueError:
-            pass
-
-    if date_to:
-        try:
-            date_to = datetime.strptime(date_to, '%Y-%m-%d')
-            reports = reports.filter(created_at__lte=date_to)
-        except ValueError:
-            pass
+    # Bornes incluses, appliquées en intervalle semi-ouvert sur la colonne brute
+    reports = filter_days(reports, 'created_at', parse_day(date_from), parse_day(date_to))
 
+    # Filtres sur les détections en EXISTS : pas de jointure qui fausserait les comptes par rapport
     if danger_level_filter:
+        report_detections = DetectionLog.objects.filter(report=OuterRef('pk'))
         if danger_level_filter == 'normal':
-            reports = reports.filter(detections__danger_level__isnull=True).distinct()
+            reports = reports.filter(Exists(report_detections.filter(danger_level__isnull=True)))
         else:
-            reports = reports.filter(detections__danger_level=danger_level_filter.upper()).distinct()
+            reports = reports.filter(Exists(report_detections.filter(danger_level=danger_level_filter.upper())))
 
     if class_filter:
-        filtered_report_ids = []
-        for report in reports:
-            for detection in report.detections.all():
-                for obj in detection.detected_objects:
-                    category = (obj.get('category') or obj.get('label') or obj.get('class_name') or '').lower()
-                    if category == class_filter.lower():
-                        filtered_report_ids.append(report.id)
-                        break
-        reports = reports.filter(id__in=filtered_report_ids)
-
-    # Récupérer les localisations avec le nombre d'occurrences
-    locations = (
-        all_reports.values('location')
-        .annotate(count=Count('id'))
-        .exclude(location='')
-        .order_by('location')
-    )
-    location_choices = [(loc['location'], f"{loc['location']} ({loc['count']})") for loc in locations]
-
-    # Récupérer les niveaux de danger avec le nombre d'occurrences
+        reports = reports.filter(Exists(DetectionObject.objects.filter(
+            detection_log__report=OuterRef('pk'), category=class_filter.strip().lower()
+        )))
+
+    # Comptes par niveau de danger (résumé du rapport) et aperçus chargés avec la page
+    reports = reports.select_related('user').prefetch_related(Prefetch(
+        'detections',
+        queryset=DetectionLog.objects.only('id', 'report_id', 'uploaded_file', 'detection_timestamp')
+        .order_by('-detection_timestamp', '-id')[:3],
+        to_attr='preview_detections',
+    ))
+
+    # Occurrences des localisations, niveaux de danger et classes (compteurs matérialisés)
+    counts = facets.facet_counts(facet_scope)
+    location_counts = counts.get('report_location', {})
+    location_choices = [(loc, f"{loc} ({count})") for loc, count in sorted(location_counts.items()) if loc]
+
+    # Nombre de rapports contenant au moins une détection de chaque niveau
+    level_counts = counts.get('report_danger_level', {})
     danger_levels = [
-        {'level': 'normal', 'count': all_reports.filter(detections__danger_level__isnull=True).distinct().count()},
-        {'level': 'dangerous', 'count': all_reports.filter(detections__danger_level='DANGEROUS').distinct().count()},
-        {'level': 'hyperdangerous', 'count': all_reports.filter(detections__danger_level='HYPERDANGEROUS').distinct().count()},
+        {'level': 'normal', 'count': level_counts.get('', 0)},
+        {'level': 'dangerous', 'count': level_counts.get('DANGEROUS', 0)},
+        {'level': 'hyperdangerous', 'count': level_counts.get('HYPERDANGEROUS', 0)},
     ]
     danger_level_choices = [(dl['level'], f"{dl['level'].capitalize()} ({dl['count']})") for dl in danger_levels if dl['count'] > 0]
 
-    # Récupérer les classes détectées avec le nombre d'occurrences
-    class_counts = {}
-    for report in all_reports:
-        for detection in report.detections.all():
-            for obj in detection.detected_objects:
-                category = (obj.get('category') or obj.get('label') or obj.get('class_name') or '').lower()
-                if category:
-                    class_counts[category] = class_counts.get(category, 0) + 1
-    class_choices = [(cls, f"{cls.capitalize()} ({count})") for cls, count in class_counts.items()]
+    class_counts = counts.get('report_class', {})
+    class_choices = [(cls, f"{cls.capitalize()} ({count})") for cls, count in sorted(class_counts.items())]
 
-    # Pagination
-    paginator = Paginator(reports, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    approximate_count = None
+    if not (name_filter or user_filter or date_from or date_to or class_filter):
+        level = None
+        if danger_level_filter:
+            level = '' if danger_level_filter == 'normal' else danger_level_filter.upper()
+        approximate_count = facets.approximate_total(
+            counts, 'report_location', {'report_danger_level': level, 'report_location': location_filter or None},
+        )
+
+    # Pagination par curseur sur (created_at, id)
+    page_obj = keyset_page(reports, request.GET, field='created_at', count=approximate_count)
 
-    # Ajouter les statistiques pour chaque rapport
     for report in page_obj:
-        detections = report.detections.all()
-        report.stats = {
-            'normal': detections.filter(danger_level__isnull=True).count(),
-            'dangerous': detections.filter(danger_level='DANGEROUS').count(),
-            'hyperdangerous': detections.filter(danger_level='HYPERDANGEROUS').count(),
-            'total': detections.count()
-        }
-        report.preview_detections = detections[:3]
+        report.stats = {**report_stats(report), 'total': report.detection_count}
 
     # Récupérer la liste des utilisateurs pour le filtre (si admin ou superviseur)
     users = User.objects.all().order_by('email') if is_supervisor_or_admin(request.user) else None
@@ -703,6 +524,191 @@ def detection_result(request, detection_id):
     
     return render(request, 'detection/result.html', context)
 
+@login_required
+def job_status(request, job_id):
+    """Suivi d'une tâche de détection ; redirige vers le résultat une fois terminée"""
+    job = get_object_or_404(DetectionJob, id=job_id)
+    if job.user != request.user and not is_supervisor_or_admin(request.user):
+        return HttpResponseForbidden("Vous n'avez pas la permission de voir cette tâche.")
+
+    result_url = reverse('detection:result', args=[job.detection_log_id]) if job.detection_log_id else None
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'attempts': job.attempts,
+            'error': job.last_error,
+            'result_url': result_url,
+            'progress': job.progress,
+        })
+
+    if job.status == 'SUCCEEDED' and result_url:
+        return redirect(result_url)
+
+    # Lecture de l'analyse en cours : la playlist HLS est alimentée segment par segment
+    live_playlist_url = None
+    playlist = attempt_output_path(job.annotated_file, job.attempts)
+    if job.output_mode == 'hls' and os.path.exists(os.path.join(settings.MEDIA_ROOT, playlist)):
+        live_playlist_url = f"{settings.MEDIA_URL}{playlist}"
+
+    return render(request, 'detection/job_status.html', {
+        'job': job,
+        'live_playlist_url': live_playlist_url,
+        'no_live_worker': not job.is_finished and not live_workers().exists(),
+    })
+
+def _upload_session_payload(session):
+    return {
+        'upload_id': str(session.pk),
+        'filename': session.filename,
+        'offset': session.offset,
+        'size': session.total_size,
+        'crc32': f"{session.crc32:08x}",
+        'status': session.status,
+        'upload_url': reverse('detection:chunked_upload', args=[session.pk]),
+        'complete_url': reverse('detection:chunked_upload_complete', args=[session.pk]),
+    }
+
+
+@login_required
+def chunked_upload_initiate(request):
+    """Crée une session d'upload par morceaux et son fichier partiel"""
+    from .forms import ChunkedUploadInitForm
+    from .utils import resolve_video_output_mode
+    from .uploads import create_partial_upload
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
+
+    form = ChunkedUploadInitForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Paramètres invalides', 'errors': form.errors}, status=400)
+
+    filename = form.cleaned_data['filename']
+    expected_crc32 = form.cleaned_data.get('crc32')
+    session = UploadSession(
+        user=request.user,
+        filename=filename,
+        total_size=form.cleaned_data['size'],
+        expected_crc32=int(expected_crc32, 16) if expected_crc32 else None,
+        user_location=form.cleaned_data.get('location') or '',
+        frame_interval=form.cleaned_data.get('video_frame_interval') or 30,
+        output_mode=resolve_video_output_mode(form.cleaned_data.get('video_output_mode')),
+    )
+    create_partial_upload(session)
+    logger.info(f"Upload session {session.pk} initiated: {session.relative_path} ({session.total_size} bytes)")
+    return JsonResponse(_upload_session_payload(session), status=201)
+
+
+@login_required
+def chunked_upload(request, upload_id):
+    """GET/HEAD : offset courant ; PUT : ajoute un morceau (en-tête Upload-Offset) ; DELETE : abandon"""
+    from .uploads import ChunkError, abort_session, append_chunk, parse_crc32
+
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+
+    if request.method in ('GET', 'HEAD'):
+        response = JsonResponse(_upload_session_payload(session))
+        response['Upload-Offset'] = str(session.offset)
+        return response
+
+    if request.method == 'DELETE':
+        abort_session(session)
+        return JsonResponse({'status': 'ABORTED'})
+
+    if request.method != 'PUT':
+        return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': "En-tête Upload-Offset manquant ou invalide"}, status=400)
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        return JsonResponse({'error': 'Morceau trop volumineux', 'max_chunk_size': settings.UPLOAD_CHUNK_MAX_SIZE}, status=413)
+
+    try:
+        chunk_crc32 = parse_crc32(request.headers.get('Upload-Chunk-CRC32'))
+        append_chunk(session, request, offset, length, chunk_crc32)
+    except ChunkError as e:
+        if e.status == 415:
+            # Contenu refusé : la session ne peut plus aboutir
+            abort_session(session)
+        session.refresh_from_db()
+        response = JsonResponse({'error': str(e), 'offset': session.offset}, status=e.status)
+        response['Upload-Offset'] = str(session.offset)
+        return response
+
+    response = JsonResponse(_upload_session_payload(session))
+    response['Upload-Offset'] = str(session.offset)
+    return response
+
+
+@login_required
+def chunked_upload_complete(request, upload_id):
+    """Vérifie le fichier reçu puis met la détection en file"""
+    from .utils import is_video_file, annotated_result_path
+    from .uploads import ChunkError, abort_session, file_crc32, parse_crc32
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
+
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if session.status == 'COMPLETED' and session.job_id:
+        # Finalisation rejouée après une coupure : renvoyer la même tâche
+        return JsonResponse({'job_id': session.job_id, 'status_url': reverse('detection:job_status', args=[session.job_id])})
+    if session.status != 'UPLOADING':
+        return JsonResponse({'error': "Cette session d'upload est abandonnée."}, status=409)
+    if not session.is_complete:
+        return JsonResponse({'error': 'Upload incomplet', 'offset': session.offset, 'size': session.total_size}, status=409)
+
+    full_path = os.path.join(settings.MEDIA_ROOT, session.relative_path)
+    try:
+        expected_crc32 = parse_crc32(request.POST.get('crc32'))
+    except ChunkError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if expected_crc32 is None:
+        expected_crc32 = session.expected_crc32
+    # CRC relu sur le disque : le CRC courant en base ne décrit que les octets que la session croit avoir écrits
+    if os.path.getsize(full_path) != session.total_size or file_crc32(full_path) != session.crc32 or (
+            expected_crc32 is not None and expected_crc32 != session.crc32):
+        logger.error(f"Upload session {session.pk}: checksum mismatch, discarding {session.relative_path}")
+        abort_session(session)
+        return JsonResponse({'error': 'Le fichier reçu ne correspond pas à la somme de contrôle attendue.'}, status=422)
+
+    # Un seul appel de finalisation met la détection en file
+    if not UploadSession.objects.filter(pk=session.pk, status='UPLOADING').update(status='COMPLETED'):
+        return JsonResponse({'error': 'Finalisation déjà en cours'}, status=409)
+
+    # Le fichier reçu rejoint le stockage adressé par contenu (supprimé s'il y est déjà)
+    timer = StageTimer()
+    with timer.stage('store'):
+        blob = media_store.adopt(session.relative_path, session.filename)
+    UploadSession.objects.filter(pk=session.pk).update(relative_path=blob.path)
+
+    media_type = 'VIDEO' if is_video_file(session.filename) else 'IMAGE'
+    job = enqueue_detection(
+        user=request.user,
+        original_file=blob.path,
+        annotated_file=annotated_result_path(session.filename, media_type, session.output_mode),
+        media_type=media_type,
+        location=session.user_location,
+        frame_interval=session.frame_interval,
+        output_mode=session.output_mode,
+        priority=PRIORITY_INTERACTIVE,
+        timer=timer
+    )
+    UploadSession.objects.filter(pk=session.pk).update(job=job)
+    logger.info(f"Upload session {session.pk} completed, detection job {job.id} enqueued")
+
+    return JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('detection:job_status', args=[job.id]),
+        'result_url': reverse('detection:result', args=[job.detection_log_id]) if job.detection_log_id else None,
+    }, status=201)
+
 @login_required
 def validate_detection(request, detection_id):
     detection = get_object_or_404(DetectionLog, id=detection_id)
@@ -807,90 +813,37 @@ def validate_category(request, detection_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-def recalculate_danger_level(detection):
-    """
-    Recalcule le niveau de danger basé sur les catégories détectées.
-    
-    Logique CORRECTE :
-    1. Récupère toutes les catégories détectées dans detected_objects
-    2. Exclut les catégories qui ont été explicitement REJETÉES (is_valid=False)
-    3. Inclut les catégories :
-       - Validées (is_valid=True)
-       - Non encore vérifiées (pas de CategoryValidation)
-    4. Détermine le niveau basé sur la catégorie la plus dangereuse restante
-    
-    Exemple :
-    - Détecté : knife (NORMAL) + shotgun (HYPERDANGEROUS)
-    - Initial : HYPERDANGEROUS
-    - Si shotgun rejeté : NORMAL (basé sur knife)
-    - Si shotgun validé : HYPERDANGEROUS
-    - Si aucune validation : HYPERDANGEROUS (les deux comptent)
-    """
-    from .models import CategoryValidation, DangerousCategory
-    import json
-    
-    # Récupérer toutes les catégories détectées
-    if not detection.detected_objects:
-        return None
-    
+@login_required
+def validate_categories(request, detection_id):
+    """Valide ou rejette en une requête plusieurs catégories d'une vidéo (corps JSON)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
+
+    detection = get_object_or_404(DetectionLog, id=detection_id)
+
+    if detection.user != request.user and not is_supervisor_or_admin(request.user):
+        return JsonResponse({'error': 'Permission refusée'}, status=403)
+
     try:
-        detected_objects = json.loads(detection.detected_objects) if isinstance(detection.detected_objects, str) else detection.detected_objects
-    except (json.JSONDecodeError, TypeError):
-        return None
-    
-    # Récupérer les catégories explicitement REJETÉES (is_valid=False)
-    rejected_validations = CategoryValidation.objects.filter(
-        detection_log=detection,
-        is_valid=False
-    ).values_list('category_name', flat=True)
-    
-    rejected_categories = set(cat.lower() for cat in rejected_validations)
-    
-    # Log pour débogage
-    logger = logging.getLogger(__name__)
-    logger.info(f"Recalcul danger: rejected_categories={rejected_categories}")
-    
-    # Parcourir les catégories détectées et déterminer le niveau le plus dangereux
-    highest_danger_level = None
-    has_remaining_categories = False  # Flag pour savoir s'il reste des catégories non rejetées
-    
-    for obj in detected_objects:
-        category_name = obj.get('category', '').strip()
-        if not category_name:
-            continue
-        
-        # Ignorer les catégories rejetées
-        if category_name.lower() in rejected_categories:
-            continue
-        
-        # Cette catégorie n'est pas rejetée, donc elle compte
-        has_remaining_categories = True
-        
-        # Vérifier le type de danger de cette catégorie
-        try:
-            dangerous_cat = DangerousCategory.objects.get(
-                name__iexact=category_name,
-                is_active=True
-            )
-            
-            if dangerous_cat.category_type == 'HYPERDANGEROUS':
-                return 'HYPERDANGEROUS'  # Retourner immédiatement (le plus haut niveau)
-            elif dangerous_cat.category_type == 'DANGEROUS':
-                highest_danger_level = 'DANGEROUS'
-        except DangerousCategory.DoesNotExist:
-            # Catégorie non dangereuse ou non trouvée dans DangerousCategory
-            # Continue à chercher d'autres catégories potentiellement dangereuses
-            pass
-    
-    # Si on a trouvé une catégorie dangereuse, la retourner
-    if highest_danger_level:
-        logger.info(f"Recalcul danger: résultat={highest_danger_level}")
-        return highest_danger_level
-    
-    # Si on a des catégories restantes (non rejetées) mais aucune n'est dangereuse → NORMAL
-    # Si TOUTES les catégories ont été rejetées → NORMAL également
-    logger.info(f"Recalcul danger: résultat=NORMAL (has_remaining={has_remaining_categories})")
-    return 'NORMAL'
+        payload = json.loads(request.body or b'{}')
+        entries = parse_entries(payload.get('validations') if isinstance(payload, dict) else None)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Corps JSON invalide'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    old_danger_level = detection.danger_level
+    new_danger_level = save_category_validations(detection, entries, request.user)
+    logging.getLogger(__name__).info(
+        f"Validation en lot: detection={detection.id}, entrées={len(entries)}, "
+        f"niveau ancien={old_danger_level}, nouveau={new_danger_level}"
+    )
+
+    return JsonResponse({
+        'success': True,
+        'count': len(entries),
+        'new_danger_level': new_danger_level,
+    })
 
 
 @login_required
@@ -898,10 +851,10 @@ def detection_history(request):
     # Récupérer les détections en fonction des permissions
     if request.user.is_administrator or request.user.is_supervisor:
         detections = DetectionLog.objects.all().order_by('-detection_timestamp')
-        all_detections = DetectionLog.objects.all()
+        facet_scope = facets.GLOBAL_SCOPE
     else:
         detections = DetectionLog.objects.filter(user=request.user).order_by('-detection_timestamp')
-        all_detections = DetectionLog.objects.filter(user=request.user)
+        facet_scope = facets.user_scope(request.user.id)
 
     # Récupérer les paramètres de filtrage
     class_filter = request.GET.get('class_filter', '').strip().lower()
@@ -915,43 +868,25 @@ def detection_history(request):
     category = request.GET.get('category', '').strip().lower()
     operator_id = request.GET.get('operator_id', '')
 
-    # Calculer les classes détectées avec occurrences (for full page view)
-    class_counts = {}
-    for detection in all_detections:
-        for obj in detection.detected_objects:
-            category_name = obj.get('category', '').strip().lower()
-            if category_name:
-                class_counts[category_name] = class_counts.get(category_name, 0) + 1
+    # Occurrences des classes, niveaux de danger et localisations (compteurs matérialisés)
+    counts = facets.facet_counts(facet_scope)
+    class_counts = counts.get('class', {})
     class_choices = [(cls, f"{cls.capitalize()} ({count})") for cls, count in sorted(class_counts.items())]
 
-    # Calculer les niveaux de danger avec occurrences
+    level_counts = counts.get('danger_level', {})
     danger_levels = [
-        {'level': 'normal', 'count': all_detections.filter(danger_level__isnull=True).count()},
-        {'level': 'dangerous', 'count': all_detections.filter(danger_level='DANGEROUS').count()},
-        {'level': 'hyperdangerous', 'count': all_detections.filter(danger_level='HYPERDANGEROUS').count()},
+        {'level': 'normal', 'count': level_counts.get('', 0)},
+        {'level': 'dangerous', 'count': level_counts.get('DANGEROUS', 0)},
+        {'level': 'hyperdangerous', 'count': level_counts.get('HYPERDANGEROUS', 0)},
     ]
     danger_level_choices = [(dl['level'], f"{dl['level'].capitalize()} ({dl['count']})") for dl in danger_levels if dl['count'] > 0]
 
-    # Calculer les localisations avec occurrences
-    location_counts = (
-        all_detections.values('user_location')
-        .annotate(count=Count('id'))
-        .exclude(user_location='')
-        .order_by('user_location')
-    )
-    location_choices = [(loc['user_location'], f"{loc['user_location']} ({loc['count']})") for loc in location_counts]
+    location_counts = counts.get('location', {})
+    location_choices = [(loc, f"{loc} ({count})") for loc, count in sorted(location_counts.items()) if loc]
 
     # Appliquer les filtres
     if class_filter or category:
-        filter_value = class_filter or category
-        filtered_detection_ids = []
-        for detection in detections:
-            for obj in detection.detected_objects:
-                category_name = obj.get('category', '').lower()
-                if category_name == filter_value:
-                    filtered_detection_ids.append(detection.id)
-                    break
-        detections = detections.filter(id__in=filtered_detection_ids)
+        detections = detections.filter(has_category(class_filter or category))
 
     if danger_level_filter:
         if danger_level_filter == 'normal':
@@ -962,26 +897,12 @@ def detection_history(request):
     if location_filter:
         detections = detections.filter(user_location=location_filter)
 
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            detections = detections.filter(detection_timestamp__gte=date_from_obj)
-        except ValueError:
-            pass
-
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-            detections = detections.filter(detection_timestamp__lte=date_to_obj)
-        except ValueError:
-            pass
+    detections = filter_days(detections, 'detection_timestamp', parse_day(date_from), parse_day(date_to))
 
-    if date:
-        try:
-            date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-            detections = detections.filter(detection_timestamp__date=date_obj)
-        except ValueError:
-            pass
+    # Jour cliqué sur un graphique de stats.html
+    day = parse_day(date)
+    if day:
+        detections = filter_days(detections, 'detection_timestamp', day, day)
 
     if validation_status:
         if validation_status == 'valides':
@@ -997,10 +918,18 @@ def detection_history(request):
         except ValueError:
             pass
 
-    # Pagination
-    paginator = Paginator(detections, 10)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # Total approché, lu sur les compteurs quand ils couvrent les filtres actifs
+    approximate_count = None
+    if not (class_filter or category or date_from or date_to or date or validation_status or operator_id):
+        level = None
+        if danger_level_filter:
+            level = '' if danger_level_filter == 'normal' else danger_level_filter.upper()
+        approximate_count = facets.approximate_total(
+            counts, 'danger_level', {'danger_level': level, 'location': location_filter or None},
+        )
+
+    # Pagination par curseur sur (detection_timestamp, id)
+    page_obj = keyset_page(detections, request.GET, count=approximate_count)
 
     # Determine template based on request type
     context = {
@@ -1027,7 +956,6 @@ def detection_history(request):
 def flagged_detections(request):
     # Restreindre aux détections hyperdangereuses pour tous les utilisateurs
     detections = DetectionLog.objects.filter(danger_level='HYPERDANGEROUS').order_by('-detection_timestamp')
-    all_detections = detections  # Pour calculer les choix de filtres
 
     # Récupérer les paramètres de filtrage
     user_filter = request.GET.get('user_filter', '').strip()
@@ -1036,29 +964,21 @@ def flagged_detections(request):
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
 
-    # Calculer les utilisateurs avec occurrences
-    user_counts = (
-        all_detections.values('user__id', 'user__email', 'user__first_name', 'user__last_name')
-        .annotate(count=Count('id'))
-        .order_by('user__email')
-    )
+    # Occurrences par utilisateur et localisation (compteurs matérialisés)
+    counts = facets.facet_counts(facets.GLOBAL_SCOPE)
+    user_counts = counts.get('flagged_user', {})
     user_choices = []
-    for user in user_counts:
-        full_name = f"{user['user__first_name']} {user['user__last_name']}".strip()
-        display = f"{full_name or user['user__email']} ({user['count']})"
-        user_choices.append((str(user['user__id']), display))
-
-    # Calculer les localisations avec occurrences
-    location_counts = (
-        all_detections.values('user_location')
-        .annotate(count=Count('id'))
-        .exclude(user_location='')
-        .order_by('user_location')
-    )
-    location_choices = [(loc['user_location'], f"{loc['user_location']} ({loc['count']})") for loc in location_counts]
+    flagged_users = User.objects.filter(pk__in=[int(user_id) for user_id in user_counts]).order_by('email')
+    for user in flagged_users.only('id', 'email', 'first_name', 'last_name'):
+        full_name = f"{user.first_name} {user.last_name}".strip()
+        display = f"{full_name or user.email} ({user_counts[str(user.id)]})"
+        user_choices.append((str(user.id), display))
+
+    location_counts = counts.get('flagged_location', {})
+    location_choices = [(loc, f"{loc} ({count})") for loc, count in sorted(location_counts.items()) if loc]
 
     # Calculer les niveaux de danger (seulement hyperdangerous)
-    danger_level_choices = [('hyperdangerous', f"Hyperdangereux ({all_detections.count()})")]
+    danger_level_choices = [('hyperdangerous', f"Hyperdangereux ({sum(user_counts.values())})")]
 
     # Appliquer les filtres
     if user_filter:
@@ -1074,24 +994,16 @@ def flagged_detections(request):
     if danger_level_filter and danger_level_filter != 'hyperdangerous':
         detections = detections.none()  # Seulement hyperdangerous est valide
 
-    if date_from:
-        try:
-            date_from = datetime.strptime(date_from, '%Y-%m-%d')
-            detections = detections.filter(detection_timestamp__gte=date_from)
-        except ValueError:
-            pass
+    detections = filter_days(detections, 'detection_timestamp', parse_day(date_from), parse_day(date_to))
 
-    if date_to:
-        try:
-            date_to = datetime.strptime(date_to, '%Y-%m-%d')
-            detections = detections.filter(detection_timestamp__lte=date_to)
-        except ValueError:
-            pass
+    approximate_count = None
+    if not (date_from or date_to or danger_level_filter not in ('', 'hyperdangerous')):
+        approximate_count = facets.approximate_total(
+            counts, 'flagged_user', {'flagged_user': user_filter or None, 'flagged_location': location_filter or None},
+        )
 
-    # Pagination
-    paginator = Paginator(detections, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur sur (detection_timestamp, id)
+    page_obj = keyset_page(detections, request.GET, count=approximate_count)
 
     context = {
         'page_obj': page_obj,
@@ -1112,7 +1024,9 @@ def flagged_detections(request):
 @user_passes_test(is_admin)
 def manage_categories(request):
     categories = DangerousCategory.objects.all().order_by('name')
-    return render(request, 'detection/categories.html', {'categories': categories})
+    # Re-notations des détections après les dernières modifications de catégories
+    rescore_jobs = DetectionJob.objects.filter(kind='RESCORE', status__in=('PENDING', 'RUNNING')).order_by('created_at')
+    return render(request, 'detection/categories.html', {'categories': categories, 'rescore_jobs': rescore_jobs})
 
 @login_required
 @user_passes_test(is_admin)
@@ -1183,14 +1097,15 @@ def chatbot_interact(request, detection_id):
     try:
         genai.configure(api_key=settings.CHATBOT_API_KEY)
         model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(
-            prompt,
-            generation_config={
-                "max_output_tokens": 150,
-                "temperature": 0.7
-            }
-        )
-        chatbot_response = response.text
+        with observe_chatbot_call('interact', 'gemini-2.0-flash'):
+            response = model.generate_content(
+                prompt,
+                generation_config={
+                    "max_output_tokens": 150,
+                    "temperature": 0.7
+                }
+            )
+            chatbot_response = response.text
         logger.info(f"Chatbot response for user input: {chatbot_response}")
         return JsonResponse({'response': chatbot_response})
     except Exception as e:
@@ -1215,19 +1130,26 @@ def detection_detail(request, detection_id):
 # ============ NOUVELLES FONCTIONS POUR SUPPORT VIDÉO ============
 
 @login_required
+@detection_upload_view
 def unified_media_detection(request):
     """Vue unifiée pour traiter images et vidéos dans un seul formulaire"""
-    from .utils import run_video_detection, is_video_file, is_image_file
+    from .utils import is_video_file, is_image_file, resolve_video_output_mode, annotated_result_path
     from .forms import UnifiedMediaDetectionForm
     
     if request.method == 'POST':
         form = UnifiedMediaDetectionForm(request.POST, request.FILES)
+        if request.upload_errors:
+            for error in request.upload_errors:
+                messages.error(request, error)
+            return redirect('detection:upload_unified')
+        attach_upload_digests(request, 'media_files')
         
         if form.is_valid():
             files = request.FILES.getlist('media_files')
             location = form.cleaned_data.get('location', '')
             report_name = form.cleaned_data.get('report_name', '')
             frame_interval = form.cleaned_data.get('video_frame_interval', 30)
+            output_mode = resolve_video_output_mode(form.cleaned_data.get('video_output_mode'))
             
             now = timezone.now()
             
@@ -1238,125 +1160,40 @@ def unified_media_detection(request):
             )
             logger.info(f"Created Report ID: {report.id}, Name: {report.name}")
             
-            detection_logs = []
+            jobs = []
             
             for file in files:
-                base_name = re.sub(r'[^\w\-\s.]', '_', os.path.splitext(file.name)[0])
-                ext = os.path.splitext(file.name)[1]
-                timestamp_str = str(int(time.time()))
-                filename = f"{base_name}_{timestamp_str}{ext}"
-                
-                relative_path = f"uploads/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-                full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if is_video_file(file.name):
+                    media_type = 'VIDEO'
+                elif is_image_file(file.name):
+                    media_type = 'IMAGE'
+                else:
+                    logger.warning(f"Unsupported file type: {file.name}")
+                    continue
                 
-                with open(full_path, 'wb+') as destination:
-                    for chunk in file.chunks():
-                        destination.write(chunk)
+                timer = StageTimer()
+                with timer.stage('store'):
+                    blob = media_store.save_chunks(file.chunks(), file.name, file.sha256)
                 
-                try:
-                    start_time = time.time()
-                    
-                    if is_video_file(filename):
-                        # TRAITEMENT VIDÉO
-                        annotated_relative_path = f"detection_results/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-                        annotated_full_path = os.path.join(settings.MEDIA_ROOT, annotated_relative_path)
-                        os.makedirs(os.path.dirname(annotated_full_path), exist_ok=True)
-                        
-                        logger.info(f"[VIDEO] Processing: {filename}")
-                        
-                        detected_objects, danger_level, model_used, video_metadata, frames_analyzed = run_video_detection(
-                            full_path,
-                            annotated_full_path,
-                            frame_interval=frame_interval
-                        )
-                        
-                        processing_duration = time.time() - start_time
-                        
-                        normalized_objects = []
-                        for obj in detected_objects:
-                            category = obj.get('category', '').strip().lower()
-                            if category and category != 'error':
-                                normalized_objects.append({
-                                    'category': category,
-                                    'confidence': float(obj.get('confidence', 0.0)),
-                                    'frame': obj.get('frame', 0),
-                                    'timestamp': obj.get('timestamp', 0.0)
-                                })
-                        
-                        detection_log = DetectionLog.objects.create(
-                            user=request.user,
-                            report=report,
-                            media_type='VIDEO',
-                            uploaded_file=annotated_relative_path,
-                            original_file=relative_path,
-                            user_location=location,
-                            detected_objects=normalized_objects,
-                            danger_level=danger_level,
-                            model_used=model_used,
-                            is_simulated=(model_used == "simulation"),
-                            video_metadata=video_metadata,
-                            frames_analyzed=frames_analyzed,
-                            processing_duration=processing_duration
-                        )
-                        logger.info(f"[VIDEO] Detection log created: ID {detection_log.id}")
-                        
-                    elif is_image_file(filename):
-                        # TRAITEMENT IMAGE
-                        annotated_relative_path = f"detection_results/{now.year}/{now.month:02d}/{now.day:02d}/{filename}"
-                        annotated_full_path = os.path.join(settings.MEDIA_ROOT, annotated_relative_path)
-                        os.makedirs(os.path.dirname(annotated_full_path), exist_ok=True)
-                        
-                        logger.info(f"[IMAGE] Processing: {filename}")
-                        
-                        detected_objects, danger_level, model_used = run_detection(
-                            full_path,
-                            annotated_full_path
-                        )
-                        
-                        processing_duration = time.time() - start_time
-                        
-                        normalized_objects = []
-                        for obj in detected_objects:
-                            category = obj.get('category', '').strip().lower()
-                            if category and category != 'error':
-                                normalized_objects.append({
-                                    'category': category,
-                                    'confidence': float(obj.get('confidence', 0.0))
-                                })
-                        
-                        detection_log = DetectionLog.objects.create(
-                            user=request.user,
-                            report=report,
-                            media_type='IMAGE',
-                            uploaded_file=annotated_relative_path,
-                            original_file=relative_path,
-                            user_location=location,
-                            detected_objects=normalized_objects,
-                            danger_level=danger_level,
-                            model_used=model_used,
-                            is_simulated=(model_used == "simulation"),
-                            processing_duration=processing_duration
-                        )
-                        logger.info(f"[IMAGE] Detection log created: ID {detection_log.id}")
-                    
-                    else:
-                        logger.warning(f"Unsupported file type: {filename}")
-                        continue
-                    
-                    detection_logs.append(detection_log)
-                    
-                except Exception as e:
-                    logger.error(f"Detection failed for {filename}: {str(e)}", exc_info=True)
-                    messages.warning(request, f"Échec de la détection pour {filename}: {str(e)}")
-                    continue
+                jobs.append(enqueue_detection(
+                    user=request.user,
+                    original_file=blob.path,
+                    annotated_file=annotated_result_path(file.name, media_type, output_mode, now),
+                    media_type=media_type,
+                    location=location,
+                    report=report,
+                    frame_interval=frame_interval,
+                    output_mode=output_mode,
+                    priority=PRIORITY_BATCH,
+                    timer=timer
+                ))
             
-            if not detection_logs:
+            if not jobs:
                 report.delete()
                 messages.error(request, "Aucune détection valide n'a été effectuée.")
                 return render(request, 'detection/unified_upload.html', {'form': form})
             
-            messages.success(request, f"{len(detection_logs)} détection(s) terminée(s) avec succès.")
+            messages.success(request, f"{len(jobs)} fichier(s) en file de détection.")
             return redirect('detection:analysis_results', report_id=report.id)
         
         else:
@@ -0,0 +1,146 @@
+"""
+Statistiques de la page d'accueil (users:home), calculées sur les agrégats quotidiens.
+
+Le résultat est mis en cache par combinaison de filtres (utilisateur, période)
+pour STATS_CACHE_SECONDS ; la clé inclut la version des statistiques, qui
+change dès qu'une détection ou une validation est enregistrée.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from apps.detection.dates import filter_days
+from apps.detection.models import DangerousCategory, DetectionDailyRollup, DetectionLog, Report
+from apps.detection.rollups import stats_version
+
+
+def detection_stats(user_id=None, first_day=None, last_day=None):
+    """Statistiques (éventuellement mises en cache) d'un utilisateur ou de tous, sur des jours inclus"""
+    today = timezone.localdate()
+    key = f"users:stats:{stats_version()}:{user_id or 'all'}:{first_day or ''}:{last_day or ''}:{today}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = compute_detection_stats(user_id, first_day, last_day, today)
+        cache.set(key, payload, settings.STATS_CACHE_SECONDS)
+    return payload
+
+
+def compute_detection_stats(user_id, first_day, last_day, today):
+    rollups_qs = DetectionDailyRollup.objects.all()
+    detections_qs = DetectionLog.objects.all()
+    if user_id:
+        rollups_qs = rollups_qs.filter(user_id=user_id)
+        detections_qs = detections_qs.filter(user_id=user_id)
+    if first_day:
+        rollups_qs = rollups_qs.filter(day__gte=first_day)
+    if last_day:
+        rollups_qs = rollups_qs.filter(day__lte=last_day)
+    detections_qs = filter_days(detections_qs, 'detection_timestamp', first_day, last_day)
+
+    # Compteurs par détection (lignes sans catégorie), en une seule requête
+    detection_rows = rollups_qs.filter(category='')
+    image, video = Q(media_type='IMAGE'), Q(media_type='VIDEO')
+    totals = {
+        key: value or 0
+        for key, value in detection_rows.aggregate(
+            total=Sum('detection_count'),
+            images=Sum('detection_count', filter=image),
+            videos=Sum('detection_count', filter=video),
+            dangerous_images=Sum('detection_count', filter=image & Q(danger_level='DANGEROUS')),
+            hyperdangerous_images=Sum('detection_count', filter=image & Q(danger_level='HYPERDANGEROUS')),
+            safe_images=Sum('detection_count', filter=image & Q(danger_level='')),
+            dangerous_videos=Sum('detection_count', filter=video & Q(danger_level='DANGEROUS')),
+            hyperdangerous_videos=Sum('detection_count', filter=video & Q(danger_level='HYPERDANGEROUS')),
+            safe_videos=Sum('detection_count', filter=video & Q(danger_level='')),
+            with_danger=Sum('detection_count', filter=~Q(danger_level='')),
+            video_frames=Sum('frames_analyzed', filter=video),
+            video_seconds=Sum('processing_seconds', filter=video),
+            video_processed=Sum('processed_count', filter=video),
+            valid=Sum('valid_count'),
+            invalid=Sum('invalid_count'),
+            incorrect=Sum('incorrect_count'),
+            today=Sum('detection_count', filter=Q(day=today)),
+        ).items()
+    }
+    total_detections = totals['total']
+
+    # Occurrences des catégories dangereuses (séparé par type)
+    category_counts = {}
+    category_counts_images = {}
+    category_counts_videos = {}
+    category_rows = (
+        rollups_qs.filter(category__in=DangerousCategory.objects.values_list('name', flat=True))
+        .values_list('category', 'media_type')
+        .annotate(count=Sum('object_count'))
+        .order_by()
+    )
+    for category, media_type, count in category_rows:
+        if not count:
+            continue
+        category_counts[category] = category_counts.get(category, 0) + count
+        if media_type == 'IMAGE':
+            category_counts_images[category] = count
+        elif media_type == 'VIDEO':
+            category_counts_videos[category] = count
+    categories_count = [
+        {'name': name, 'count': count}
+        for name, count in sorted(category_counts.items(), key=lambda x: x[1], reverse=True)
+    ]
+
+    daily_detections = [
+        entry for entry in
+        detection_rows.values('day').annotate(count=Sum('detection_count')).order_by('day')
+        if entry['count']
+    ]
+    max_detection_day = None
+    if daily_detections:
+        busiest = max(daily_detections, key=lambda entry: entry['count'])
+        max_detection_day = {'date': busiest['day'], 'count': busiest['count']}
+
+    return {
+        'total_detections': total_detections,
+        # Nombre distinct de rapports : non additif par jour, compté sur les détections
+        'total_reports': Report.objects.filter(detections__in=detections_qs).distinct().count(),
+        'categories_count': categories_count,
+        'valid_detections': totals['valid'],
+        'invalid_detections': totals['invalid'],
+        'incorrect_detections': totals['incorrect'],
+        'today_detections': totals['today'],
+        'max_detection_day': max_detection_day,
+        'donut_data': {
+            'labels': ['Valides', 'Non valides', 'Incorrectes'],
+            'data': [totals['valid'], totals['invalid'], totals['incorrect']],
+        },
+        'line_data': {
+            'labels': [entry['day'].strftime('%Y-%m-%d') for entry in daily_detections],
+            'data': [entry['count'] for entry in daily_detections],
+        },
+        'bar_category_data': {
+            'labels': [entry['name'] for entry in categories_count],
+            'data': [entry['count'] for entry in categories_count],
+        },
+        'total_images': totals['images'],
+        'total_videos': totals['videos'],
+        'dangerous_images': totals['dangerous_images'],
+        'hyperdangerous_images': totals['hyperdangerous_images'],
+        'safe_images': totals['safe_images'],
+        'dangerous_videos': totals['dangerous_videos'],
+        'hyperdangerous_videos': totals['hyperdangerous_videos'],
+        'safe_videos': totals['safe_videos'],
+        'avg_processing_time': round(totals['video_seconds'] / totals['video_processed'], 2) if totals['video_processed'] else 0,
+        'total_frames_analyzed': totals['video_frames'],
+        'danger_rate': round(totals['with_danger'] / total_detections * 100, 1) if total_detections > 0 else 0,
+        'detections_with_danger': totals['with_danger'],
+        'media_type_data': {
+            'labels': ['Images', 'Vidéos'],
+            'data': [totals['images'], totals['videos']],
+        },
+        'danger_by_media_data': {
+            'labels': ['Sécurisées', 'Dangereuses', 'Hyperdangereuses'],
+            'images': [totals['safe_images'], totals['dangerous_images'], totals['hyperdangerous_images']],
+            'videos': [totals['safe_videos'], totals['dangerous_videos'], totals['hyperdangerous_videos']],
+        },
+        'category_counts_images': category_counts_images,
+        'category_counts_videos': category_counts_videos,
+    }
@@ -0,0 +1,127 @@
+// Upload reprenable par morceaux (API /detection/uploads/)
+
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const MAX_RETRIES = 5;
+
+// Table CRC32 (polynôme IEEE, identique à zlib.crc32 côté serveur)
+const CRC32_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+function crc32(bytes) {
+  let crc = 0xFFFFFFFF;
+  for (let i = 0; i < bytes.length; i++) {
+    crc = CRC32_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+  }
+  return ((crc ^ 0xFFFFFFFF) >>> 0).toString(16).padStart(8, '0');
+}
+
+function getCsrfToken() {
+  const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+  return input ? input.value : '';
+}
+
+// Une session par fichier : permet de reprendre après un rechargement de la page
+function sessionKey(file) {
+  return `chunked-upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function fetchJson(url, options) {
+  const response = await fetch(url, options);
+  const data = await response.json().catch(() => ({}));
+  return { response, data };
+}
+
+async function resumeSession(file) {
+  const uploadUrl = localStorage.getItem(sessionKey(file));
+  if (!uploadUrl) {
+    return null;
+  }
+  const { response, data } = await fetchJson(uploadUrl, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+  if (!response.ok || data.status !== 'UPLOADING') {
+    localStorage.removeItem(sessionKey(file));
+    return null;
+  }
+  return data;
+}
+
+async function initiateSession(initiateUrl, file, fields) {
+  const body = new FormData();
+  body.append('filename', file.name);
+  body.append('size', file.size);
+  Object.entries(fields).forEach(([name, value]) => body.append(name, value));
+
+  const { response, data } = await fetchJson(initiateUrl, {
+    method: 'POST',
+    headers: { 'X-CSRFToken': getCsrfToken() },
+    body,
+  });
+  if (!response.ok) {
+    throw new Error(data.error || "Impossible de démarrer l'upload.");
+  }
+  localStorage.setItem(sessionKey(file), data.upload_url);
+  return data;
+}
+
+async function sendChunk(session, file, offset) {
+  const chunk = new Uint8Array(await file.slice(offset, offset + CHUNK_SIZE).arrayBuffer());
+  const { response, data } = await fetchJson(session.upload_url, {
+    method: 'PUT',
+    headers: {
+      'X-CSRFToken': getCsrfToken(),
+      'Upload-Offset': String(offset),
+      'Upload-Chunk-CRC32': crc32(chunk),
+      'Content-Type': 'application/offset+octet-stream',
+    },
+    body: chunk,
+  });
+  // 409 : l'offset du serveur fait foi (morceau déjà reçu ou envoi concurrent)
+  if (!response.ok && (response.status !== 409 || data.offset === offset)) {
+    throw new Error(data.error || "Échec de l'envoi d'un morceau.");
+  }
+  return data.offset;
+}
+
+// Envoie le fichier par morceaux puis finalise ; retourne la réponse de finalisation (job_id, status_url)
+async function chunkedUpload(initiateUrl, file, fields = {}, onProgress = () => {}) {
+  let session = await resumeSession(file) || await initiateSession(initiateUrl, file, fields);
+  let offset = session.offset;
+  let retries = 0;
+
+  while (offset < file.size) {
+    try {
+      offset = await sendChunk(session, file, offset);
+      retries = 0;
+      onProgress(offset / file.size);
+    } catch (error) {
+      if (++retries > MAX_RETRIES) {
+        throw error;
+      }
+      // Coupure réseau : attendre puis relire l'offset enregistré par le serveur
+      await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** retries));
+      session = await resumeSession(file);
+      if (!session) {
+        throw error;
+      }
+      offset = session.offset;
+    }
+  }
+
+  const { response, data } = await fetchJson(session.complete_url, {
+    method: 'POST',
+    headers: { 'X-CSRFToken': getCsrfToken() },
+  });
+  if (!response.ok) {
+    throw new Error(data.error || "Échec de la finalisation de l'upload.");
+  }
+  localStorage.removeItem(sessionKey(file));
+  return data;
+}
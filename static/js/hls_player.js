@@ -0,0 +1,23 @@
+// Lecture des vidéos annotées segmentées (HLS)
+
+// Attache une playlist HLS à chaque <video data-hls-src="...">
+function setupHlsVideos() {
+  document.querySelectorAll('video[data-hls-src]').forEach(video => {
+    const source = video.dataset.hlsSrc;
+
+    // Safari lit le HLS nativement
+    if (video.canPlayType('application/vnd.apple.mpegurl')) {
+      video.src = source;
+      return;
+    }
+
+    if (window.Hls && Hls.isSupported()) {
+      // Playlist EVENT : hls.js recharge la playlist tant que l'analyse est en cours
+      const hls = new Hls();
+      hls.loadSource(source);
+      hls.attachMedia(video);
+    }
+  });
+}
+
+document.addEventListener('DOMContentLoaded', setupHlsVideos);
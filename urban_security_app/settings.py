@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,12 +83,29 @@ WSGI_APPLICATION = 'urban_security_app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite par défaut (DATABASE_PATH permet de partager un fichier entre plusieurs workers locaux).
+# En multi-nœuds, utiliser une base serveur : DB_ENGINE=django.db.backends.postgresql, DB_NAME, DB_HOST...
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.sqlite3')
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Plusieurs workers écrivent dans la base : attendre le verrou plutôt qu'échouer
+            'OPTIONS': {'timeout': 20},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', 'urban_security'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', ''),
+        }
     }
-}
 
 # Modèle utilisateur personnalisé
 AUTH_USER_MODEL = 'users.User'
@@ -133,7 +151,48 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 # Media files (User uploads)
 # Media files (user-uploaded files)
 MEDIA_URL = "/media/"
-MEDIA_ROOT = BASE_DIR / "media"
+# Partagé entre les nœuds de détection (NFS) : tous doivent voir le même MEDIA_ROOT
+MEDIA_ROOT = Path(os.getenv('MEDIA_ROOT', BASE_DIR / "media"))
+
+# Sortie vidéo segmentée (HLS) : binaire ffmpeg et durée cible des segments
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+HLS_SEGMENT_SECONDS = 4
+
+# File de tâches de détection (voir `manage.py detection_worker`)
+# DETECTION_JOBS_EAGER exécute les tâches dans la requête, sans worker (développement)
+DETECTION_JOBS_EAGER = os.getenv('DETECTION_JOBS_EAGER', '0') == '1'
+# Le bail est renouvelé par le heartbeat du worker : un worker arrêté perd ses tâches après ce délai
+DETECTION_JOB_LEASE_SECONDS = 60
+DETECTION_WORKER_HEARTBEAT_SECONDS = 15
+DETECTION_JOB_RETRY_DELAY = 30
+
+# Boîtes conservées à l'inférence dès cette confiance (DetectionLog.raw_detections) : le seuil
+# des paramètres est appliqué ensuite, et `manage.py regrade_detections` le réapplique sans ré-inférence
+DETECTION_RAW_CONFIDENCE_FLOOR = float(os.getenv('DETECTION_RAW_CONFIDENCE_FLOOR', '0.05'))
+
+# Upload par morceaux (API /detection/uploads/) : taille maximale d'un morceau PUT
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024
+
+# Archives ZIP : limites appliquées sur le contenu décompressé pendant l'ingestion
+ZIP_MAX_TOTAL_UNCOMPRESSED_SIZE = 2 * 1024 * 1024 * 1024
+ZIP_MAX_MEMBERS = 500
+
+# Métriques Prometheus (/metrics). Définir la variable d'environnement
+# PROMETHEUS_MULTIPROC_DIR (répertoire vidé au démarrage) pour agréger serveur web et workers.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Cache : mémoire locale par processus par défaut. Avec REDIS_URL, le cache est partagé
+# et l'invalidation déclenchée par les workers de détection atteint aussi le serveur web.
+REDIS_URL = os.getenv('REDIS_URL', '')
+CACHES = {
+    'default': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+        if REDIS_URL else
+        {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    )
+}
+# Durée de vie des statistiques calculées (invalidées dès qu'une détection ou validation change)
+STATS_CACHE_SECONDS = 60
 
 
 # Default primary key field type
@@ -20,6 +20,7 @@ from django.urls import path, include
 from django.views.generic.base import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
+from apps.core.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,6 +28,7 @@ urlpatterns = [
     path('detection/', include('apps.detection.urls')),
     path('dashboard/', include('apps.dashboard.urls')),
     path('core/', include('apps.core.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', RedirectView.as_view(url='/users/login/', permanent=False), name='home'),
 ]
 